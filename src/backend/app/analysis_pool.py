@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# NOTE: State riêng của mỗi worker process, được tạo một lần trong _init_worker
+_extractor = None
+_detector = None
+
+
+def _init_worker() -> None:
+    # NOTE: Pre-load analyzers, detector và baseline stats một lần cho mỗi worker
+    global _extractor, _detector
+
+    from features.advanced_features import AdvancedFeatureExtractor
+    from features.detection_models import create_detector
+
+    _extractor = AdvancedFeatureExtractor()
+    try:
+        _detector = create_detector(detector_type(), detector_thresholds_path())
+    except Exception as e:
+        logger.warning(f"Detector {detector_type()} không khả dụng, dùng heuristic: {e}")
+        _detector = create_detector("heuristic")
+
+    try:
+        # NOTE: Mỗi worker tự theo dõi feature_stats.json để hot-reload mà không cần restart pool
+        from baseline_loader import get_baseline_loader
+        get_baseline_loader().start_watching()
+    except Exception as e:
+        logger.warning(f"Không thể pre-load baseline stats trong worker: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def extract_and_detect(code: str, filename: str = "") -> Tuple[Dict[str, Any], Optional[Any]]:
+    """Trích xuất features và chạy detector - chạy bên trong worker process"""
+    if _extractor is None:
+        _init_worker()
+
+    features = _extractor.extract_all_features(code, filename)
+    features_dict = features.to_dict() if hasattr(features, 'to_dict') else features
+
+    detection_result = None
+    if _detector is not None and isinstance(features_dict, dict) and 'error' not in features_dict:
+        detection_result = _detector.detect(features_dict)
+
+    return features_dict, detection_result
+
+
+def baseline_signature() -> Optional[Tuple]:
+    """Signature của baseline snapshot trong process hiện tại (None nếu chưa load được)"""
+    try:
+        from baseline_loader import get_baseline_loader
+        return get_baseline_loader().get_snapshot().file_signature
+    except Exception:
+        return None
+
+
+def _sync_baseline(expected_signature: Optional[Tuple]) -> None:
+    # NOTE: Process chính gửi signature của snapshot nó đang dùng kèm mỗi task; worker lệch phiên bản
+    # (vd: sau POST /reload-baseline, hoặc BASELINE_WATCH_INTERVAL=0) reload trước khi phân tích
+    if expected_signature is None:
+        return
+    try:
+        from baseline_loader import get_baseline_loader
+        loader = get_baseline_loader()
+        if loader.get_snapshot().file_signature != expected_signature:
+            loader.reload_stats()
+    except Exception as e:
+        logger.warning(f"Không thể đồng bộ baseline stats trong worker: {e}")
+
+
+def _extract_and_detect_with_stats(code: str, filename: str = "", expected_baseline: Optional[Tuple] = None
+                                   ) -> Tuple[Dict[str, Any], Optional[Any], int, Dict[str, Any], Dict[str, Any]]:
+    # NOTE: Kèm cache stats + detector latency của worker để process chính tổng hợp metrics
+    _sync_baseline(expected_baseline)
+    features_dict, detection_result = extract_and_detect(code, filename)
+    return features_dict, detection_result, os.getpid(), _extractor.cache_stats(), detector_stats()
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Feature cache stats của process hiện tại"""
+    return _extractor.cache_stats() if _extractor is not None else {}
+
+
+def detector_stats() -> Dict[str, Any]:
+    """Latency của từng detector trong ensemble (rỗng với detector đơn)"""
+    return _detector.latency_stats() if hasattr(_detector, 'latency_stats') else {}
+
+
+def detector_type() -> str:
+    # NOTE: DETECTOR_TYPE=ensemble để chạy heuristic + enhanced + classifier trên cùng features
+    return os.getenv("DETECTOR_TYPE", "enhanced")
+
+
+def detector_thresholds_path() -> Optional[str]:
+    # NOTE: Thresholds JSON do threshold_tuning.py --write-back ghi ra cho DETECTOR_TYPE,
+    # heuristic fallback không dùng vì thresholds được tune cho detector khác
+    return os.getenv("DETECTOR_THRESHOLDS_PATH") or None
+
+
+def merge_detector_stats(per_worker: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Cộng dồn latency stats của các workers theo từng detector"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for stats in per_worker:
+        for name, item in stats.items():
+            total = merged.setdefault(name, {'weight': item['weight'], 'calls': 0, 'errors': 0,
+                                             'total_ms': 0.0, 'max_ms': 0.0})
+            total['calls'] += item['calls']
+            total['errors'] += item['errors']
+            total['total_ms'] += item['total_ms']
+            total['max_ms'] = max(total['max_ms'], item['max_ms'])
+    for total in merged.values():
+        total['total_ms'] = round(total['total_ms'], 3)
+        total['mean_ms'] = round(total['total_ms'] / total['calls'], 3) if total['calls'] else 0.0
+    return merged
+
+
+def default_worker_count() -> int:
+    # NOTE: ANALYSIS_WORKERS=0 chạy in-process (thread), hữu ích khi dev/debug
+    configured = os.getenv("ANALYSIS_WORKERS")
+    if configured is not None:
+        return max(0, int(configured))
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+class AnalysisPool:
+    """ProcessPoolExecutor được quản lý cho các tác vụ CPU-bound (extraction + detection)"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = default_worker_count() if max_workers is None else max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._worker_cache_stats: Dict[int, Dict[str, Any]] = {}
+        self._worker_detector_stats: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def concurrency(self) -> int:
+        """Số tác vụ có thể chạy song song thực sự"""
+        return max(1, self.max_workers)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # NOTE: spawn để worker không kế thừa event loop/threads của server
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+                logger.info(f"Started analysis pool with {self.max_workers} workers")
+            return self._executor
+
+    def start(self) -> None:
+        # NOTE: Khởi động và warm-up tất cả workers để request đầu tiên không phải chờ load model
+        if self.max_workers == 0:
+            _init_worker()
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(_ping) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    async def extract_and_detect(self, code: str, filename: str = "") -> Tuple[Dict[str, Any], Optional[Any]]:
+        if self.max_workers == 0:
+            return await asyncio.to_thread(extract_and_detect, code, filename)
+
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            features_dict, detection_result, pid, stats, latency = await loop.run_in_executor(
+                executor, _extract_and_detect_with_stats, code, filename, baseline_signature()
+            )
+            self._worker_cache_stats[pid] = stats
+            self._worker_detector_stats[pid] = latency
+            return features_dict, detection_result
+        except BrokenProcessPool:
+            # NOTE: Một worker chết (OOM, segfault) - tạo lại pool cho các request sau
+            logger.error("Analysis pool bị hỏng, khởi tạo lại")
+            self._reset(executor)
+            raise
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Tổng hợp feature cache metrics (mỗi worker có cache riêng)"""
+        if self.max_workers == 0:
+            return cache_stats()
+
+        workers = list(self._worker_cache_stats.values())
+        hits = sum(stats.get('hits', 0) for stats in workers)
+        misses = sum(stats.get('misses', 0) for stats in workers)
+        return {
+            'workers': len(workers),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'evictions': sum(stats.get('evictions', 0) for stats in workers),
+            'entries': sum(stats.get('entries', 0) for stats in workers),
+            'size_bytes': sum(stats.get('size_bytes', 0) for stats in workers)
+        }
+
+    def detector_stats(self) -> Dict[str, Any]:
+        """Tổng hợp latency của từng detector trong ensemble qua các workers"""
+        if self.max_workers == 0:
+            return detector_stats()
+        return merge_detector_stats(list(self._worker_detector_stats.values()))
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._worker_cache_stats.clear()
+                self._worker_detector_stats.clear()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_analysis_pool: Optional[AnalysisPool] = None
+
+
+def get_analysis_pool() -> AnalysisPool:
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = AnalysisPool()
+    return _analysis_pool
+
+
+def shutdown_analysis_pool() -> None:
+    global _analysis_pool
+    if _analysis_pool:
+        _analysis_pool.shutdown()
+        _analysis_pool = None
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+try:
+    import rarfile
+    RARFILE_AVAILABLE = True
+except ImportError:
+    RARFILE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz')
+ARCHIVE_EXTENSIONS = ('.zip', '.rar') + TAR_EXTENSIONS
+CODE_EXTENSIONS = ('.c', '.cpp', '.cc', '.cxx', '.h', '.hpp', '.txt')
+READ_CHUNK_SIZE = 64 * 1024
+# NOTE: File nhỏ nén tốt (vd: toàn khoảng trắng) không bị coi là zip bomb
+RATIO_CHECK_MIN_BYTES = 64 * 1024
+# NOTE: zlib nhả GIL khi giải nén nên nhiều thread giải nén song song thật sự
+DEFAULT_READ_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class ArchiveLimitError(Exception):
+    """Member hoặc archive vượt quá ArchiveLimits"""
+
+
+@dataclass
+class ArchiveLimits:
+    max_members: int = 1000
+    max_member_bytes: int = 1024 * 1024          # NOTE: Giống giới hạn 1MB của upload một file
+    max_total_bytes: int = 200 * 1024 * 1024     # NOTE: Tổng dung lượng sau giải nén của một archive
+    max_ratio: float = 100.0                     # NOTE: file_size / compress_size tối đa của một member
+
+    @classmethod
+    def from_env(cls) -> "ArchiveLimits":
+        defaults = cls()
+        return cls(
+            max_members=int(os.getenv("ARCHIVE_MAX_MEMBERS", defaults.max_members)),
+            max_member_bytes=int(os.getenv("ARCHIVE_MAX_MEMBER_BYTES", defaults.max_member_bytes)),
+            max_total_bytes=int(os.getenv("ARCHIVE_MAX_TOTAL_BYTES", defaults.max_total_bytes)),
+            max_ratio=float(os.getenv("ARCHIVE_MAX_RATIO", defaults.max_ratio))
+        )
+
+
+@dataclass
+class ArchiveScan:
+    members: List[Dict[str, Any]] = field(default_factory=list)
+    skipped: List[Dict[str, Any]] = field(default_factory=list)   # NOTE: Members bị bỏ qua kèm 'reason'
+    dropped: int = 0                                              # NOTE: Số file code vượt quá max_members
+
+
+def is_code_file(filename: str) -> bool:
+    return filename.endswith(CODE_EXTENSIONS)
+
+
+def is_tar_archive(filename: str) -> bool:
+    return filename.lower().endswith(TAR_EXTENSIONS)
+
+
+def open_archive(archive_path: str):
+    """ZipFile/RarFile read-only, chỉ đọc central directory - không giải nén gì"""
+    if archive_path.endswith('.zip'):
+        return zipfile.ZipFile(archive_path, 'r')
+    if archive_path.endswith('.rar'):
+        if not RARFILE_AVAILABLE:
+            raise ImportError("RAR file support not available. Please install rarfile module.")
+        return rarfile.RarFile(archive_path, 'r')
+    raise ValueError(f"Unsupported archive format: {Path(archive_path).name}")
+
+
+def read_limited(stream, max_bytes: int) -> bytes:
+    """Đọc stream theo chunk, dừng ngay khi vượt max_bytes thay vì tin kích thước khai báo trong header"""
+    chunks = []
+    total = 0
+    while True:
+        chunk = stream.read(min(READ_CHUNK_SIZE, max_bytes + 1 - total))
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise ArchiveLimitError(f"File vượt quá {max_bytes} bytes sau khi giải nén")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+class ArchiveReader:
+    """
+    Đọc các file code trong một archive theo ArchiveLimits
+
+    scan() chỉ dùng kích thước khai báo trong central directory; read() giải nén từng member qua stream
+    có giới hạn và cộng dồn số bytes thực tế vào ngân sách max_total_bytes của cả archive.
+    Mỗi thread dùng ZipFile/RarFile handle riêng (file position của một handle không thread-safe)
+    """
+
+    def __init__(self, archive_path: str, limits: Optional[ArchiveLimits] = None,
+                 workers: Optional[int] = None):
+        self.archive_path = str(archive_path)
+        self.limits = limits or ArchiveLimits.from_env()
+        self.workers = int(workers or os.getenv("ARCHIVE_READ_WORKERS", DEFAULT_READ_WORKERS))
+        self._bytes_read = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._handles = []
+
+    def _check_member(self, info) -> str:
+        limits = self.limits
+        if info.file_size > limits.max_member_bytes:
+            return f"File quá lớn ({info.file_size} bytes, tối đa {limits.max_member_bytes})"
+        if info.file_size > RATIO_CHECK_MIN_BYTES and \
+                info.file_size > limits.max_ratio * max(info.compress_size, 1):
+            return f"Tỉ lệ nén bất thường ({info.file_size}/{info.compress_size} bytes)"
+        return ""
+
+    def scan(self) -> ArchiveScan:
+        result = ArchiveScan()
+        declared_total = 0
+        with open_archive(self.archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_code_file(info.filename):
+                    continue
+                # NOTE: Members bị skip cũng tính vào max_members để archive có hàng triệu entries không sinh hàng triệu dòng lỗi
+                if len(result.members) + len(result.skipped) >= self.limits.max_members:
+                    result.dropped += 1
+                    continue
+
+                member = {
+                    'filename': Path(info.filename).name,
+                    'filepath': info.filename,
+                    'archive_member': info.filename
+                }
+                reason = self._check_member(info)
+                if not reason and declared_total + info.file_size > self.limits.max_total_bytes:
+                    reason = f"Archive vượt quá tổng dung lượng giải nén {self.limits.max_total_bytes} bytes"
+                if reason:
+                    result.skipped.append(dict(member, reason=reason))
+                    continue
+
+                declared_total += info.file_size
+                result.members.append(member)
+
+        if result.skipped or result.dropped:
+            logger.warning(f"{Path(self.archive_path).name}: skipped {len(result.skipped)} members, "
+                           f"dropped {result.dropped} members over max_members={self.limits.max_members}")
+        return result
+
+    def _consume(self, size: int) -> None:
+        with self._lock:
+            self._bytes_read += size
+            if self._bytes_read > self.limits.max_total_bytes:
+                raise ArchiveLimitError(f"Archive vượt quá tổng dung lượng giải nén {self.limits.max_total_bytes} bytes")
+
+    def _archive(self):
+        archive = getattr(self._local, 'archive', None)
+        if archive is None:
+            archive = open_archive(self.archive_path)
+            self._local.archive = archive
+            with self._lock:
+                self._handles.append(archive)
+        return archive
+
+    def read(self, member: str) -> bytes:
+        with self._archive().open(member) as stream:
+            data = read_limited(stream, self.limits.max_member_bytes)
+        self._consume(len(data))
+        return data
+
+    async def iter_members(self, members: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Giải nén members trong thread pool, yield theo thứ tự giải nén xong
+
+        Mỗi item là member kèm 'content' (bytes) hoặc 'read_error'. Chỉ tối đa 2 * workers members
+        được giải nén trước khi consumer lấy đi, nên bộ nhớ không phụ thuộc số file trong archive
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="archive-read")
+        loop = asyncio.get_running_loop()
+        queued = iter(members)
+        pending = {}
+        try:
+            while True:
+                for member in queued:
+                    future = loop.run_in_executor(executor, self.read, member['archive_member'])
+                    pending[future] = member
+                    if len(pending) >= 2 * self.workers:
+                        break
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    member = pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        yield dict(member, content=future.result())
+                    else:
+                        yield dict(member, read_error=error)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for archive in handles:
+            archive.close()
+
+
+class TarStreamReader:
+    """
+    Đọc tar/tar.gz/tar.xz tuần tự ở stream mode (r|*): mỗi member được giải nén và trả về ngay khi đọc tới,
+    không seek, không cần danh sách members trước - bộ nhớ chỉ phụ thuộc max_member_bytes
+
+    Không có central directory nên giới hạn được kiểm tra trong lúc đọc: kích thước khai báo trong header,
+    tổng số bytes đã giải nén của cả stream và tỉ lệ nén so với số bytes đã đọc từ file
+    """
+
+    def __init__(self, archive_path: str, limits: Optional[ArchiveLimits] = None):
+        self.archive_path = str(archive_path)
+        self.limits = limits or ArchiveLimits.from_env()
+
+    def _check_stream(self, raw, tar, info) -> str:
+        # NOTE: tar.offset = cuối member hiện tại trong stream đã giải nén (tính theo size khai báo, trước khi đọc data)
+        # → member khổng lồ bị chặn trước khi giải nén; info.offset = phần đã thực sự giải nén, raw.tell() = bytes nén đã đọc
+        if tar.offset > self.limits.max_total_bytes:
+            return f"Archive vượt quá tổng dung lượng giải nén {self.limits.max_total_bytes} bytes"
+        uncompressed, compressed = info.offset, raw.tell()
+        if uncompressed > RATIO_CHECK_MIN_BYTES and uncompressed > self.limits.max_ratio * max(compressed, 1):
+            return f"Tỉ lệ nén bất thường ({uncompressed}/{compressed} bytes)"
+        return ""
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Members theo thứ tự trong stream, kèm 'content' hoặc 'read_error'"""
+        name = Path(self.archive_path).name
+        count = 0
+        with open(self.archive_path, 'rb') as raw, tarfile.open(fileobj=raw, mode='r|*') as tar:
+            for info in tar:
+                reason = self._check_stream(raw, tar, info)
+                if reason:
+                    # NOTE: Dừng đọc stream nhưng giữ kết quả của các members trước đó
+                    logger.warning(f"{name}: {reason}, stop reading")
+                    yield {'filename': name, 'filepath': name, 'read_error': ArchiveLimitError(reason)}
+                    return
+
+                if not info.isfile() or not is_code_file(info.name):
+                    continue
+                if count >= self.limits.max_members:
+                    logger.warning(f"{name}: reached max_members={self.limits.max_members}, stop reading")
+                    return
+                count += 1
+
+                member = {'filename': Path(info.name).name, 'filepath': info.name}
+                if info.size > self.limits.max_member_bytes:
+                    reason = f"File quá lớn ({info.size} bytes, tối đa {self.limits.max_member_bytes})"
+                    yield dict(member, read_error=ArchiveLimitError(reason))
+                    continue
+
+                try:
+                    yield dict(member, content=read_limited(tar.extractfile(info), self.limits.max_member_bytes))
+                except ArchiveLimitError as e:
+                    yield dict(member, read_error=e)
+
+    async def iter_members(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        iter_entries chạy trong thread, mỗi lần consumer lấy một member
+
+        Stream hỏng (gzip/xz lỗi, tar cắt cụt) được trả về như một item lỗi thay vì raise
+        """
+        entries = self.iter_entries()
+        try:
+            while True:
+                try:
+                    entry = await asyncio.to_thread(next, entries, None)
+                except (tarfile.TarError, EOFError, OSError) as e:
+                    name = Path(self.archive_path).name
+                    yield {'filename': name, 'filepath': name, 'read_error': e}
+                    return
+                if entry is None:
+                    return
+                yield entry
+        finally:
+            entries.close()
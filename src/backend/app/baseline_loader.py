@@ -1,12 +1,26 @@
+import hashlib
 import json
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field, replace
 import logging
 
+import numpy as np
+
+try:
+    from binary_artifact import ARTIFACT_EXTENSION, KIND_BASELINE, is_artifact, read_artifact
+    BINARY_ARTIFACT_AVAILABLE = True
+except ImportError:
+    BINARY_ARTIFACT_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+MAX_CRITICAL_FEATURES = 15
+DEFAULT_WATCH_INTERVAL = 5.0  # seconds
+
 @dataclass
 class BaselineStats:
     ai_stats: Dict[str, float]
@@ -24,11 +38,202 @@ class BaselineStats:
             return abs(ai_val - human_val)
         return None
 
+@dataclass
+class BaselineComparisonArrays:
+    # NOTE: Kết quả so sánh baseline cho nhiều features, mỗi field là array theo thứ tự feature_names
+    feature_names: List[str]
+    comparable: np.ndarray  # False nếu không có baseline hoặc AI/Human baseline bằng nhau
+    ai_baselines: np.ndarray
+    human_baselines: np.ndarray
+    current_values: np.ndarray
+    deviation_from_ai: np.ndarray
+    deviation_from_human: np.ndarray
+    ai_similarity: np.ndarray
+    human_similarity: np.ndarray
+    verdicts: np.ndarray
+    confidences: np.ndarray
+
+@dataclass
+class BaselineIndex:
+    # NOTE: Baseline means của các features có cả AI và Human stats, dạng arrays theo cùng thứ tự
+    feature_names: List[str]
+    positions: Dict[str, int]
+    ai_means: np.ndarray
+    human_means: np.ndarray
+    ranges: np.ndarray
+    
+    @classmethod
+    def from_stats(cls, baseline_stats: BaselineStats) -> 'BaselineIndex':
+        feature_names = [name for name in baseline_stats.ai_stats if name in baseline_stats.human_stats]
+        ai_means = np.array([baseline_stats.ai_stats[name] for name in feature_names], dtype=float)
+        human_means = np.array([baseline_stats.human_stats[name] for name in feature_names], dtype=float)
+        return cls(
+            feature_names=feature_names,
+            positions={name: i for i, name in enumerate(feature_names)},
+            ai_means=ai_means,
+            human_means=human_means,
+            ranges=np.abs(ai_means - human_means)
+        )
+    
+    @classmethod
+    def from_arrays(cls, feature_names: List[str], ai_means: np.ndarray, human_means: np.ndarray,
+                    ranges: np.ndarray) -> 'BaselineIndex':
+        # NOTE: Giữ nguyên arrays (vd: view read-only trên mmap của binary artifact), không copy
+        return cls(
+            feature_names=list(feature_names),
+            positions={name: i for i, name in enumerate(feature_names)},
+            ai_means=ai_means,
+            human_means=human_means,
+            ranges=ranges
+        )
+    
+    def __contains__(self, feature_name: str) -> bool:
+        return feature_name in self.positions
+    
+    def __len__(self) -> int:
+        return len(self.feature_names)
+    
+    def effect_size(self, feature_name: str) -> float:
+        position = self.positions.get(feature_name)
+        return float(self.ranges[position]) if position is not None else 0.0
+    
+    def compare(self, feature_names: Sequence[str], values: Sequence[float]) -> BaselineComparisonArrays:
+        """So sánh giá trị hiện tại của các features với AI/Human baselines trong một lượt NumPy"""
+        feature_names = list(feature_names)
+        positions = np.array([self.positions.get(name, -1) for name in feature_names], dtype=int)
+        known = positions >= 0
+        
+        current = np.asarray(values, dtype=float)
+        ai_baseline = np.full(len(feature_names), np.nan)
+        human_baseline = np.full(len(feature_names), np.nan)
+        ai_baseline[known] = self.ai_means[positions[known]]
+        human_baseline[known] = self.human_means[positions[known]]
+        baseline_range = np.abs(ai_baseline - human_baseline)
+        comparable = known & (baseline_range > 0)
+        safe_range = np.where(comparable, baseline_range, 1.0)
+        
+        ai_distance_norm = np.minimum(np.abs(current - ai_baseline) / safe_range, 2.0)
+        human_distance_norm = np.minimum(np.abs(current - human_baseline) / safe_range, 2.0)
+        ai_similarity = np.maximum(0.0, 1.0 - ai_distance_norm)
+        human_similarity = np.maximum(0.0, 1.0 - human_distance_norm)
+        
+        # NOTE: Deviation dương = lệch về phía Human baseline
+        ai_lower = ai_baseline < human_baseline
+        deviation_from_ai = np.where(ai_lower, current - ai_baseline, ai_baseline - current) / safe_range
+        deviation_from_human = np.where(ai_lower, current - human_baseline, human_baseline - current) / safe_range
+        deviation_from_ai = np.clip(deviation_from_ai, -2.0, 2.0)
+        deviation_from_human = np.clip(deviation_from_human, -2.0, 2.0)
+        
+        ai_like = ai_similarity > human_similarity + 0.1
+        human_like = ~ai_like & (human_similarity > ai_similarity + 0.1)
+        verdicts = np.where(ai_like, "ai-like", np.where(human_like, "human-like", "neutral")).astype(object)
+        confidences = np.where(ai_like, np.minimum(0.95, ai_similarity),
+                               np.where(human_like, np.minimum(0.95, human_similarity), 0.5))
+        
+        return BaselineComparisonArrays(
+            feature_names=feature_names,
+            comparable=comparable,
+            ai_baselines=ai_baseline,
+            human_baselines=human_baseline,
+            current_values=current,
+            deviation_from_ai=deviation_from_ai,
+            deviation_from_human=deviation_from_human,
+            ai_similarity=ai_similarity,
+            human_similarity=human_similarity,
+            verdicts=verdicts,
+            confidences=confidences
+        )
+
+@dataclass(frozen=True)
+class BaselineSnapshot:
+    """
+    Một phiên bản baseline stats cùng toàn bộ index dẫn xuất - không bao giờ bị sửa sau khi tạo
+    
+    Reload tạo snapshot mới rồi thay reference, người đọc luôn thấy một phiên bản nhất quán
+    """
+    version: int
+    stats_file_path: Optional[str]                  # NOTE: File thực sự được load (JSON hoặc artifact)
+    file_signature: Optional[Tuple]                 # NOTE: (st_ino, st_mtime_ns, st_size) của các file được theo dõi
+    loaded_at: float
+    baseline_stats: BaselineStats
+    baseline_index: BaselineIndex
+    critical_features: Dict[str, Dict]
+    derived: Dict[str, Any] = field(default_factory=dict)
+
+def compute_critical_features(baseline_stats: BaselineStats,
+                              max_features: int = MAX_CRITICAL_FEATURES) -> Dict[str, Dict]:
+    critical_features = {}
+    
+    feature_effects = []
+    
+    for feature_name in baseline_stats.ai_stats.keys():
+        if feature_name in baseline_stats.human_stats:
+            ai_val = baseline_stats.ai_stats[feature_name]
+            human_val = baseline_stats.human_stats[feature_name]
+            
+            diff = abs(ai_val - human_val)
+            avg_val = (ai_val + human_val) / 2
+            
+            if avg_val != 0:
+                effect_size = diff / abs(avg_val)
+            else:
+                effect_size = diff
+            
+            feature_effects.append({
+                'name': feature_name,
+                'effect_size': effect_size,
+                'ai_val': ai_val,
+                'human_val': human_val,
+                'ai_higher': ai_val > human_val
+            })
+    
+    feature_effects.sort(key=lambda x: x['effect_size'], reverse=True)
+    
+    top_features = [f for f in feature_effects[:max_features] if f['effect_size'] > 0]
+    total_effect = sum(f['effect_size'] for f in top_features)
+    
+    for i, feature_info in enumerate(top_features):
+        # NOTE: Weight tỷ lệ với effect size, tổng weights = 1.0
+        weight = feature_info['effect_size'] / total_effect
+        
+        critical_features[feature_info['name']] = {
+            'weight': weight,
+            'ai_better': feature_info['ai_higher'],
+            'effect_size': feature_info['effect_size']
+        }
+    
+    logger.info(f"Identified {len(critical_features)} critical features")
+    return critical_features
+
+def _file_signature(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def _optional_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        return _file_signature(path)
+    except OSError:
+        return None
+
+def _validate_stats(ai_stats: Dict[str, float], human_stats: Dict[str, float]) -> None:
+    # NOTE: Validate trước khi swap - file đang được ghi dở hoặc sai format không được thay bản đang chạy
+    if not set(ai_stats) & set(human_stats):
+        raise ValueError("Baseline stats have no feature with both AI and Human means")
+    non_finite = [name for name, value in list(ai_stats.items()) + list(human_stats.items())
+                  if not np.isfinite(value)]
+    if non_finite:
+        raise ValueError(f"Non-finite baseline means: {non_finite[:5]}")
+
 class BaselineLoader:
     
     def __init__(self, stats_file_path: Optional[str] = None):
         self.stats_file_path = stats_file_path
-        self._baseline_stats: Optional[BaselineStats] = None
+        self._snapshot: Optional[BaselineSnapshot] = None
+        self._derived_builders: Dict[str, Callable[[BaselineSnapshot], Any]] = {}
+        self._reload_lock = threading.Lock()
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self._failed_signature: Optional[Tuple] = None
         self._load_baseline_stats()
     
     def _auto_detect_stats_file(self) -> str:
@@ -48,95 +253,218 @@ class BaselineLoader:
         
         raise FileNotFoundError(f"Could not find feature_stats.json. Tried paths: {[str(p) for p in possible_paths]}")
     
-    def _load_baseline_stats(self) -> None:
+    @staticmethod
+    def _find_artifact(json_path: Path) -> Optional[Path]:
+        # NOTE: Chỉ dùng feature_stats.bin nếu nó được export từ đúng nội dung hiện tại của feature_stats.json
+        # (source_sha256 trong metadata) - JSON được train lại thì artifact cũ bị bỏ qua
+        if not BINARY_ARTIFACT_AVAILABLE:
+            return None
+        artifact_path = json_path.with_suffix(ARTIFACT_EXTENSION)
         try:
-            if not self.stats_file_path:
-                self.stats_file_path = self._auto_detect_stats_file()
-            
-            with open(self.stats_file_path, 'r', encoding='utf-8') as f:
-                stats_data = json.load(f)
-            
-            ai_stats = {}
-            human_stats = {}
-            
-            for key, value in stats_data.items():
-                if key.endswith('_ai_mean'):
-                    feature_name = key.replace('_ai_mean', '')
-                    ai_stats[feature_name] = float(value)
-                elif key.endswith('_human_mean'):
-                    feature_name = key.replace('_human_mean', '')
-                    human_stats[feature_name] = float(value)
-            
-            self._baseline_stats = BaselineStats(
-                ai_stats=ai_stats,
-                human_stats=human_stats
-            )
-            
-            logger.info(f"Loaded baseline stats: {len(ai_stats)} AI features, {len(human_stats)} Human features")
-            
-        except Exception as e:
-            logger.error(f"Failed to load baseline stats: {e}")
-            self._baseline_stats = BaselineStats(ai_stats={}, human_stats={})
+            if not is_artifact(artifact_path):
+                return None
+            source_sha256 = read_artifact(artifact_path, expected_kind=KIND_BASELINE).metadata.get('source_sha256')
+            if source_sha256 != hashlib.sha256(json_path.read_bytes()).hexdigest():
+                logger.warning(f"Ignoring stale baseline artifact {artifact_path}: {json_path.name} has changed")
+                return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring baseline artifact {artifact_path}: {e}")
+            return None
+        return artifact_path
     
-    def get_baseline_stats(self) -> BaselineStats:
-        if self._baseline_stats is None:
-            self._load_baseline_stats()
-        return self._baseline_stats
+    def _watched_paths(self) -> List[str]:
+        # NOTE: Theo dõi cả JSON nguồn lẫn artifact đi kèm - thay đổi ở file nào cũng chạy lại việc chọn file
+        paths = [self.stats_file_path]
+        if BINARY_ARTIFACT_AVAILABLE and not is_artifact(self.stats_file_path):
+            paths.append(str(Path(self.stats_file_path).with_suffix(ARTIFACT_EXTENSION)))
+        return paths
     
-    def reload_stats(self) -> None:
-        self._baseline_stats = None
-        self._load_baseline_stats()
+    def _resolve_load_path(self) -> str:
+        if BINARY_ARTIFACT_AVAILABLE and not is_artifact(self.stats_file_path):
+            artifact_path = self._find_artifact(Path(self.stats_file_path))
+            if artifact_path:
+                return str(artifact_path)
+        return self.stats_file_path
     
-    def get_critical_features(self) -> Dict[str, Dict]:
-        baseline_stats = self.get_baseline_stats()
-        critical_features = {}
+    def _parse_artifact(self, path: str) -> Tuple[BaselineStats, BaselineIndex]:
+        artifact = read_artifact(path, expected_kind=KIND_BASELINE)
+        features = artifact.names['features']
+        ai_means = artifact.arrays['ai_means']
+        human_means = artifact.arrays['human_means']
+        ranges = artifact.arrays['ranges']
         
-        feature_effects = []
+        # NOTE: Features có cả hai means nằm liền ở đầu bảng, phần sau dùng NaN cho mean bị thiếu
+        paired = int(artifact.metadata['paired_features'])
+        ai_stats = {name: value for i, (name, value) in enumerate(zip(features, ai_means.tolist()))
+                    if i < paired or not np.isnan(value)}
+        human_stats = {name: value for i, (name, value) in enumerate(zip(features, human_means.tolist()))
+                       if i < paired or not np.isnan(value)}
+        _validate_stats(ai_stats, human_stats)
         
-        for feature_name in baseline_stats.ai_stats.keys():
-            if feature_name in baseline_stats.human_stats:
-                ai_val = baseline_stats.ai_stats[feature_name]
-                human_val = baseline_stats.human_stats[feature_name]
-                
-                diff = abs(ai_val - human_val)
-                avg_val = (ai_val + human_val) / 2
-                
-                if avg_val != 0:
-                    effect_size = diff / abs(avg_val)
-                else:
-                    effect_size = diff
-                
-                feature_effects.append({
-                    'name': feature_name,
-                    'effect_size': effect_size,
-                    'ai_val': ai_val,
-                    'human_val': human_val,
-                    'ai_higher': ai_val > human_val
-                })
+        # NOTE: Index là slice (view) của mmap, không copy
+        baseline_index = BaselineIndex.from_arrays(features[:paired], ai_means[:paired],
+                                                   human_means[:paired], ranges[:paired])
+        return BaselineStats(ai_stats=ai_stats, human_stats=human_stats), baseline_index
+    
+    def _parse_stats_file(self, path: str) -> BaselineStats:
+        with open(path, 'r', encoding='utf-8') as f:
+            stats_data = json.load(f)
         
-        feature_effects.sort(key=lambda x: x['effect_size'], reverse=True)
+        if not isinstance(stats_data, dict):
+            raise ValueError("feature_stats.json must contain a JSON object")
         
+        ai_stats = {}
+        human_stats = {}
         
-        for i, feature_info in enumerate(top_features):
-            
-            critical_features[feature_info['name']] = {
-                'weight': weight,
-                'ai_better': feature_info['ai_higher'],
-                'effect_size': feature_info['effect_size']
-            }
+        for key, value in stats_data.items():
+            if key.endswith('_ai_mean'):
+                feature_name = key.replace('_ai_mean', '')
+                ai_stats[feature_name] = float(value)
+            elif key.endswith('_human_mean'):
+                feature_name = key.replace('_human_mean', '')
+                human_stats[feature_name] = float(value)
+        
+        _validate_stats(ai_stats, human_stats)
+        return BaselineStats(ai_stats=ai_stats, human_stats=human_stats)
+    
+    def _build_snapshot(self, baseline_stats: BaselineStats, stats_file_path: Optional[str],
+                        file_signature: Optional[Tuple[int, int, int]],
+                        baseline_index: Optional[BaselineIndex] = None) -> BaselineSnapshot:
+        # NOTE: Build toàn bộ index dẫn xuất trước khi snapshot được công bố
+        previous_version = self._snapshot.version if self._snapshot else 0
+        snapshot = BaselineSnapshot(
+            version=previous_version + 1,
+            stats_file_path=stats_file_path,
+            file_signature=file_signature,
+            loaded_at=time.time(),
+            baseline_stats=baseline_stats,
+            baseline_index=baseline_index or BaselineIndex.from_stats(baseline_stats),
+            critical_features=compute_critical_features(baseline_stats)
+        )
+        for name, builder in self._derived_builders.items():
+            snapshot.derived[name] = builder(snapshot)
+        return snapshot
+    
+    def _load_from_file(self) -> BaselineSnapshot:
+        if not self.stats_file_path:
+            self.stats_file_path = self._auto_detect_stats_file()
+        
+        # NOTE: Signature lấy trước khi đọc - file bị ghi đè trong lúc load sẽ được watcher reload lần nữa
+        file_signature = tuple(_optional_signature(path) for path in self._watched_paths())
+        load_path = self._resolve_load_path()
+        if BINARY_ARTIFACT_AVAILABLE and is_artifact(load_path):
+            baseline_stats, baseline_index = self._parse_artifact(load_path)
+        else:
+            baseline_stats, baseline_index = self._parse_stats_file(load_path), None
+        snapshot = self._build_snapshot(baseline_stats, load_path, file_signature, baseline_index)
         
-        logger.info(f"Identified {len(critical_features)} critical features")
-        return critical_features
+        logger.info(f"Loaded baseline stats v{snapshot.version}: {len(baseline_stats.ai_stats)} AI features, "
+                    f"{len(baseline_stats.human_stats)} Human features")
+        return snapshot
+    
+    def _load_baseline_stats(self) -> None:
+        with self._reload_lock:
+            try:
+                self._snapshot = self._load_from_file()
+                
+            except Exception as e:
+                logger.error(f"Failed to load baseline stats: {e}")
+                self._snapshot = self._build_snapshot(BaselineStats(ai_stats={}, human_stats={}),
+                                                      self.stats_file_path, None)
+    
+    def get_snapshot(self) -> BaselineSnapshot:
+        # NOTE: Đọc một reference - caller nên giữ snapshot này cho cả một lần tính toán
+        return self._snapshot
+    
+    def get_baseline_stats(self) -> BaselineStats:
+        return self._snapshot.baseline_stats
+    
+    def get_baseline_index(self) -> BaselineIndex:
+        return self._snapshot.baseline_index
+    
+    def get_critical_features(self) -> Dict[str, Dict]:
+        return self._snapshot.critical_features
+    
+    def register_derived(self, name: str, builder: Callable[[BaselineSnapshot], Any]) -> Any:
+        """
+        Đăng ký một index dẫn xuất được build cùng mỗi snapshot (vd: feature group plan)
+        
+        Returns giá trị đã build cho snapshot hiện tại
+        """
+        with self._reload_lock:
+            self._derived_builders[name] = builder
+            current = self._snapshot
+            if name not in current.derived:
+                derived = dict(current.derived)
+                derived[name] = builder(current)
+                self._snapshot = replace(current, derived=derived)
+            return self._snapshot.derived[name]
+    
+    def reload_stats(self) -> bool:
+        """
+        Parse lại feature_stats.json (hoặc binary artifact) và swap snapshot mới
+        
+        Returns False (giữ nguyên snapshot đang dùng) nếu file lỗi hoặc không hợp lệ
+        """
+        with self._reload_lock:
+            try:
+                snapshot = self._load_from_file()
+            except Exception as e:
+                logger.error(f"Failed to reload baseline stats, keeping v{self._snapshot.version}: {e}")
+                return False
+            self._snapshot = snapshot
+            return True
+    
+    def check_for_updates(self) -> bool:
+        """Reload nếu feature_stats.json hoặc artifact đi kèm đã thay đổi (inode/mtime/size), returns True nếu đã swap"""
+        if not self.stats_file_path or not os.path.exists(self.stats_file_path):
+            return False
+        file_signature = tuple(_optional_signature(path) for path in self._watched_paths())
+        # NOTE: Không thử lại file lỗi cho tới khi nó thay đổi tiếp
+        if file_signature in (self._snapshot.file_signature, self._failed_signature):
+            return False
+        if self.reload_stats():
+            return True
+        self._failed_signature = file_signature
+        return False
+    
+    def _watch(self, interval: float) -> None:
+        while not self._watch_stop.wait(interval):
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                logger.error(f"Baseline stats watcher error: {e}")
+    
+    def start_watching(self, interval: Optional[float] = None) -> None:
+        # NOTE: BASELINE_WATCH_INTERVAL=0 để tắt hot-reload
+        if interval is None:
+            interval = float(os.getenv("BASELINE_WATCH_INTERVAL", DEFAULT_WATCH_INTERVAL))
+        if interval <= 0 or (self._watch_thread and self._watch_thread.is_alive()):
+            return
+        
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, args=(interval,),
+                                              name="baseline-stats-watcher", daemon=True)
+        self._watch_thread.start()
+    
+    def stop_watching(self) -> None:
+        self._watch_stop.set()
+        if self._watch_thread:
+            self._watch_thread.join(timeout=5)
+            self._watch_thread = None
     
     def get_feature_stats_summary(self) -> Dict:
-        baseline_stats = self.get_baseline_stats()
-        critical_features = self.get_critical_features()
+        snapshot = self.get_snapshot()
+        baseline_stats = snapshot.baseline_stats
+        critical_features = snapshot.critical_features
         
         return {
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
             'total_ai_features': len(baseline_stats.ai_stats),
             'total_human_features': len(baseline_stats.human_stats),
             'critical_features_count': len(critical_features),
-            'stats_file_path': self.stats_file_path,
+            'stats_file_path': snapshot.stats_file_path,
             'top_critical_features': list(critical_features.keys())[:5]
         }
 
@@ -148,9 +476,9 @@ def get_baseline_loader() -> BaselineLoader:
         _baseline_loader = BaselineLoader()
     return _baseline_loader
 
-def reload_baseline_stats():
+def reload_baseline_stats() -> bool:
     global _baseline_loader
     if _baseline_loader:
-        _baseline_loader.reload_stats()
-    else:
-        _baseline_loader = BaselineLoader()
\ No newline at end of file
+        return _baseline_loader.reload_stats()
+    _baseline_loader = BaselineLoader()
+    return True
@@ -0,0 +1,104 @@
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = Path(__file__).parent.parent / "data" / "spool"
+DEFAULT_SPOOL_TTL = 24 * 3600       # NOTE: Giống BATCH_RESULT_TTL - spool bị bỏ dở (server restart) cũng hết hạn
+DEFAULT_CHUNK_SIZE = 1024 * 1024    # NOTE: Upload được ghi xuống theo chunk 1MB, không đọc cả file vào RAM
+
+
+class SpoolLimitExceeded(Exception):
+    """Upload vượt quá max_bytes khi đang ghi xuống spool"""
+
+
+class BatchSpool:
+    """Thư mục spool riêng cho mỗi batch job, tồn tại đến khi job xong hoặc hết hạn"""
+
+    def __init__(self, spool_dir: Optional[str] = None,
+                 ttl: Optional[float] = None,
+                 chunk_size: Optional[int] = None):
+        self.spool_dir = Path(spool_dir or os.getenv("BATCH_SPOOL_DIR") or DEFAULT_SPOOL_DIR)
+        self.ttl = float(ttl if ttl is not None else os.getenv("BATCH_SPOOL_TTL", DEFAULT_SPOOL_TTL))
+        self.chunk_size = int(chunk_size if chunk_size is not None
+                              else os.getenv("BATCH_SPOOL_CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def job_dir(self, job_id: str) -> Path:
+        # NOTE: job_id do server sinh ra nhưng vẫn chặn path traversal
+        return self.spool_dir / Path(job_id).name
+
+    async def write_upload(self, job_id: str, filename: str, stream,
+                           max_bytes: Optional[int] = None) -> Path:
+        """
+        Ghi stream (UploadFile hoặc object có async read(n)) vào spool của job theo từng chunk
+
+        Raises:
+            SpoolLimitExceeded: nếu vượt max_bytes (file đang ghi dở bị xóa)
+        """
+        job_dir = self.job_dir(job_id)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        path = job_dir / Path(filename).name
+
+        written = 0
+        try:
+            async with aiofiles.open(path, 'wb') as f:
+                while True:
+                    chunk = await stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if max_bytes is not None and written > max_bytes:
+                        raise SpoolLimitExceeded(f"Upload vượt quá {max_bytes} bytes")
+                    await f.write(chunk)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+
+        logger.info(f"Spooled {written} bytes to {path}")
+        return path
+
+    def release(self, job_id: str) -> None:
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def job_ids(self) -> List[str]:
+        try:
+            return [entry.name for entry in os.scandir(self.spool_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return []
+
+    def purge(self, is_finished: Optional[Callable[[str], bool]] = None) -> int:
+        """Xóa spool của các job đã xong (is_finished) hoặc cũ hơn ttl"""
+        now = time.time()
+        purged = 0
+        for job_id in self.job_ids():
+            job_dir = self.job_dir(job_id)
+            try:
+                expired = now - job_dir.stat().st_mtime > self.ttl
+            except FileNotFoundError:
+                continue
+
+            # NOTE: Job chưa có trong batch store (đang upload) chỉ bị xóa khi hết hạn
+            if expired or (is_finished is not None and is_finished(job_id)):
+                self.release(job_id)
+                purged += 1
+
+        if purged:
+            logger.info(f"Purged {purged} batch spool directories")
+        return purged
+
+
+_batch_spool: Optional[BatchSpool] = None
+
+
+def get_batch_spool() -> BatchSpool:
+    global _batch_spool
+    if _batch_spool is None:
+        _batch_spool = BatchSpool()
+    return _batch_spool
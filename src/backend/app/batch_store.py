@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "data" / "batch_results.db"
+DEFAULT_RESULT_TTL = 24 * 3600      # NOTE: Batch đã xong được giữ 24h
+DEFAULT_PROCESSING_TTL = 24 * 3600  # NOTE: Batch "processing" bị bỏ dở (server restart) cũng hết hạn
+DEFAULT_MAX_BATCHES = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total_files INTEGER NOT NULL,
+    processed_files INTEGER NOT NULL DEFAULT 0,
+    success_count INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    completed_at TEXT,
+    error_message TEXT,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_batches_status ON batches(status);
+CREATE INDEX IF NOT EXISTS idx_batches_expires_at ON batches(expires_at);
+
+CREATE TABLE IF NOT EXISTS batch_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_batch_results_batch_id ON batch_results(batch_id);
+"""
+
+_BATCH_COLUMNS = (
+    "batch_id", "status", "total_files", "processed_files", "success_count",
+    "error_count", "created_at", "completed_at", "error_message"
+)
+
+
+class BatchWriteError(Exception):
+    """Một hoặc nhiều lô results của batch không ghi được xuống store"""
+
+
+class BatchStore:
+    """SQLite store cho batch jobs và results, dùng chung giữa các uvicorn workers"""
+
+    def __init__(self, db_path: Optional[str] = None,
+                 result_ttl: Optional[float] = None,
+                 processing_ttl: Optional[float] = None,
+                 max_batches: Optional[int] = None):
+        self.db_path = str(db_path or os.getenv("BATCH_DB_PATH") or DEFAULT_DB_PATH)
+        self.result_ttl = float(result_ttl if result_ttl is not None
+                                else os.getenv("BATCH_RESULT_TTL", DEFAULT_RESULT_TTL))
+        self.processing_ttl = float(processing_ttl if processing_ttl is not None else DEFAULT_PROCESSING_TTL)
+        self.max_batches = int(max_batches if max_batches is not None
+                               else os.getenv("BATCH_MAX_STORED", DEFAULT_MAX_BATCHES))
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        # NOTE: timeout để chờ lock khi nhiều worker process cùng ghi
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        logger.info(f"Opened batch store at {self.db_path}")
+        return conn
+
+    def create_batch(self, batch_id: str, total_files: int, created_at: str,
+                     status: str = "processing") -> Dict[str, Any]:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO batches (batch_id, status, total_files, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (batch_id, status, total_files, created_at, time.time() + self.processing_ttl)
+            )
+        return self.get_batch(batch_id, include_results=False)
+
+    def append_results(self, batch_id: str, results: List[Dict[str, Any]]) -> None:
+        # NOTE: Results và counters được ghi trong cùng một transaction
+        if not results:
+            return
+
+        rows = [(batch_id, r.get("status", ""), json.dumps(r, ensure_ascii=False)) for r in results]
+        success = sum(1 for r in results if r.get("status") == "success")
+        errors = sum(1 for r in results if r.get("status") == "error")
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO batch_results (batch_id, status, payload) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "UPDATE batches SET processed_files = processed_files + ?, "
+                "success_count = success_count + ?, error_count = error_count + ? "
+                "WHERE batch_id = ?",
+                (len(results), success, errors, batch_id)
+            )
+
+    def add_total_files(self, batch_id: str, count: int) -> None:
+        # NOTE: Cho batch đọc dạng stream (vd: tar) - tổng số file chỉ biết dần trong lúc phân tích
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE batches SET total_files = total_files + ? WHERE batch_id = ?",
+                (count, batch_id)
+            )
+
+    def finish_batch(self, batch_id: str, status: str, completed_at: str,
+                     error_message: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE batches SET status = ?, completed_at = ?, error_message = ?, expires_at = ? "
+                "WHERE batch_id = ?",
+                (status, completed_at, error_message, time.time() + self.result_ttl, batch_id)
+            )
+
+    def get_batch(self, batch_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_BATCH_COLUMNS)} FROM batches WHERE batch_id = ? AND expires_at > ?",
+                (batch_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+
+            batch = dict(row)
+            batch["results"] = []
+            if include_results:
+                cursor = self._conn.execute(
+                    "SELECT payload FROM batch_results WHERE batch_id = ? ORDER BY id", (batch_id,)
+                )
+                batch["results"] = [json.loads(payload) for (payload,) in cursor]
+        return batch
+
+    def purge_expired(self) -> int:
+        """Xóa batches hết hạn và giới hạn tổng số batches được lưu"""
+        now = time.time()
+        with self._lock, self._conn:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT batch_id FROM batches WHERE expires_at <= ?", (now,)
+            )]
+
+            overflow = self._conn.execute("SELECT COUNT(*) FROM batches").fetchone()[0] \
+                - len(expired) - self.max_batches
+            if overflow > 0:
+                # NOTE: Vượt giới hạn - bỏ các batch đã xong cũ nhất trước
+                expired.extend(row[0] for row in self._conn.execute(
+                    "SELECT batch_id FROM batches WHERE expires_at > ? AND status != 'processing' "
+                    "ORDER BY expires_at LIMIT ?", (now, overflow)
+                ))
+
+            params = [(batch_id,) for batch_id in expired]
+            self._conn.executemany("DELETE FROM batch_results WHERE batch_id = ?", params)
+            self._conn.executemany("DELETE FROM batches WHERE batch_id = ?", params)
+
+        if expired:
+            logger.info(f"Purged {len(expired)} expired batches")
+        return len(expired)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BatchResultWriter:
+    """
+    Gom results của một batch và ghi xuống store theo lô
+
+    Dùng trong event loop: mỗi lô được ghi trong thread (sqlite có thể chờ lock tới 30s khi process khác đang ghi),
+    add() không bao giờ block event loop
+    """
+
+    def __init__(self, store: BatchStore, batch_id: str,
+                 flush_size: int = 25, flush_interval: float = 1.0):
+        self.store = store
+        self.batch_id = batch_id
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._writes = set()
+        self._failed_writes = 0
+        self._first_error: Optional[BaseException] = None
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self._pending.append(result)
+        # NOTE: Flush theo số lượng hoặc thời gian để /status vẫn thấy tiến độ gần real-time
+        if len(self._pending) >= self.flush_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        # NOTE: Lấy lô trong event loop thread, chỉ phần ghi sqlite chạy trong thread khác
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        task = asyncio.ensure_future(asyncio.to_thread(self.store.append_results, self.batch_id, pending))
+        self._writes.add(task)
+        task.add_done_callback(self._write_done)
+
+    def _write_done(self, task: asyncio.Future) -> None:
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to write results of batch {self.batch_id}: {task.exception()}")
+            self._failed_writes += 1
+            if self._first_error is None:
+                self._first_error = task.exception()
+
+    async def flush(self) -> None:
+        """
+        Ghi phần còn lại và chờ mọi lô đang ghi xong
+
+        Raises:
+            BatchWriteError: nếu có lô nào ghi thất bại (kể cả các lô đã xong trước khi flush)
+        """
+        self._write_pending()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        if self._failed_writes:
+            raise BatchWriteError(f"Không ghi được {self._failed_writes} lô results của batch {self.batch_id}: "
+                                  f"{self._first_error}")
+
+
+_batch_store: Optional[BatchStore] = None
+
+
+def get_batch_store() -> BatchStore:
+    global _batch_store
+    if _batch_store is None:
+        _batch_store = BatchStore()
+    return _batch_store
+
+
+def close_batch_store() -> None:
+    global _batch_store
+    if _batch_store:
+        _batch_store.close()
+        _batch_store = None
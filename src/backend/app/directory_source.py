@@ -0,0 +1,69 @@
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from archive_reader import ArchiveLimits, ArchiveScan, is_code_file
+
+logger = logging.getLogger(__name__)
+
+
+def allowed_directories() -> List[str]:
+    """BATCH_ALLOWED_DIRS: các thư mục gốc (phân tách bằng os.pathsep) được phép dùng làm batch source"""
+    roots = os.getenv("BATCH_ALLOWED_DIRS", "")
+    return [os.path.realpath(root) for root in roots.split(os.pathsep) if root.strip()]
+
+
+def resolve_allowed_directory(path: str, roots: Optional[List[str]] = None) -> Optional[str]:
+    """Đường dẫn thật (đã resolve symlink/..) nếu nằm trong một thư mục được phép, ngược lại None"""
+    roots = allowed_directories() if roots is None else roots
+    real_path = os.path.realpath(path)
+    for root in roots:
+        if os.path.commonpath([root, real_path]) == root:
+            return real_path
+    return None
+
+
+def scan_directory(root: str, limits: Optional[ArchiveLimits] = None) -> ArchiveScan:
+    """
+    Liệt kê file code trong root (đệ quy) bằng os.scandir, không copy hay đọc nội dung
+
+    Symlinks bị bỏ qua để không thoát ra ngoài thư mục được phép; dùng chung ArchiveLimits với archive upload
+    """
+    limits = limits or ArchiveLimits.from_env()
+    result = ArchiveScan()
+    pending = [root]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"Cannot scan {current}: {e}")
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+                continue
+            if not entry.is_file(follow_symlinks=False) or not is_code_file(entry.name):
+                continue
+            if len(result.members) + len(result.skipped) >= limits.max_members:
+                result.dropped += 1
+                continue
+
+            member = {
+                'filename': entry.name,
+                'filepath': Path(os.path.relpath(entry.path, root)).as_posix(),
+                'extracted_path': entry.path
+            }
+            size = entry.stat(follow_symlinks=False).st_size
+            if size > limits.max_member_bytes:
+                result.skipped.append(dict(member, reason=f"File quá lớn ({size} bytes, tối đa {limits.max_member_bytes})"))
+            else:
+                result.members.append(member)
+
+    if result.skipped or result.dropped:
+        logger.warning(f"{root}: skipped {len(result.skipped)} files, "
+                       f"dropped {result.dropped} files over max_members={limits.max_members}")
+    return result
@@ -4,20 +4,11 @@ import traceback
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any, Tuple, Union
+from dataclasses import dataclass
 import tempfile
 import json
 import asyncio
-import zipfile
-try:
-    import rarfile
-    RARFILE_AVAILABLE = True
-except ImportError:
-    RARFILE_AVAILABLE = False
-    class rarfile:
-        @staticmethod
-        def RarFile(*args, **kwargs):
-            raise ImportError("rarfile module not available")
 
 try:
     import googleapiclient.discovery
@@ -46,6 +37,16 @@ try:
 except ImportError as e:
     GENAI_AVAILABLE = False
 
+# NOTE: baseline_loader, analysis_pool, batch_store nằm cùng thư mục với main.py,
+# worker processes import lại theo cùng tên module
+current_dir = Path(__file__).parent.absolute()
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+# NOTE: src/src phải có trong sys.path trước khi import baseline_loader (dùng binary_artifact)
+src_dir = current_dir.parent.parent / "src"
+sys.path.insert(0, str(src_dir))
+
 try:
     from baseline_loader import get_baseline_loader, reload_baseline_stats
     BASELINE_LOADER_AVAILABLE = True
@@ -71,10 +72,6 @@ if BASELINE_LOADER_AVAILABLE:
     except Exception as e:
         BASELINE_LOADER_AVAILABLE = False
 
-current_dir = Path(__file__).parent.absolute()
-src_dir = current_dir.parent.parent / "src"
-sys.path.insert(0, str(src_dir))
-
 try:
     from features.advanced_features import AdvancedFeatureExtractor, ComprehensiveFeatures
     from features.ast_analyzer import CppASTAnalyzer, ASTFeatures
@@ -95,6 +92,21 @@ except ImportError as e:
         def analyze_code(self, code: str, filename: str = "") -> Dict:
             return {"error": "Human style analyzer không khả dụng"}
 
+try:
+    from analysis_pool import get_analysis_pool, shutdown_analysis_pool
+    ANALYSIS_POOL_AVAILABLE = ANALYSIS_MODULES_AVAILABLE
+except ImportError as e:
+    ANALYSIS_POOL_AVAILABLE = False
+
+from batch_store import BatchResultWriter, get_batch_store, close_batch_store
+from batch_spool import SpoolLimitExceeded, get_batch_spool
+from archive_reader import (
+    ARCHIVE_EXTENSIONS, CODE_EXTENSIONS, ArchiveLimits, ArchiveReader, ArchiveScan, TarStreamReader, is_tar_archive
+)
+from directory_source import allowed_directories, resolve_allowed_directory, scan_directory
+
+BATCH_PURGE_INTERVAL = 300  # seconds
+
 app = FastAPI(
     title="API Phân tích phát hiện mã AI",
     description="API để phân tích mã nhằm phát hiện mẫu do AI tạo vs mẫu viết bởi con người",
@@ -111,12 +123,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def load_baseline_index():
+    # NOTE: Build BaselineIndex và FeatureGroupPlan từ feature_stats.json một lần trước khi nhận request,
+    # sau đó theo dõi file để hot-reload khi stats được train lại
+    try:
+        await asyncio.to_thread(get_feature_group_plan)
+        get_baseline_loader().start_watching()
+    except Exception as e:
+        print(f"⚠️ Không thể load baseline index: {e}")
+
+@app.on_event("shutdown")
+async def stop_baseline_watcher():
+    try:
+        get_baseline_loader().stop_watching()
+    except Exception as e:
+        print(f"⚠️ Không thể dừng baseline watcher: {e}")
+
+@app.on_event("startup")
+async def start_analysis_pool():
+    # NOTE: Khởi động process pool và pre-load analyzers trong workers, không block event loop
+    if ANALYSIS_POOL_AVAILABLE:
+        try:
+            await asyncio.to_thread(get_analysis_pool().start)
+        except Exception as e:
+            print(f"⚠️ Không thể khởi động analysis pool: {e}")
+
+@app.on_event("shutdown")
+async def stop_analysis_pool():
+    if ANALYSIS_POOL_AVAILABLE:
+        shutdown_analysis_pool()
+
+def is_batch_finished(batch_id: str) -> bool:
+    batch = get_batch_store().get_batch(batch_id, include_results=False)
+    return batch is not None and batch['status'] != "processing"
+
+async def purge_expired_batches_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(get_batch_store().purge_expired)
+        except Exception as e:
+            print(f"⚠️ Không thể dọn batch hết hạn: {e}")
+        try:
+            # NOTE: Spool của batch đã xong/lỗi hoặc quá hạn (vd: worker chết giữa chừng)
+            await asyncio.to_thread(get_batch_spool().purge, is_batch_finished)
+        except Exception as e:
+            print(f"⚠️ Không thể dọn batch spool: {e}")
+        await asyncio.sleep(BATCH_PURGE_INTERVAL)
+
+@app.on_event("startup")
+async def start_batch_store():
+    get_batch_store()
+    app.state.batch_purge_task = asyncio.create_task(purge_expired_batches_periodically())
+
+@app.on_event("shutdown")
+async def stop_batch_store():
+    purge_task = getattr(app.state, "batch_purge_task", None)
+    if purge_task:
+        purge_task.cancel()
+    close_batch_store()
+
 if ANALYSIS_MODULES_AVAILABLE:
     advanced_extractor = AdvancedFeatureExtractor()
     ast_analyzer = CppASTAnalyzer()
     human_style_analyzer = HumanStyleAnalyzer()
     try:
-        detection_model = create_detector("enhanced")
+        # NOTE: DETECTOR_TYPE=ensemble để so sánh heuristic + enhanced + classifier trên cùng features
+        # NOTE: DETECTOR_THRESHOLDS_PATH = thresholds đã tune bằng threshold_tuning.py cho DETECTOR_TYPE
+        detection_model = create_detector(os.getenv("DETECTOR_TYPE", "enhanced"),
+                                          os.getenv("DETECTOR_THRESHOLDS_PATH") or None)
     except Exception as e:
         detection_model = create_detector("heuristic")
 else:
@@ -355,13 +430,14 @@ class FileAnalysisResult(BaseModel):
     error_message: Optional[str] = None
 
 class BatchAnalysisRequest(BaseModel):
-    source_type: str = Field(..., description="Type of source: 'zip' or 'google_drive'")
+    source_type: str = Field(..., description="Type of source: 'zip', 'google_drive' or 'directory'")
     google_drive_url: Optional[str] = Field(None, description="Google Drive share URL")
+    directory_path: Optional[str] = Field(None, description="Server-side directory (must be under BATCH_ALLOWED_DIRS)")
 
     @validator('source_type')
     def validate_source_type(cls, v):
-        if v not in ['zip', 'google_drive']:
-            raise ValueError("source_type phải là 'zip' hoặc 'google_drive'")
+        if v not in ['zip', 'google_drive', 'directory']:
+            raise ValueError("source_type phải là 'zip', 'google_drive' hoặc 'directory'")
         return v
 
     @validator('google_drive_url')
@@ -372,6 +448,12 @@ class BatchAnalysisRequest(BaseModel):
             raise ValueError("URL không hợp lệ cho Google Drive")
         return v
 
+    @validator('directory_path', always=True)
+    def validate_directory_path(cls, v, values):
+        if values.get('source_type') == 'directory' and not v:
+            raise ValueError("directory_path là bắt buộc khi source_type là 'directory'")
+        return v
+
 class BatchAnalysisResponse(BaseModel):
     batch_id: str
     total_files: int
@@ -383,6 +465,8 @@ class BatchAnalysisResponse(BaseModel):
     created_at: str
     completed_at: Optional[str] = None
     error_message: Optional[str] = None
+    files_per_second: Optional[float] = None  # NOTE: Throughput tính từ lúc tạo batch
+    eta_seconds: Optional[float] = None       # NOTE: Ước lượng thời gian còn lại khi đang processing
 
 
 def generate_analysis_id() -> str:
@@ -541,59 +625,60 @@ def get_file_language(filename: str) -> str:
     }
     return language_map.get(ext, 'c')
 
-def extract_files_from_archive(archive_path: str, extract_to: str) -> List[Dict[str, str]]:
-    extracted_files = []
-
+def scan_archive_files(reader: ArchiveReader) -> ArchiveScan:
+    # NOTE: Chỉ đọc danh sách members theo ArchiveLimits, nội dung được giải nén lazily khi phân tích từng file
     try:
-        if archive_path.endswith('.zip'):
-            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                for file_info in zip_ref.filelist:
-                    if not file_info.is_dir():
-                        filename = file_info.filename
-                        if any(filename.endswith(ext) for ext in ['.c', '.cpp', '.cc', '.cxx', '.h', '.hpp', '.txt']):
-                            extracted_path = zip_ref.extract(file_info, extract_to)
-                            extracted_files.append({
-                                'filename': Path(filename).name,
-                                'filepath': filename,
-                                'extracted_path': extracted_path,
-                                'language': get_file_language(filename)
-                            })
-
-        elif archive_path.endswith('.rar'):
-            if not RARFILE_AVAILABLE:
-                raise HTTPException(
-                    status_code=400,
-                    detail="RAR file support not available. Please install rarfile module."
-                )
-            with rarfile.RarFile(archive_path, 'r') as rar_ref:
-                for file_info in rar_ref.infolist():
-                    if not file_info.isdir():
-                        filename = file_info.filename
-                        if any(filename.endswith(ext) for ext in ['.c', '.cpp', '.cc', '.cxx', '.h', '.hpp', '.txt']):
-                            extracted_path = rar_ref.extract(file_info, extract_to)
-                            extracted_files.append({
-                                'filename': Path(filename).name,
-                                'filepath': filename,
-                                'extracted_path': str(extracted_path) if isinstance(extracted_path, Path) else extracted_path,
-                                'language': get_file_language(filename)
-                            })
-
+        scan = reader.scan()
+    except ImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Lỗi extract archive: {e}")
+        print(f"Lỗi đọc archive: {e}")
         raise HTTPException(
             status_code=400,
-            detail=f"Không thể extract file: {str(e)}"
+            detail=f"Không thể đọc file nén: {str(e)}"
         )
 
-    return extracted_files
+    for member in scan.members + scan.skipped:
+        member['language'] = get_file_language(member['filename'])
+    return scan
+
+def error_file_result(file_info: Dict[str, Any], error_message: str) -> FileAnalysisResult:
+    return FileAnalysisResult(
+        filename=file_info.get('filename', "unknown"),
+        filepath=file_info.get('filepath', "unknown"),
+        language=file_info.get('language', "c"),
+        loc=0,
+        file_size=0,
+        ai_similarity=0.0,
+        human_similarity=0.0,
+        confidence=0.0,
+        analysis_id="",
+        status="error",
+        code_content=None,
+        error_message=error_message
+    )
+
+async def read_file_content(file_info: Dict[str, Any]) -> str:
+    # NOTE: Member của archive đã được ArchiveReader.iter_members giải nén sẵn
+    if 'read_error' in file_info:
+        raise file_info['read_error']
+    if 'content' in file_info:
+        return file_info['content'].decode('utf-8')
 
-async def analyze_file_batch(files_info: List[Dict[str, str]]) -> List[FileAnalysisResult]:
-    results = []
+    async with aiofiles.open(file_info['extracted_path'], 'r', encoding='utf-8') as f:
+        return await f.read()
+
+async def analyze_file_batch(
+    files_info: Union[List[Dict[str, Any]], AsyncIterator[Dict[str, Any]]],
+    on_result: Optional[Callable[[FileAnalysisResult], None]] = None
+) -> Optional[List[FileAnalysisResult]]:
+    # NOTE: on_result được gọi ngay khi từng file hoàn tất (theo thứ tự hoàn tất)
+    # files_info có thể là async iterator (vd: members đang được giải nén) - file được phân tích ngay khi sẵn sàng;
+    # khi đó results chỉ được trả về nếu không có on_result (None nếu có)
 
     async def analyze_single_file(file_info: Dict[str, str]) -> FileAnalysisResult:
         try:
-            async with aiofiles.open(file_info['extracted_path'], 'r', encoding='utf-8') as f:
-                content = await f.read()
+            content = await read_file_content(file_info)
 
             if not content.strip():
                 return FileAnalysisResult(
@@ -656,117 +741,103 @@ async def analyze_file_batch(files_info: List[Dict[str, str]]) -> List[FileAnaly
                 )
 
         except Exception as e:
-            return FileAnalysisResult(
-                filename=file_info['filename'],
-                filepath=file_info['filepath'],
-                language=file_info['language'],
-                loc=0,
-                file_size=0,
-                ai_similarity=0.0,
-                human_similarity=0.0,
-                confidence=0.0,
-                analysis_id="",
-                status="error",
-                code_content=None,
-                error_message=str(e)
-            )
-    semaphore = asyncio.Semaphore(5)
+            return error_file_result(file_info, str(e))
+    # NOTE: Đủ file đang chờ để giữ mọi worker trong analysis pool luôn bận
+    max_concurrency = get_analysis_pool().concurrency * 2 if ANALYSIS_POOL_AVAILABLE else 5
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def analyze(file_info) -> FileAnalysisResult:
+        try:
+            return await analyze_single_file(file_info)
+        except Exception as e:
+            return error_file_result(file_info, str(e))
 
     async def limited_analyze(file_info):
         async with semaphore:
-            return await analyze_single_file(file_info)
+            result = await analyze(file_info)
 
-    tasks = [limited_analyze(file_info) for file_info in files_info]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+        if on_result:
+            on_result(result)
+        return result
 
-    final_results = []
-    for result in results:
-        if isinstance(result, Exception):
-            final_results.append(FileAnalysisResult(
-                filename="unknown",
-                filepath="unknown",
-                language="c",
-                loc=0,
-                file_size=0,
-                ai_similarity=0.0,
-                human_similarity=0.0,
-                confidence=0.0,
-                analysis_id="",
-                status="error",
-                code_content=None,
-                error_message=str(result)
-            ))
+    if not hasattr(files_info, '__aiter__'):
+        tasks = [limited_analyze(file_info) for file_info in files_info]
+        return list(await asyncio.gather(*tasks))
+
+    # NOTE: Có on_result thì results không được giữ lại - bộ nhớ chỉ phụ thuộc số file đang phân tích
+    results: Optional[List[FileAnalysisResult]] = [] if on_result is None else None
+
+    async def analyze_acquired(file_info):
+        try:
+            result = await analyze(file_info)
+        finally:
+            semaphore.release()
+
+        if on_result:
+            on_result(result)
         else:
-            final_results.append(result)
+            results.append(result)
 
-    return final_results
+    # NOTE: Chỉ lấy file tiếp theo từ iterator khi còn slot, giữ số file đã đọc vào RAM có giới hạn
+    pending = set()
+    source = files_info.__aiter__()
+    while True:
+        await semaphore.acquire()
+        try:
+            file_info = await source.__anext__()
+        except StopAsyncIteration:
+            semaphore.release()
+            break
+        task = asyncio.create_task(analyze_acquired(file_info))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+    return results
 
 def calculate_file_size(code: str) -> int:
     return len(code.encode('utf-8'))
 
-def calculate_baseline_comparison(feature_name: str, current_value: float) -> Optional[BaselineComparison]:
+def get_baseline_index():
+    # NOTE: BaselineIndex được build một lần khi load feature_stats.json, dùng chung cho mọi request
+    return get_baseline_loader().get_baseline_index()
+
+def calculate_baseline_comparisons(feature_names: List[str], values: List[float], baseline_index=None):
+    # NOTE: Tính similarity/deviation/verdict cho tất cả features trong một lượt NumPy
     try:
-        from baseline_loader import get_baseline_loader
-        baseline_loader = get_baseline_loader()
-        baseline_stats = baseline_loader.get_baseline_stats()
-        baseline = baseline_stats.get_feature_baseline(feature_name)
-        if not baseline:
-            available_features = list(baseline_stats.ai_stats.keys())[:10]
-            return None
-            
-        ai_baseline, human_baseline = baseline
-        
-        baseline_range = abs(ai_baseline - human_baseline)
-        if baseline_range == 0:
-            return None
-        ai_distance = abs(current_value - ai_baseline)
-        human_distance = abs(current_value - human_baseline)
-        ai_distance_norm = min(ai_distance / baseline_range, 2.0) if baseline_range > 0 else 0
-        human_distance_norm = min(human_distance / baseline_range, 2.0) if baseline_range > 0 else 0
-        
-        ai_similarity = max(0, 1.0 - ai_distance_norm)
-        human_similarity = max(0, 1.0 - human_distance_norm)
-        if ai_baseline < human_baseline:
-            deviation_from_ai = (current_value - ai_baseline) / baseline_range
-            deviation_from_human = (current_value - human_baseline) / baseline_range
-        else:
-            deviation_from_ai = (ai_baseline - current_value) / baseline_range
-            deviation_from_human = (human_baseline - current_value) / baseline_range
-        deviation_from_ai = max(-2.0, min(2.0, deviation_from_ai))
-        deviation_from_human = max(-2.0, min(2.0, deviation_from_human))
-        if ai_similarity > human_similarity + 0.1:
-            verdict = "ai-like"
-            confidence = min(0.95, ai_similarity)
-        elif human_similarity > ai_similarity + 0.1:
-            verdict = "human-like"
-            confidence = min(0.95, human_similarity)
-        else:
-            verdict = "neutral"
-            confidence = 0.5
-        if verdict == "ai-like":
-            explanation = f"Gần baseline AI ({ai_baseline:.3f}) hơn baseline Human ({human_baseline:.3f})"
-        elif verdict == "human-like":
-            explanation = f"Gần baseline Human ({human_baseline:.3f}) hơn baseline AI ({ai_baseline:.3f})"
-        else:
-            explanation = f"Nằm giữa baseline AI ({ai_baseline:.3f}) và baseline Human ({human_baseline:.3f})"
-        
-        return BaselineComparison(
-            ai_baseline=ai_baseline,
-            human_baseline=human_baseline,
-            current_value=current_value,
-            deviation_from_ai=deviation_from_ai,
-            deviation_from_human=deviation_from_human,
-            ai_similarity=ai_similarity,
-            human_similarity=human_similarity,
-            verdict=verdict,
-            confidence=confidence,
-            explanation=explanation
-        )
-        
+        return (baseline_index or get_baseline_index()).compare(feature_names, values)
     except Exception as e:
-        print(f"⚠️ Lỗi tính toán so sánh baseline cho {feature_name}: {e}")
+        print(f"⚠️ Lỗi tính toán so sánh baseline: {e}")
         return None
 
+def build_baseline_comparison(comparisons, position: int, current_value: float) -> Optional[BaselineComparison]:
+    # NOTE: Chỉ tạo BaselineComparison model cho các features thực sự được trả về
+    if not comparisons.comparable[position]:
+        return None
+    
+    ai_baseline = float(comparisons.ai_baselines[position])
+    human_baseline = float(comparisons.human_baselines[position])
+    verdict = comparisons.verdicts[position]
+    if verdict == "ai-like":
+        explanation = f"Gần baseline AI ({ai_baseline:.3f}) hơn baseline Human ({human_baseline:.3f})"
+    elif verdict == "human-like":
+        explanation = f"Gần baseline Human ({human_baseline:.3f}) hơn baseline AI ({ai_baseline:.3f})"
+    else:
+        explanation = f"Nằm giữa baseline AI ({ai_baseline:.3f}) và baseline Human ({human_baseline:.3f})"
+    
+    return BaselineComparison(
+        ai_baseline=ai_baseline,
+        human_baseline=human_baseline,
+        current_value=current_value,
+        deviation_from_ai=float(comparisons.deviation_from_ai[position]),
+        deviation_from_human=float(comparisons.deviation_from_human[position]),
+        ai_similarity=float(comparisons.ai_similarity[position]),
+        human_similarity=float(comparisons.human_similarity[position]),
+        verdict=verdict,
+        confidence=float(comparisons.confidences[position]),
+        explanation=explanation
+    )
+
 def interpret_feature(feature_name: str, value: float, normalized: bool = True) -> str:
     interpretations = {
         "loc": f"{'Small' if value < 50 else 'Medium' if value < 200 else 'Large'} codebase ({value} lines)",
@@ -783,125 +854,153 @@ def interpret_feature(feature_name: str, value: float, normalized: bool = True)
     
     return interpretations.get(feature_name, f"Giá trị: {value:.3f}")
 
+# NOTE: Thứ tự kiểm tra keywords quyết định group của feature, không khớp group nào → structure_metrics
+FEATURE_GROUP_KEYWORDS = [
+    ('structure_metrics', [
+        'ast_', 'nodes', 'depth', 'branching', 'control', 'statements', 
+        'loops', 'functions_per_loc', 'loc', 'recursive'
+    ]),
+    ('style_metrics', [
+        'spacing', 'indentation', 'formatting', 'brace', 'operator_spacing',
+        'camel_case', 'snake_case', 'consistency', 'style'
+    ]),
+    ('complexity_metrics', [
+        'complexity', 'halstead', 'cognitive', 'maintainability', 
+        'cyclomatic', 'comment_ratio', 'code_to_comment'
+    ]),
+    ('naming_metrics', [
+        'naming', 'variable', 'descriptive', 'generic', 'abbreviation',
+        'meaningful_names', 'hungarian', 'magic_numbers'
+    ]),
+    ('ai_detection_metrics', [
+        'ai_pattern', 'template', 'boilerplate', 'error_handling',
+        'defensive', 'over_engineering', 'redundancy', 'duplicate'
+    ]),
+]
+
+# NOTE: Dùng khi không có baseline stats cho features của request
+DEFAULT_FEATURE_CATEGORIES = {
+    'structure_metrics': [
+        "loc", "nodes_per_loc", "max_depth", "avg_depth", "branching_factor",
+        "if_statements_per_loc", "for_loops_per_loc", "while_loops_per_loc",
+        "functions_per_loc", "cyclomatic_complexity"
+    ],
+    'style_metrics': [
+        "spacing_issues_ratio", "indentation_issues_ratio", "naming_inconsistency_ratio",
+        "formatting_issues_ratio", "human_style_overall_score", "indentation_consistency",
+        "brace_style_consistency", "operator_spacing_consistency"
+    ],
+    'complexity_metrics': [
+        "halstead_complexity", "halstead_per_loc", "cognitive_complexity", 
+        "cognitive_per_loc", "maintainability_index", "code_to_comment_ratio",
+        "variable_uniqueness_ratio", "avg_function_length"
+    ],
+    'ai_detection_metrics': [
+        "template_usage_score", "boilerplate_ratio", "error_handling_score",
+        "defensive_programming_score", "over_engineering_score", "copy_paste_score",
+        "redundancy_duplicate_line_ratio", "ai_pattern_template_usage_score"
+    ]
+}
+
+MAX_STYLE_FEATURES = 12
+
+def categorize_feature(feature: str) -> str:
+    feature_lower = feature.lower()
+    for group_key, keywords in FEATURE_GROUP_KEYWORDS:
+        if any(keyword in feature_lower for keyword in keywords):
+            return group_key
+    return 'structure_metrics'
+
+@dataclass(frozen=True)
+class FeatureGroupPlan:
+    """
+    Feature → group và thứ tự features trong mỗi group, tính một lần khi load baseline stats
+    
+    Không phụ thuộc vào code được gửi lên - mỗi request chỉ lọc các features có mặt
+    """
+    baseline_index: Any
+    feature_order: Tuple[str, ...]  # Tất cả features có baseline, effect size giảm dần
+    group_features: Tuple[Tuple[str, Tuple[str, ...]], ...]  # (group key, features theo feature_order)
+    style_priority: Tuple[str, ...]  # Style features theo độ ưu tiên để chọn top MAX_STYLE_FEATURES
+    
+    @classmethod
+    def from_index(cls, baseline_index) -> 'FeatureGroupPlan':
+        feature_order = tuple(sorted(baseline_index.feature_names, key=baseline_index.effect_size, reverse=True))
+        
+        groups: Dict[str, List[str]] = {group_key: [] for group_key, _ in FEATURE_GROUP_KEYWORDS}
+        for feature in feature_order:
+            groups[categorize_feature(feature)].append(feature)
+        
+        def get_style_priority(fname):
+            effect_size = baseline_index.effect_size(fname)
+            if any(keyword in fname.lower() for keyword in ['spacing', 'indentation', 'consistency']):
+                effect_size *= 1.5
+            return effect_size
+        
+        return cls(
+            baseline_index=baseline_index,
+            feature_order=feature_order,
+            group_features=tuple((group_key, tuple(features)) for group_key, features in groups.items()),
+            style_priority=tuple(sorted(groups['style_metrics'], key=get_style_priority, reverse=True))
+        )
+    
+    def categorize(self, features_dict: Dict[str, float]) -> Dict[str, List[str]]:
+        categories = {
+            group_key: [f for f in features if f in features_dict]
+            for group_key, features in self.group_features
+        }
+        
+        style_features = categories['style_metrics']
+        if len(style_features) > MAX_STYLE_FEATURES:
+            selected = set([f for f in self.style_priority if f in features_dict][:MAX_STYLE_FEATURES])
+            categories['style_metrics'] = [f for f in style_features if f in selected]
+        
+        return categories
+
+def get_feature_group_plan() -> FeatureGroupPlan:
+    # NOTE: Plan là index dẫn xuất của baseline snapshot, được build sẵn mỗi khi feature_stats.json được reload
+    baseline_loader = get_baseline_loader()
+    plan = baseline_loader.get_snapshot().derived.get('feature_group_plan')
+    if plan is None:
+        plan = baseline_loader.register_derived(
+            'feature_group_plan', lambda snapshot: FeatureGroupPlan.from_index(snapshot.baseline_index)
+        )
+    return plan
+
 def create_feature_groups(features_dict: Dict[str, float]) -> Dict[str, FeatureGroup]:
     try:
-        from baseline_loader import get_baseline_loader
-        baseline_loader = get_baseline_loader()
-        baseline_stats = baseline_loader.get_baseline_stats()
-        
-        available_features = set(baseline_stats.ai_stats.keys()) & set(baseline_stats.human_stats.keys())
+        plan = get_feature_group_plan()
         
-        usable_features = {f for f in available_features if f in features_dict}
+        usable_features = [f for f in plan.feature_order if f in features_dict]
                 
     except Exception as e:
-        usable_features = set()
+        plan = None
+        usable_features = []
     
-    def categorize_features(usable_features: set) -> Dict[str, List[str]]:
-        if usable_features:
-            structure_features = []
-            style_features = []
-            complexity_features = []
-            ai_detection_features = []
-            naming_features = []
-            
-            for feature in usable_features:
-                feature_lower = feature.lower()
-                
-                if any(keyword in feature_lower for keyword in [
-                    'ast_', 'nodes', 'depth', 'branching', 'control', 'statements', 
-                    'loops', 'functions_per_loc', 'loc', 'recursive'
-                ]):
-                    structure_features.append(feature)
-                
-                elif any(keyword in feature_lower for keyword in [
-                    'spacing', 'indentation', 'formatting', 'brace', 'operator_spacing',
-                    'camel_case', 'snake_case', 'consistency', 'style'
-                ]):
-                    style_features.append(feature)
-                
-                elif any(keyword in feature_lower for keyword in [
-                    'complexity', 'halstead', 'cognitive', 'maintainability', 
-                    'cyclomatic', 'comment_ratio', 'code_to_comment'
-                ]):
-                    complexity_features.append(feature)
-                
-                elif any(keyword in feature_lower for keyword in [
-                    'naming', 'variable', 'descriptive', 'generic', 'abbreviation',
-                    'meaningful_names', 'hungarian', 'magic_numbers'
-                ]):
-                    naming_features.append(feature)
-                
-                elif any(keyword in feature_lower for keyword in [
-                    'ai_pattern', 'template', 'boilerplate', 'error_handling',
-                    'defensive', 'over_engineering', 'redundancy', 'duplicate'
-                ]):
-                    ai_detection_features.append(feature)
-                
-                elif feature in ['blank_ratio', 'comment_ratio', 'functions', 'token_count']:
-                    structure_features.append(feature)
-                
-                else:
-                    structure_features.append(feature)
-            
-            return {
-                'structure_metrics': structure_features,
-                'style_metrics': style_features, 
-                'complexity_metrics': complexity_features,
-                'naming_metrics': naming_features,
-                'ai_detection_metrics': ai_detection_features
-            }
-        
-        else:
-            return {
-                'structure_metrics': [
-                    "loc", "nodes_per_loc", "max_depth", "avg_depth", "branching_factor",
-                    "if_statements_per_loc", "for_loops_per_loc", "while_loops_per_loc",
-                    "functions_per_loc", "cyclomatic_complexity"
-                ],
-                'style_metrics': [
-                    "spacing_issues_ratio", "indentation_issues_ratio", "naming_inconsistency_ratio",
-                    "formatting_issues_ratio", "human_style_overall_score", "indentation_consistency",
-                    "brace_style_consistency", "operator_spacing_consistency"
-                ],
-                'complexity_metrics': [
-                    "halstead_complexity", "halstead_per_loc", "cognitive_complexity", 
-                    "cognitive_per_loc", "maintainability_index", "code_to_comment_ratio",
-                    "variable_uniqueness_ratio", "avg_function_length"
-                ],
-                'ai_detection_metrics': [
-                    "template_usage_score", "boilerplate_ratio", "error_handling_score",
-                    "defensive_programming_score", "over_engineering_score", "copy_paste_score",
-                    "redundancy_duplicate_line_ratio", "ai_pattern_template_usage_score"
-                ]
-            }
+    comparisons = None
+    comparison_positions: Dict[str, int] = {}
+    if usable_features:
+        comparisons = calculate_baseline_comparisons(
+            usable_features, [features_dict[fname] for fname in usable_features], plan.baseline_index
+        )
+        comparison_positions = {fname: i for i, fname in enumerate(usable_features)}
     
-    feature_categories = categorize_features(usable_features)
+    if usable_features:
+        feature_categories = plan.categorize(features_dict)
+    else:
+        feature_categories = DEFAULT_FEATURE_CATEGORIES
     
     def create_group(group_name: str, description: str, feature_names: List[str], viz_type: str) -> FeatureGroup:
         features = []
         group_values = []
         
-        sorted_features = feature_names.copy()
-        try:
-            if usable_features:
-                baseline_loader = get_baseline_loader()
-                def get_effect_size(fname):
-                    baseline_stats = baseline_loader.get_baseline_stats()
-                    baseline = baseline_stats.get_feature_baseline(fname)
-                    if baseline:
-                        ai_val, human_val = baseline
-                        return abs(ai_val - human_val)
-                    return 0
-                
-                sorted_features.sort(key=get_effect_size, reverse=True)
-        except:
-            pass
-        
-        for fname in sorted_features:
+        for fname in feature_names:
             if fname in features_dict:
                 value = features_dict[fname]
                 
-                baseline_comparison = calculate_baseline_comparison(fname, value)
+                baseline_comparison = None
+                if comparisons is not None and fname in comparison_positions:
+                    baseline_comparison = build_baseline_comparison(comparisons, comparison_positions[fname], value)
                 
                 features.append(FeatureInfo(
                     name=fname,
@@ -949,30 +1048,10 @@ def create_feature_groups(features_dict: Dict[str, float]) -> Dict[str, FeatureG
         )
     
     if 'style_metrics' in feature_categories and feature_categories['style_metrics']:
-        style_features = feature_categories['style_metrics']
-        
-        if len(style_features) > 12:
-            try:
-                baseline_loader = get_baseline_loader()
-                def get_style_priority(fname):
-                    baseline_stats = baseline_loader.get_baseline_stats()
-                    baseline = baseline_stats.get_feature_baseline(fname)
-                    if baseline:
-                        ai_val, human_val = baseline
-                        effect_size = abs(ai_val - human_val)
-                        if any(keyword in fname.lower() for keyword in ['spacing', 'indentation', 'consistency']):
-                            effect_size *= 1.5
-                        return effect_size
-                    return 0
-                
-                style_features = sorted(style_features, key=get_style_priority, reverse=True)[:12]
-            except:
-                style_features = style_features[:12]
-        
         groups['style_metrics'] = create_group(
             "Style Metrics", 
             "Phong cách code, formatting và human-like patterns",
-            style_features,
+            feature_categories['style_metrics'],
             "radar"
         )
     
@@ -1003,6 +1082,8 @@ def create_feature_groups(features_dict: Dict[str, float]) -> Dict[str, FeatureG
     
     if not groups and features_dict:
         all_features = list(features_dict.keys())[:20]
+        if usable_features:
+            all_features.sort(key=plan.baseline_index.effect_size, reverse=True)
         groups['all_features'] = create_group(
             "All Features",
             "Tất cả features có sẵn",
@@ -1054,11 +1135,14 @@ def calculate_baseline_summary(feature_groups: Dict[str, FeatureGroup]) -> Optio
         print(f"Lỗi tính toán tổng quan baseline: {e}")
         return None
 
-def calculate_assessment(feature_groups: Dict[str, FeatureGroup], raw_features: Dict[str, float] = None) -> AssessmentResult:
+def calculate_assessment(feature_groups: Dict[str, FeatureGroup], raw_features: Dict[str, float] = None,
+                         detection_result: Any = None) -> AssessmentResult:
+    # NOTE: detection_result có thể đã được tính sẵn trong analysis pool worker
 
-    if ANALYSIS_MODULES_AVAILABLE and detection_model and raw_features:
+    if ANALYSIS_MODULES_AVAILABLE and (detection_result or detection_model) and raw_features:
         try:
-            detection_result = detection_model.detect(raw_features)
+            if detection_result is None:
+                detection_result = detection_model.detect(raw_features)
             if detection_result.prediction == "AI-generated":
                 overall_score = detection_result.confidence
             elif detection_result.prediction == "Human-written":
@@ -1163,9 +1247,44 @@ async def health_check():
             "advanced_features": ANALYSIS_MODULES_AVAILABLE,
             "ast_analyzer": ANALYSIS_MODULES_AVAILABLE,
             "human_style_analyzer": ANALYSIS_MODULES_AVAILABLE
-        }
+        },
+        "feature_cache": get_analysis_pool().cache_stats() if ANALYSIS_POOL_AVAILABLE else (
+            advanced_extractor.cache_stats() if hasattr(advanced_extractor, 'cache_stats') else {}
+        ),
+        "baseline_stats": get_baseline_stats_summary(),
+        "detectors": get_detector_latency_stats()
     }
 
+def get_detector_latency_stats() -> Dict[str, Any]:
+    # NOTE: Chỉ ensemble detector có latency theo từng detector thành viên
+    if ANALYSIS_POOL_AVAILABLE:
+        return get_analysis_pool().detector_stats()
+    if hasattr(detection_model, 'latency_stats'):
+        return detection_model.latency_stats()
+    return {}
+
+def get_baseline_stats_summary() -> Dict[str, Any]:
+    try:
+        return get_baseline_loader().get_feature_stats_summary()
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/api/admin/baseline/reload")
+async def reload_baseline():
+    # NOTE: Parse + build index ngoài event loop, request đang chạy vẫn dùng snapshot cũ cho tới khi swap.
+    # Workers của analysis pool nhận signature snapshot mới kèm task kế tiếp và tự reload trước khi phân tích
+    try:
+        reloaded = await asyncio.to_thread(get_baseline_loader().reload_stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Không thể reload baseline stats: {str(e)}")
+    
+    if not reloaded:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="feature_stats.json không hợp lệ, vẫn dùng baseline stats hiện tại"
+        )
+    return get_baseline_stats_summary()
+
 @app.post("/api/analysis/combined-analysis", response_model=AnalysisResponse)
 async def analyze_code_combined(request: CodeAnalysisRequest):
     try:
@@ -1177,11 +1296,18 @@ async def analyze_code_combined(request: CodeAnalysisRequest):
         
         analysis_id = generate_analysis_id()
         timestamp = datetime.now().isoformat()
-        features = advanced_extractor.extract_all_features(request.code, request.filename)
-        if hasattr(features, 'to_dict'):
-            features_dict = features.to_dict()
+        detection_result = None
+        if ANALYSIS_POOL_AVAILABLE:
+            # NOTE: Extraction + detection là CPU-bound, chạy trong process pool để không block event loop
+            features_dict, detection_result = await get_analysis_pool().extract_and_detect(
+                request.code, request.filename
+            )
         else:
-            features_dict = features
+            features = advanced_extractor.extract_all_features(request.code, request.filename)
+            if hasattr(features, 'to_dict'):
+                features_dict = features.to_dict()
+            else:
+                features_dict = features
         code_info = CodeInfo(
             filename=request.filename,
             language=request.language,
@@ -1190,7 +1316,7 @@ async def analyze_code_combined(request: CodeAnalysisRequest):
         )
         
         feature_groups = create_feature_groups(features_dict)
-        assessment = calculate_assessment(feature_groups, features_dict)
+        assessment = calculate_assessment(feature_groups, features_dict, detection_result)
         response = AnalysisResponse(
             success=True,
             analysis_id=analysis_id,
@@ -1344,62 +1470,106 @@ async def analyze_code_with_ai(request: CodeAnalysisRequest):
             detail=f"Phân tích AI thất bại: {str(e)}"
         )
 
-# FIXME: Sử dụng db cho batch analysis results
-batch_results = {}
+async def create_batch(total_files: int, batch_id: Optional[str] = None) -> BatchAnalysisResponse:
+    # NOTE: Mọi thao tác sqlite chạy trong thread - lock có thể bị process khác giữ tới 30s
+    batch = await asyncio.to_thread(
+        get_batch_store().create_batch,
+        batch_id=batch_id or generate_batch_id(),
+        total_files=total_files,
+        created_at=datetime.now().isoformat()
+    )
+    return BatchAnalysisResponse(**batch)
+
+async def run_batch_analysis(batch_id: str,
+                             files_info: Union[List[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]) -> None:
+    # NOTE: Results được gom và ghi xuống batch store theo lô, counters cập nhật cùng transaction
+    store = get_batch_store()
+    writer = BatchResultWriter(store, batch_id)
+    try:
+        await analyze_file_batch(files_info, on_result=lambda result: writer.add(result.dict()))
+    finally:
+        # NOTE: flush() raise BatchWriteError nếu có lô không ghi được → caller đánh dấu batch "error"
+        await writer.flush()
+    await asyncio.to_thread(store.finish_batch, batch_id, "completed", datetime.now().isoformat())
+
+async def fail_batch(batch_id: str, error_message: str) -> None:
+    await asyncio.to_thread(get_batch_store().finish_batch, batch_id, "error", datetime.now().isoformat(), error_message)
+
+def update_batch_progress(batch: BatchAnalysisResponse) -> BatchAnalysisResponse:
+    # NOTE: Throughput (files/sec) và ETA tính từ created_at đến hiện tại (hoặc completed_at)
+    try:
+        started = datetime.fromisoformat(batch.created_at)
+        finished = datetime.fromisoformat(batch.completed_at) if batch.completed_at else datetime.now()
+        elapsed = (finished - started).total_seconds()
+    except ValueError:
+        return batch
+
+    if elapsed > 0 and batch.processed_files > 0:
+        batch.files_per_second = round(batch.processed_files / elapsed, 3)
+        remaining = batch.total_files - batch.processed_files
+        if batch.status == "processing":
+            batch.eta_seconds = round(remaining / batch.files_per_second, 1)
+        else:
+            batch.eta_seconds = 0.0
+    return batch
 
 @app.post("/api/analysis/batch/upload-zip", response_model=BatchAnalysisResponse)
 async def analyze_batch_upload(
     file: UploadFile = File(...)
 ):
+    # NOTE: Archive nằm trong spool của batch đến khi phân tích xong, background task đọc members từ đó
+    batch_id = generate_batch_id()
+    spool = get_batch_spool()
     try:
-        if not file.filename.endswith(('.zip', '.rar')):
+        if not file.filename.endswith(ARCHIVE_EXTENSIONS):
             raise HTTPException(
                 status_code=400,
-                detail="Chỉ hỗ trợ file ZIP hoặc RAR"
+                detail="Chỉ hỗ trợ file ZIP, RAR hoặc TAR (.tar, .tar.gz, .tar.xz)"
             )
 
         MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
+        try:
+            archive_path = await spool.write_upload(batch_id, file.filename, file, max_bytes=MAX_FILE_SIZE)
+        except SpoolLimitExceeded:
             raise HTTPException(
                 status_code=413,
                 detail=f"File quá lớn. Kích thước tối đa là {MAX_FILE_SIZE/1024/1024}MB"
             )
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            archive_path = Path(temp_dir) / file.filename
-            with open(archive_path, 'wb') as f:
-                f.write(content)
-
-            extracted_files = extract_files_from_archive(str(archive_path), temp_dir)
+        if is_tar_archive(file.filename):
+            # NOTE: Tar không có central directory - members được đếm và phân tích trong lúc đọc stream
+            batch = await create_batch(0, batch_id)
+            asyncio.create_task(process_tar_analysis(batch.batch_id, TarStreamReader(str(archive_path))))
+            return batch
 
-            if not extracted_files:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Không tìm thấy file code hợp lệ trong archive"
-                )
+        reader = ArchiveReader(str(archive_path))
+        scan = await asyncio.to_thread(scan_archive_files, reader)
 
-            batch_id = generate_batch_id()
-            created_at = datetime.now().isoformat()
-
-            batch_results[batch_id] = BatchAnalysisResponse(
-                batch_id=batch_id,
-                total_files=len(extracted_files),
-                processed_files=0,
-                success_count=0,
-                error_count=0,
-                results=[],
-                status="processing",
-                created_at=created_at
+        if not scan.members and not scan.skipped:
+            raise HTTPException(
+                status_code=400,
+                detail="Không tìm thấy file code hợp lệ trong archive"
+            )
+        if scan.dropped:
+            print(f"⚠️ {file.filename}: bỏ qua {scan.dropped} file vượt quá số file tối đa của archive")
+
+        # NOTE: Members vượt giới hạn được báo lỗi ngay trong batch, các file còn lại vẫn được phân tích
+        batch = await create_batch(len(scan.members) + len(scan.skipped), batch_id)
+        if scan.skipped:
+            await asyncio.to_thread(
+                get_batch_store().append_results,
+                batch_id, [error_file_result(member, member['reason']).dict() for member in scan.skipped]
             )
 
-            asyncio.create_task(process_batch_analysis(batch_id, extracted_files))
+        asyncio.create_task(process_batch_analysis(batch.batch_id, scan.members, reader))
 
-            return batch_results[batch_id]
+        return batch
 
     except HTTPException:
+        spool.release(batch_id)
         raise
     except Exception as e:
+        spool.release(batch_id)
         print(f"Lỗi upload batch: {str(e)}")
         raise HTTPException(
             status_code=500,
@@ -1432,24 +1602,11 @@ async def analyze_google_drive(request: BatchAnalysisRequest):
                 detail="Không tìm thấy file code hợp lệ trong Google Drive folder"
             )
 
-        batch_id = generate_batch_id()
-        created_at = datetime.now().isoformat()
-
-        batch_results[batch_id] = BatchAnalysisResponse(
-            batch_id=batch_id,
-            total_files=len(files_info),
-            processed_files=0,
-            success_count=0,
-            error_count=0,
-            results=[],
-            status="processing",
-            created_at=created_at
-        )
-
+        batch = await create_batch(len(files_info))
 
-        asyncio.create_task(process_google_drive_analysis(batch_id, files_info))
+        asyncio.create_task(process_google_drive_analysis(batch.batch_id, files_info))
 
-        return batch_results[batch_id]
+        return batch
 
     except HTTPException:
         raise
@@ -1460,6 +1617,66 @@ async def analyze_google_drive(request: BatchAnalysisRequest):
             detail=f"Google Drive analysis thất bại: {str(e)}"
         )
 
+@app.post("/api/analysis/batch/directory", response_model=BatchAnalysisResponse)
+async def analyze_directory(request: BatchAnalysisRequest):
+    # NOTE: Files được đọc trực tiếp từ thư mục trên server (shared filesystem/mounted volume), không copy
+    try:
+        if request.source_type != 'directory':
+            raise HTTPException(
+                status_code=400,
+                detail="Endpoint này chỉ dành cho thư mục trên server"
+            )
+
+        if not allowed_directories():
+            raise HTTPException(
+                status_code=403,
+                detail="Chưa cấu hình BATCH_ALLOWED_DIRS cho directory source"
+            )
+
+        directory = resolve_allowed_directory(request.directory_path)
+        if directory is None:
+            raise HTTPException(
+                status_code=403,
+                detail="Thư mục không nằm trong danh sách được phép"
+            )
+        if not os.path.isdir(directory):
+            raise HTTPException(
+                status_code=404,
+                detail="Thư mục không tồn tại"
+            )
+
+        scan = await asyncio.to_thread(scan_directory, directory)
+        for file_info in scan.members + scan.skipped:
+            file_info['language'] = get_file_language(file_info['filename'])
+
+        if not scan.members and not scan.skipped:
+            raise HTTPException(
+                status_code=400,
+                detail="Không tìm thấy file code hợp lệ trong thư mục"
+            )
+        if scan.dropped:
+            print(f"⚠️ {directory}: bỏ qua {scan.dropped} file vượt quá số file tối đa")
+
+        batch = await create_batch(len(scan.members) + len(scan.skipped))
+        if scan.skipped:
+            await asyncio.to_thread(
+                get_batch_store().append_results,
+                batch.batch_id, [error_file_result(file_info, file_info['reason']).dict() for file_info in scan.skipped]
+            )
+
+        asyncio.create_task(process_batch_analysis(batch.batch_id, scan.members))
+
+        return batch
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Lỗi directory analysis: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Directory analysis thất bại: {str(e)}"
+        )
+
 async def process_google_drive_analysis(batch_id: str, files_info: List[Dict[str, str]]):
     """Background task to process Google Drive analysis"""
     try:
@@ -1469,68 +1686,80 @@ async def process_google_drive_analysis(batch_id: str, files_info: List[Dict[str
             downloaded_files = await download_google_drive_files(files_info, temp_dir)
 
             if not downloaded_files:
-                batch_results[batch_id].status = "error"
-                batch_results[batch_id].error_message = "Không thể download files từ Google Drive"
-                batch_results[batch_id].completed_at = datetime.now().isoformat()
+                await fail_batch(batch_id, "Không thể download files từ Google Drive")
                 return
 
-            results = await analyze_file_batch(downloaded_files)
+            await run_batch_analysis(batch_id, downloaded_files)
 
-            success_count = len([r for r in results if r.status == "success"])
-            error_count = len([r for r in results if r.status == "error"])
-
-            batch_results[batch_id].results = results
-            batch_results[batch_id].processed_files = len(results)
-            batch_results[batch_id].success_count = success_count
-            batch_results[batch_id].error_count = error_count
-            batch_results[batch_id].status = "completed"
-            batch_results[batch_id].completed_at = datetime.now().isoformat()
-
-            print(f"Completed Google Drive analysis {batch_id}: {success_count} success, {error_count} errors")
+            print(f"Completed Google Drive analysis {batch_id}")
 
     except Exception as e:
         print(f"Error in Google Drive analysis {batch_id}: {str(e)}")
-        batch_results[batch_id].status = "error"
-        batch_results[batch_id].error_message = str(e)
-        batch_results[batch_id].completed_at = datetime.now().isoformat()
+        await fail_batch(batch_id, str(e))
 
 @app.get("/api/analysis/batch/{batch_id}/status", response_model=BatchAnalysisResponse)
 async def get_batch_status(batch_id: str):
-    if batch_id not in batch_results:
+    batch = await asyncio.to_thread(get_batch_store().get_batch, batch_id)
+    if batch is None:
         raise HTTPException(
             status_code=404,
             detail="Batch ID không tồn tại"
         )
 
-    return batch_results[batch_id]
+    return update_batch_progress(BatchAnalysisResponse(**batch))
 
 @app.get("/api/analysis/batch/{batch_id}/results", response_model=BatchAnalysisResponse)
 async def get_batch_results(batch_id: str):
     return await get_batch_status(batch_id)
 
-async def process_batch_analysis(batch_id: str, files_info: List[Dict[str, str]]):
+async def process_batch_analysis(batch_id: str, files_info: List[Dict[str, str]],
+                                 reader: Optional[ArchiveReader] = None):
     try:
         print(f"Starting batch analysis {batch_id} with {len(files_info)} files")
 
-        results = await analyze_file_batch(files_info)
+        if reader is not None:
+            # NOTE: Members được giải nén song song và đưa vào phân tích ngay khi xong từng file
+            await run_batch_analysis(batch_id, reader.iter_members(files_info))
+        else:
+            await run_batch_analysis(batch_id, files_info)
 
-        success_count = len([r for r in results if r.status == "success"])
-        error_count = len([r for r in results if r.status == "error"])
+        print(f"Completed batch analysis {batch_id}")
 
-        batch_results[batch_id].results = results
-        batch_results[batch_id].processed_files = len(results)
-        batch_results[batch_id].success_count = success_count
-        batch_results[batch_id].error_count = error_count
-        batch_results[batch_id].status = "completed"
-        batch_results[batch_id].completed_at = datetime.now().isoformat()
+    except Exception as e:
+        print(f"Error in batch analysis {batch_id}: {str(e)}")
+        await fail_batch(batch_id, str(e))
+    finally:
+        if reader is not None:
+            reader.close()
+        get_batch_spool().release(batch_id)
+
+async def count_batch_files(batch_id: str, files_info: AsyncIterator[Dict[str, Any]],
+                            counter: Dict[str, int]) -> AsyncIterator[Dict[str, Any]]:
+    # NOTE: total_files tăng trước khi file được phân tích để processed_files không vượt total_files
+    store = get_batch_store()
+    async for file_info in files_info:
+        file_info.setdefault('language', get_file_language(file_info['filename']))
+        counter['total'] += 1
+        await asyncio.to_thread(store.add_total_files, batch_id, 1)
+        yield file_info
+
+async def process_tar_analysis(batch_id: str, reader: TarStreamReader):
+    try:
+        print(f"Starting streaming tar analysis {batch_id}")
 
-        print(f"Completed batch analysis {batch_id}: {success_count} success, {error_count} errors")
+        counter = {'total': 0}
+        await run_batch_analysis(batch_id, count_batch_files(batch_id, reader.iter_members(), counter))
+
+        if counter['total'] == 0:
+            await fail_batch(batch_id, "Không tìm thấy file code hợp lệ trong archive")
+            return
+        print(f"Completed streaming tar analysis {batch_id} with {counter['total']} files")
 
     except Exception as e:
-        print(f"Error in batch analysis {batch_id}: {str(e)}")
-        batch_results[batch_id].status = "error"
-        batch_results[batch_id].error_message = str(e)
-        batch_results[batch_id].completed_at = datetime.now().isoformat()
+        print(f"Error in tar analysis {batch_id}: {str(e)}")
+        await fail_batch(batch_id, str(e))
+    finally:
+        get_batch_spool().release(batch_id)
 
 @app.get("/api/analysis/batch/methods")
 async def get_batch_methods():
@@ -1538,13 +1767,13 @@ async def get_batch_methods():
         "methods": [
             {
                 "id": "zip_upload",
-                "name": "Upload ZIP/RAR",
+                "name": "Upload ZIP/RAR/TAR",
                 "description": "Upload file nén chứa nhiều file code để phân tích batch",
-                "supported_formats": [".zip", ".rar"],
+                "supported_formats": list(ARCHIVE_EXTENSIONS),
                 "supported_languages": ["c", "cpp"],
                 "supported_extensions": [".c", ".cpp", ".cc", ".cxx", ".h", ".hpp", ".txt"],
                 "max_file_size": "50MB",
-                "max_files": 100
+                "max_files": ArchiveLimits.from_env().max_members
             },
             {
                 "id": "google_drive",
@@ -1555,6 +1784,15 @@ async def get_batch_methods():
                 "supported_extensions": [".c", ".cpp", ".cc", ".cxx", ".h", ".hpp", ".txt"],
                 "features": ["Recursive folder scanning", "Concurrent downloads", "Real-time progress"],
                 "note": "Hoàn chỉnh và sẵn sàng sử dụng"
+            },
+            {
+                "id": "directory",
+                "name": "Server Directory",
+                "description": "Phân tích trực tiếp thư mục trên server (shared filesystem/mounted volume), không cần upload",
+                "supported_languages": ["c", "cpp"],
+                "supported_extensions": list(CODE_EXTENSIONS),
+                "max_files": ArchiveLimits.from_env().max_members,
+                "available": bool(allowed_directories())
             }
         ]
     }
@@ -14,6 +14,9 @@ import argparse
 import logging
 import warnings
 
+from feature_store import feature_columns, read_features
+from feature_statistics import class_statistics, rank_by_effect_size
+
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
@@ -33,6 +36,7 @@ class FeatureAnalyzer:
         self.df = None
         self.numeric_features = []
         self.categorical_features = []
+        self._feature_statistics: Optional[pd.DataFrame] = None
         
         if not self.csv_path.exists():
             raise FileNotFoundError(f"CSV file không tồn tại: {csv_path}")
@@ -43,7 +47,11 @@ class FeatureAnalyzer:
         """Load và preprocess data"""
         logger.info(f"Loading data từ {self.csv_path}")
         
-        self.df = pd.read_csv(self.csv_path)
+        # NOTE: Với Parquet chỉ load các cột số và các cột phân loại được dùng trong analysis
+        numeric_columns = feature_columns(self.csv_path, numeric_only=True)
+        columns = None if numeric_columns is None else \
+            numeric_columns + ['label', 'problem_id', 'detection_prediction']
+        self.df = read_features(self.csv_path, columns=columns)
         logger.info(f"Loaded {len(self.df)} records")
         
         # Phân loại features
@@ -63,6 +71,7 @@ class FeatureAnalyzer:
         
         # Clean data
         self.df = self.df.replace([np.inf, -np.inf], np.nan)
+        self._feature_statistics = None
         
         # Fill NaN values
         for col in self.numeric_features:
@@ -86,34 +95,16 @@ class FeatureAnalyzer:
         
         return stats
     
+    def feature_statistics(self) -> pd.DataFrame:
+        """Thống kê AI/Human của tất cả numeric features (tính một lần, dùng lại cho các báo cáo)"""
+        if self._feature_statistics is None:
+            self._feature_statistics = class_statistics(self.df, self.numeric_features)
+        return self._feature_statistics
+    
     def find_discriminative_features(self, top_n: int = 15) -> List[Tuple[str, float]]:
         """Tìm đặc trưng phân biệt mạnh nhất giữa AI và Human"""
-        discriminative_scores = []
-        
-        ai_data = self.df[self.df['label'] == 'AI']
-        human_data = self.df[self.df['label'] == 'Human']
-        
-        for feature in self.numeric_features:
-            try:
-                ai_mean = ai_data[feature].mean()
-                human_mean = human_data[feature].mean()
-                ai_std = ai_data[feature].std()
-                human_std = human_data[feature].std()
-                
-                # Cohen's d effect size
-                pooled_std = np.sqrt(((len(ai_data) - 1) * ai_std**2 + 
-                                    (len(human_data) - 1) * human_std**2) / 
-                                   (len(ai_data) + len(human_data) - 2))
-                
-                if pooled_std > 0:
-                    cohens_d = abs(ai_mean - human_mean) / pooled_std
-                    discriminative_scores.append((feature, cohens_d))
-                
-            except Exception as e:
-                continue
-        
-        # Sort by discriminative power
-        discriminative_scores.sort(key=lambda x: x[1], reverse=True)
+        # Cohen's d effect size, sort by discriminative power
+        discriminative_scores = rank_by_effect_size(self.feature_statistics())
         
         logger.info(f"🎯 TOP {top_n} ĐẶC TRƯNG PHÂN BIỆT MẠNH NHẤT:")
         for i, (feature, score) in enumerate(discriminative_scores[:top_n]):
@@ -286,6 +277,7 @@ class FeatureAnalyzer:
     def generate_feature_ranking_report(self, output_file: str = "feature_ranking.txt"):
         """Tạo báo cáo ranking đặc trưng"""
         discriminative_features = self.find_discriminative_features(20)
+        stats = self.feature_statistics()
         
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write("FEATURE RANKING REPORT\n")
@@ -293,15 +285,15 @@ class FeatureAnalyzer:
             
             f.write(f"Dataset: {self.csv_path}\n")
             f.write(f"Total samples: {len(self.df)}\n")
-            f.write(f"AI samples: {len(self.df[self.df['label'] == 'AI'])}\n")
-            f.write(f"Human samples: {len(self.df[self.df['label'] == 'Human'])}\n\n")
+            f.write(f"AI samples: {(self.df['label'] == 'AI').sum()}\n")
+            f.write(f"Human samples: {(self.df['label'] == 'Human').sum()}\n\n")
             
             f.write("TOP DISCRIMINATIVE FEATURES (Cohen's d):\n")
             f.write("-" * 50 + "\n")
             
             for i, (feature, score) in enumerate(discriminative_features):
-                ai_mean = self.df[self.df['label'] == 'AI'][feature].mean()
-                human_mean = self.df[self.df['label'] == 'Human'][feature].mean()
+                ai_mean = stats.at[feature, 'ai_mean']
+                human_mean = stats.at[feature, 'human_mean']
                 
                 f.write(f"{i+1:2d}. {feature:<40} | Cohen's d: {score:.3f}\n")
                 f.write(f"    AI mean: {ai_mean:.4f}, Human mean: {human_mean:.4f}\n")
@@ -311,7 +303,7 @@ class FeatureAnalyzer:
 
 def main():
     parser = argparse.ArgumentParser(description='Analyze extracted features from dataset')
-    parser.add_argument('--csv', type=str, required=True, help='Path to CSV file with extracted features')
+    parser.add_argument('--csv', type=str, required=True, help='Path to extracted features file (.parquet or .csv)')
     parser.add_argument('--plots-dir', type=str, default='plots', help='Directory to save plots')
     parser.add_argument('--report', type=str, default='feature_ranking.txt', help='Feature ranking report file')
     
@@ -7,11 +7,14 @@ Trích xuất đặc trưng từ toàn bộ dataset và xuất thành CSV để
 import os
 import csv
 import sys
+import json
+import hashlib
 import logging
 import pandas as pd
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 from tqdm import tqdm
 import traceback
@@ -28,6 +31,9 @@ except ImportError as e:
     print(f"Warning: Advanced features not available: {e}")
     HAS_ADVANCED_FEATURES = False
 
+from feature_store import EXTRACTOR_VERSION, FEATURES_EXTENSION, read_features, unified_schema, write_features, write_features_stream
+from feature_statistics import StreamingClassStatistics, class_statistics
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,6 +45,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# NOTE: Extractor riêng của mỗi worker process, khởi tạo một lần trong _init_worker
+_worker_extractor: Optional['DatasetFeatureExtractor'] = None
+
+def _init_worker(dataset_root: str):
+    global _worker_extractor
+    _worker_extractor = DatasetFeatureExtractor(dataset_root)
+
+def _process_file_in_worker(file_info: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+    return _worker_extractor.process_file(*file_info)
+
+def file_content_hash(file_path: str) -> str:
+    """SHA-256 của nội dung file"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
 class DatasetFeatureExtractor:
     """Pipeline để trích xuất đặc trưng từ toàn bộ dataset"""
     
@@ -132,15 +153,32 @@ class DatasetFeatureExtractor:
             logger.error(f"Lỗi trích xuất features từ {file_path}: {e}")
             return None
     
-    def process_dataset(self, max_files: Optional[int] = None, 
-                       problems_limit: Optional[List[str]] = None) -> pd.DataFrame:
-        """
-        Xử lý toàn bộ dataset và trích xuất features
-        
-        Args:
-            max_files: Giới hạn số files xử lý (None = không giới hạn)
-            problems_limit: Chỉ xử lý những problem cụ thể
-        """
+    def process_file(self, file_path: str, label: str, problem_id: str) -> Optional[Dict[str, Any]]:
+        """Trích xuất features kèm metadata cho một file (None nếu lỗi/rỗng)"""
+        try:
+            features = self.extract_features_from_file(file_path)
+            
+            if features:
+                # Add metadata
+                features.update({
+                    'file_path': file_path,
+                    'filename': Path(file_path).name,
+                    'label': label,
+                    'problem_id': problem_id,
+                    'file_extension': Path(file_path).suffix,
+                    'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+                    'content_hash': file_content_hash(file_path),
+                    'extractor_version': EXTRACTOR_VERSION
+                })
+            
+            return features
+            
+        except Exception as e:
+            logger.error(f"Lỗi xử lý file {file_path}: {e}")
+            return None
+    
+    def _select_files(self, max_files: Optional[int] = None,
+                      problems_limit: Optional[List[str]] = None) -> List[Tuple[str, str, str]]:
         files = self.find_code_files()
         
         # Filter by problems if specified
@@ -152,31 +190,34 @@ class DatasetFeatureExtractor:
         if max_files:
             files = files[:max_files]
             logger.info(f"Giới hạn {max_files} files đầu tiên")
+        return files
+    
+    def process_dataset(self, max_files: Optional[int] = None, 
+                       problems_limit: Optional[List[str]] = None,
+                       workers: int = 1,
+                       checkpoint_dir: Optional[str] = None,
+                       shard_size: int = 1000,
+                       resume: bool = False) -> pd.DataFrame:
+        """
+        Xử lý toàn bộ dataset và trích xuất features
         
-        results = []
+        Args:
+            max_files: Giới hạn số files xử lý (None = không giới hạn)
+            problems_limit: Chỉ xử lý những problem cụ thể
+            workers: Số worker processes (1 = tuần tự)
+            checkpoint_dir: Ghi kết quả thành các shard trong thư mục này rồi ghép lại
+                (dùng process_dataset_sharded + export_shards để không ghép trong bộ nhớ)
+            shard_size: Số files mỗi shard
+            resume: Bỏ qua các files đã có trong các shard hoàn chỉnh
+        """
+        if checkpoint_dir:
+            self.process_dataset_sharded(checkpoint_dir, max_files, problems_limit, workers, shard_size, resume)
+            return self.load_shards(Path(checkpoint_dir))
         
+        files = self._select_files(max_files, problems_limit)
         logger.info(f"Bắt đầu xử lý {len(files)} files...")
         
-        for file_path, label, problem_id in tqdm(files, desc="Extracting features"):
-            try:
-                features = self.extract_features_from_file(file_path)
-                
-                if features:
-                    # Add metadata
-                    features.update({
-                        'file_path': file_path,
-                        'filename': Path(file_path).name,
-                        'label': label,
-                        'problem_id': problem_id,
-                        'file_extension': Path(file_path).suffix,
-                        'file_size': os.path.getsize(file_path) if os.path.exists(file_path) else 0
-                    })
-                    
-                    results.append(features)
-                
-            except Exception as e:
-                logger.error(f"Lỗi xử lý file {file_path}: {e}")
-                continue
+        results = [features for features in self._iter_extracted(files, workers) if features]
         
         logger.info(f"Hoàn thành xử lý. Có {len(results)} kết quả hợp lệ")
         
@@ -186,6 +227,196 @@ class DatasetFeatureExtractor:
         
         return pd.DataFrame(results)
     
+    def _iter_extracted(self, files: List[Tuple[str, str, str]], workers: int):
+        """Yield features (hoặc None) của từng file theo đúng thứ tự input"""
+        if workers <= 1 or len(files) <= 1:
+            for file_info in tqdm(files, desc="Extracting features"):
+                yield self.process_file(*file_info)
+            return
+        
+        # NOTE: executor.map giữ nguyên thứ tự input nên kết quả giống hệt chế độ tuần tự.
+        # Files được gửi theo chunk để giảm overhead IPC cho mỗi file
+        chunksize = max(1, min(64, len(files) // (workers * 4)))
+        logger.info(f"Sử dụng {workers} worker processes (chunksize={chunksize})")
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(self.dataset_root),)) as executor:
+            yield from tqdm(executor.map(_process_file_in_worker, files, chunksize=chunksize),
+                            total=len(files), desc="Extracting features")
+    
+    def process_dataset_sharded(self, checkpoint_dir: str, max_files: Optional[int] = None,
+                                problems_limit: Optional[List[str]] = None, workers: int = 1,
+                                shard_size: int = 1000, resume: bool = False) -> None:
+        """
+        Trích xuất và ghi kết quả theo từng shard, bộ nhớ chỉ giữ tối đa một shard
+        
+        Mỗi shard gồm shard_XXXXX.parquet (.csv nếu không có pyarrow) và shard_XXXXX.manifest.json (file_path + sha256 của
+        mọi file trong shard, kèm extractor_version). Manifest được ghi sau cùng nên shard chỉ được coi là hoàn chỉnh
+        khi manifest tồn tại. Khi resume, files trong shard của extractor version khác được trích xuất lại.
+        """
+        files = self._select_files(max_files, problems_limit)
+        checkpoint_dir = Path(checkpoint_dir)
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        manifests = self.load_manifests(checkpoint_dir)
+        
+        if manifests and not resume:
+            raise ValueError(f"Checkpoint dir {checkpoint_dir} đã có shards, dùng --resume hoặc thư mục khác")
+        
+        hashes = {}
+        if resume:
+            # NOTE: Shard do extractor version khác ghi (analyzers đã đổi) không được tính là xong,
+            # shard mới sẽ ghi đè kết quả cũ thay vì trộn features cũ/mới khi export
+            current = [manifest for manifest in manifests
+                       if manifest.get('extractor_version') == EXTRACTOR_VERSION]
+            if len(current) < len(manifests):
+                logger.warning(f"Resume: {len(manifests) - len(current)} shards có extractor version khác, "
+                               f"files trong đó sẽ được trích xuất lại")
+            completed = {entry['file_path']: entry['sha256']
+                         for manifest in current for entry in manifest['files']}
+            pending = []
+            for file_info in files:
+                file_path = file_info[0]
+                hashes[file_path] = file_content_hash(file_path)
+                # NOTE: File đã đổi nội dung thì trích xuất lại, shard mới sẽ ghi đè kết quả cũ
+                if completed.get(file_path) != hashes[file_path]:
+                    pending.append(file_info)
+            logger.info(f"Resume: bỏ qua {len(files) - len(pending)} files đã có trong {len(current)} shards")
+            files = pending
+        
+        logger.info(f"Bắt đầu xử lý {len(files)} files, shard size {shard_size}...")
+        
+        shard_index = max((manifest['shard'] for manifest in manifests), default=-1) + 1
+        rows, entries = [], []
+        for file_info, features in zip(files, self._iter_extracted(files, workers)):
+            file_path = file_info[0]
+            if file_path in hashes:
+                content_hash = hashes.pop(file_path)
+            else:
+                content_hash = features['content_hash'] if features else file_content_hash(file_path)
+            entries.append({'file_path': file_path, 'sha256': content_hash,
+                            'extracted': bool(features)})
+            if features:
+                rows.append(features)
+            
+            if len(entries) >= shard_size:
+                self._write_shard(checkpoint_dir, shard_index, rows, entries)
+                shard_index += 1
+                rows, entries = [], []
+        
+        if entries:
+            self._write_shard(checkpoint_dir, shard_index, rows, entries)
+    
+    def _write_shard(self, checkpoint_dir: Path, shard_index: int,
+                     rows: List[Dict[str, Any]], entries: List[Dict[str, Any]]):
+        name = f"shard_{shard_index:05d}"
+        data_path = checkpoint_dir / f"{name}{FEATURES_EXTENSION}"
+        manifest_path = checkpoint_dir / f"{name}.manifest.json"
+        
+        # NOTE: Ghi ra file tạm rồi os.replace để không bao giờ có shard ghi dở
+        tmp_data_path = checkpoint_dir / f"{name}.tmp{FEATURES_EXTENSION}"
+        write_features(pd.DataFrame(rows), tmp_data_path)
+        os.replace(tmp_data_path, data_path)
+        
+        manifest = {
+            'shard': shard_index,
+            'extractor_version': EXTRACTOR_VERSION,
+            'data_file': data_path.name,
+            'rows': len(rows),
+            'files': entries
+        }
+        tmp_manifest_path = manifest_path.with_suffix('.json.tmp')
+        with open(tmp_manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_manifest_path, manifest_path)
+        
+        logger.info(f"Đã ghi {name}: {len(rows)}/{len(entries)} files có features")
+    
+    @staticmethod
+    def load_manifests(checkpoint_dir: Path) -> List[Dict[str, Any]]:
+        """Đọc manifests của các shard hoàn chỉnh, theo thứ tự shard"""
+        manifests = []
+        for manifest_path in sorted(Path(checkpoint_dir).glob("shard_*.manifest.json")):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        return sorted(manifests, key=lambda manifest: manifest['shard'])
+    
+    def load_shards(self, checkpoint_dir: Path) -> pd.DataFrame:
+        """Ghép các shard hoàn chỉnh thành một DataFrame"""
+        frames = []
+        for manifest in self.load_manifests(checkpoint_dir):
+            if manifest['rows']:
+                frames.append(read_features(Path(checkpoint_dir) / manifest['data_file'], current_version_only=True))
+        
+        if not frames:
+            logger.warning("Không có kết quả nào được trích xuất!")
+            return pd.DataFrame()
+        
+        # NOTE: File được trích xuất lại khi resume chỉ giữ kết quả mới nhất
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates(subset='file_path', keep='last').reset_index(drop=True)
+        logger.info(f"Hoàn thành xử lý. Có {len(df)} kết quả hợp lệ từ {len(frames)} shards")
+        return df
+    
+    @staticmethod
+    def _latest_shards(manifests: List[Dict[str, Any]]) -> Dict[str, int]:
+        """file_path → shard chứa kết quả mới nhất của file (giống drop_duplicates keep='last' của load_shards)"""
+        latest = {}
+        for manifest in manifests:
+            for entry in manifest['files']:
+                if entry['extracted']:
+                    latest[entry['file_path']] = manifest['shard']
+        return latest
+    
+    def iter_shards(self, checkpoint_dir: Path):
+        """
+        Yield DataFrame của từng shard hoàn chỉnh, đã bỏ rows bị shard sau ghi đè khi resume
+
+        Chỉ lấy rows của extractor version hiện tại để output không trộn features cũ/mới
+        """
+        manifests = self.load_manifests(checkpoint_dir)
+        latest = self._latest_shards(manifests)
+        for manifest in manifests:
+            if not manifest['rows']:
+                continue
+            df = read_features(Path(checkpoint_dir) / manifest['data_file'], current_version_only=True)
+            yield df[df['file_path'].map(latest) == manifest['shard']].reset_index(drop=True)
+    
+    def export_shards(self, checkpoint_dir: str, output_path: str) -> Dict[str, Any]:
+        """
+        Ghi các shard vào output lần lượt từng shard và tính summary statistics đồng thời
+        
+        Bộ nhớ chỉ giữ một shard mỗi lúc; kết quả giống save_features + generate_summary_stats trên load_shards
+        Returns: summary statistics (rỗng nếu không có dữ liệu)
+        """
+        checkpoint_dir = Path(checkpoint_dir)
+        data_paths = [checkpoint_dir / manifest['data_file']
+                      for manifest in self.load_manifests(checkpoint_dir) if manifest['rows']]
+        feature_stats = StreamingClassStatistics()
+        problems = set()
+        
+        def frames():
+            for df in self.iter_shards(checkpoint_dir):
+                feature_stats.update(df, df.select_dtypes(include=['int64', 'float64']).columns)
+                problems.update(df['problem_id'].dropna())
+                yield df
+        
+        total = write_features_stream(frames(), output_path, schema=unified_schema(data_paths))
+        if not total:
+            logger.warning("Không có kết quả nào được trích xuất!")
+            return {}
+        logger.info(f"Đã lưu {total} records từ {len(data_paths)} shards vào {output_path}")
+        return self._summary_stats(feature_stats.result(), total, feature_stats.n_ai,
+                                   feature_stats.n_human, len(problems))
+    
+    def save_features(self, df: pd.DataFrame, output_path: str):
+        """Lưu DataFrame vào feature store (.parquet) hoặc CSV tùy đuôi file"""
+        try:
+            write_features(df, output_path)
+            logger.info(f"Đã lưu {len(df)} records vào {output_path}")
+        except Exception as e:
+            logger.error(f"Lỗi lưu features: {e}")
+            raise
+    
     def save_to_csv(self, df: pd.DataFrame, output_path: str):
         """Lưu DataFrame thành CSV"""
         try:
@@ -197,25 +428,31 @@ class DatasetFeatureExtractor:
     
     def generate_summary_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Tạo summary statistics"""
-        stats = {}
-        
         if df.empty:
-            return stats
+            return {}
         
+        # Feature statistics - một lượt cho tất cả các cột số
+        numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
+        feature_stats = class_statistics(df, numeric_cols, quantiles=())
+        return self._summary_stats(feature_stats, len(df), int((df['label'] == 'AI').sum()),
+                                   int((df['label'] == 'Human').sum()), df['problem_id'].nunique())
+    
+    @staticmethod
+    def _summary_stats(feature_stats: pd.DataFrame, total_files: int, ai_files: int,
+                       human_files: int, problems_count: int) -> Dict[str, Any]:
         # Basic counts
-        stats['total_files'] = len(df)
-        stats['ai_files'] = len(df[df['label'] == 'AI'])
-        stats['human_files'] = len(df[df['label'] == 'Human'])
-        stats['problems_count'] = df['problem_id'].nunique()
+        stats = {
+            'total_files': total_files,
+            'ai_files': ai_files,
+            'human_files': human_files,
+            'problems_count': problems_count
+        }
         
-        # Feature statistics
-        numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns
-        for col in numeric_cols:
-            if col in df.columns:
-                stats[f'{col}_mean'] = df[col].mean()
-                stats[f'{col}_std'] = df[col].std()
-                stats[f'{col}_ai_mean'] = df[df['label'] == 'AI'][col].mean()
-                stats[f'{col}_human_mean'] = df[df['label'] == 'Human'][col].mean()
+        for col, row in feature_stats.iterrows():
+            stats[f'{col}_mean'] = row['mean']
+            stats[f'{col}_std'] = row['std']
+            stats[f'{col}_ai_mean'] = row['ai_mean']
+            stats[f'{col}_human_mean'] = row['human_mean']
         
         return stats
 
@@ -223,36 +460,64 @@ def main():
     parser = argparse.ArgumentParser(description='Extract features from code dataset')
     parser.add_argument('--dataset', type=str, default='dataset', 
                        help='Path to dataset directory')
-    parser.add_argument('--output', type=str, default='extracted_features.csv',
-                       help='Output CSV file path')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Output file path, .parquet or .csv (default: <dataset>/metadata/features.parquet)')
     parser.add_argument('--max-files', type=int, default=None,
                        help='Maximum number of files to process')
     parser.add_argument('--problems', type=str, nargs='*', default=None,
                        help='Specific problems to process (e.g. problem_1 problem_2)')
     parser.add_argument('--stats-output', type=str, default='feature_stats.json',
                        help='Output file for statistics')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of worker processes (default: 1 = serial)')
+    parser.add_argument('--checkpoint-dir', type=str, default=None,
+                       help='Write results as resumable shards to this directory')
+    parser.add_argument('--shard-size', type=int, default=1000,
+                       help='Number of files per checkpoint shard')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip files already present in completed shards of --checkpoint-dir')
     
     args = parser.parse_args()
+    if args.output is None:
+        args.output = str(Path(args.dataset) / 'metadata' / f'features{FEATURES_EXTENSION}')
+    if args.resume and not args.checkpoint_dir:
+        parser.error('--resume requires --checkpoint-dir')
     
     try:
         # Initialize extractor
         extractor = DatasetFeatureExtractor(args.dataset)
         
-        # Process dataset
-        df = extractor.process_dataset(
-            max_files=args.max_files,
-            problems_limit=args.problems
-        )
-        
-        if df.empty:
-            logger.error("Không có dữ liệu để xuất!")
-            return 1
-        
-        # Save results
-        extractor.save_to_csv(df, args.output)
-        
-        # Generate and save statistics
-        stats = extractor.generate_summary_stats(df)
+        if args.checkpoint_dir:
+            # NOTE: Không ghép các shard trong bộ nhớ - output và statistics được tạo dần theo từng shard
+            extractor.process_dataset_sharded(
+                args.checkpoint_dir,
+                max_files=args.max_files,
+                problems_limit=args.problems,
+                workers=args.workers,
+                shard_size=args.shard_size,
+                resume=args.resume
+            )
+            stats = extractor.export_shards(args.checkpoint_dir, args.output)
+            if not stats:
+                logger.error("Không có dữ liệu để xuất!")
+                return 1
+        else:
+            # Process dataset
+            df = extractor.process_dataset(
+                max_files=args.max_files,
+                problems_limit=args.problems,
+                workers=args.workers
+            )
+            
+            if df.empty:
+                logger.error("Không có dữ liệu để xuất!")
+                return 1
+            
+            # Save results
+            extractor.save_features(df, args.output)
+            
+            # Generate and save statistics
+            stats = extractor.generate_summary_stats(df)
         
         import json
         with open(args.stats_output, 'w', encoding='utf-8') as f:
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Binary Artifact
+Định dạng nhị phân cho model/baseline stats: header JSON + bảng tên features + các mảng float64,
+được map read-only bằng mmap để các worker process dùng chung physical pages
+
+Layout:
+    MAGIC (8 bytes) | header length (uint64 little-endian) | header JSON (utf-8) | padding | arrays
+Mỗi mảng bắt đầu ở offset chia hết cho ARRAY_ALIGNMENT, offset/shape/dtype được ghi trong header.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AICDART1"
+FORMAT_VERSION = 1
+ARTIFACT_EXTENSION = '.bin'
+ARRAY_ALIGNMENT = 64
+
+KIND_BASELINE = 'baseline-stats'
+KIND_MODEL = 'optimized-classifier'
+
+_HEADER_PREFIX = struct.Struct('<8sQ')
+
+
+def _align(offset: int) -> int:
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+
+@dataclass
+class BinaryArtifact:
+    """Artifact đã được map, arrays là các view read-only trên cùng một mmap"""
+    path: str
+    kind: str
+    metadata: Dict[str, Any]
+    names: Dict[str, List[str]]
+    arrays: Dict[str, np.ndarray]
+
+
+def is_artifact(path) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_artifact(path, kind: str, arrays: Dict[str, np.ndarray],
+                   names: Optional[Dict[str, List[str]]] = None,
+                   metadata: Optional[Dict[str, Any]] = None) -> None:
+    """Ghi artifact (atomic: ghi file tạm rồi rename)"""
+    arrays = {name: np.ascontiguousarray(array, dtype=np.float64) for name, array in arrays.items()}
+
+    # NOTE: Offsets trong header tính từ đầu vùng data (sau header + padding)
+    layout = {}
+    data_offset = 0
+    for name, array in arrays.items():
+        data_offset = _align(data_offset)
+        layout[name] = {'offset': data_offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+        data_offset += array.nbytes
+
+    header = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'kind': kind,
+        'metadata': metadata or {},
+        'names': names or {},
+        'arrays': layout
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = _align(_HEADER_PREFIX.size + len(header))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER_PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + data_offset)
+    tmp_path.replace(path)
+    logger.info(f"Đã lưu {kind} artifact vào {path}")
+
+
+def read_artifact(path, expected_kind: Optional[str] = None) -> BinaryArtifact:
+    """Map artifact read-only, các arrays không bị copy vào bộ nhớ của process"""
+    with open(path, 'rb') as f:
+        magic, header_length = _HEADER_PREFIX.unpack(f.read(_HEADER_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary artifact")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {header.get('format_version')}")
+    if expected_kind and header['kind'] != expected_kind:
+        raise ValueError(f"Expected {expected_kind} artifact, got {header['kind']}")
+
+    data_start = _align(_HEADER_PREFIX.size + header_length)
+    # NOTE: mode='r' → mmap read-only dùng chung page cache giữa các process
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        array = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + spec['offset'])
+        arrays[name] = array.reshape(spec['shape'])
+
+    return BinaryArtifact(
+        path=str(path),
+        kind=header['kind'],
+        metadata=header['metadata'],
+        names=header['names'],
+        arrays=arrays
+    )
+
+
+def export_baseline_stats(stats_json_path, artifact_path=None) -> Path:
+    """Chuyển feature_stats.json thành artifact chứa AI/Human means và ranges theo bảng tên features"""
+    stats_json_path = Path(stats_json_path)
+    artifact_path = Path(artifact_path) if artifact_path else stats_json_path.with_suffix(ARTIFACT_EXTENSION)
+
+    raw = stats_json_path.read_bytes()
+    stats_data = json.loads(raw.decode('utf-8'))
+
+    ai_stats = {key[:-len('_ai_mean')]: float(value)
+                for key, value in stats_data.items() if key.endswith('_ai_mean')}
+    human_stats = {key[:-len('_human_mean')]: float(value)
+                   for key, value in stats_data.items() if key.endswith('_human_mean')}
+
+    # NOTE: Features có cả AI và Human means đứng trước để loader dùng trực tiếp view không cần copy
+    features = [name for name in ai_stats if name in human_stats]
+    features += [name for name in ai_stats if name not in human_stats]
+    features += [name for name in human_stats if name not in ai_stats]
+
+    ai_means = np.array([ai_stats.get(name, np.nan) for name in features])
+    human_means = np.array([human_stats.get(name, np.nan) for name in features])
+
+    write_artifact(
+        artifact_path,
+        KIND_BASELINE,
+        arrays={'ai_means': ai_means, 'human_means': human_means, 'ranges': np.abs(ai_means - human_means)},
+        names={'features': features},
+        metadata={
+            'source': stats_json_path.name,
+            'source_sha256': hashlib.sha256(raw).hexdigest(),
+            'paired_features': sum(1 for name in ai_stats if name in human_stats)
+        }
+    )
+    return artifact_path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export model/baseline stats sang binary artifact')
+    parser.add_argument('kind', choices=['baseline', 'model'], help='Loại artifact')
+    parser.add_argument('source', type=str, help='feature_stats.json hoặc model.json')
+    parser.add_argument('--output', type=str, help=f'Đường dẫn artifact (mặc định: cùng tên, đuôi {ARTIFACT_EXTENSION})')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.kind == 'baseline':
+        output = export_baseline_stats(args.source, args.output)
+    else:
+        from optimized_binary_classifier import OptimizedBinaryClassifier
+        classifier = OptimizedBinaryClassifier()
+        classifier.load_model(args.source)
+        output = args.output or str(Path(args.source).with_suffix(ARTIFACT_EXTENSION))
+        classifier.save_model(output)
+
+    print(f"✅ Exported {args.kind} artifact: {output} ({os.path.getsize(output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ import logging
 import sys
 from pathlib import Path
 from typing import Dict, Any, Optional, List
+from dataclasses import asdict
 import json
 
 # Import our modules
@@ -17,6 +18,8 @@ try:
     from optimized_binary_classifier import OptimizedBinaryClassifier
     from super_linter_integration import SuperLinterIntegration
     from batch_feature_extraction import DatasetFeatureExtractor
+    from feature_store import FEATURES_EXTENSION
+    from cross_validation import DEFAULT_FOLDS, cross_validate
     HAS_ADVANCED_FEATURES = True
 except ImportError as e:
     print(f"Warning: Some modules not available: {e}")
@@ -161,14 +164,14 @@ class AICodeDetectionPipeline:
             raise ValueError("No data extracted from dataset")
         
         # Save extracted features
-        features_csv = "training_features.csv"
-        extractor.save_to_csv(df, features_csv)
+        features_path = f"training_features{FEATURES_EXTENSION}"
+        extractor.save_features(df, features_path)
         
         # Initialize optimized classifier
-        self.classifier = OptimizedBinaryClassifier(features_csv)
+        self.classifier = OptimizedBinaryClassifier(features_path)
         
         # Evaluate performance
-        evaluation = self.classifier.evaluate_on_dataset(features_csv)
+        evaluation = self.classifier.evaluate_on_dataset(features_path)
         
         # Save trained model
         if save_model:
@@ -180,7 +183,7 @@ class AICodeDetectionPipeline:
             'ai_samples': len(df[df['label'] == 'AI']),
             'human_samples': len(df[df['label'] == 'Human']),
             'evaluation': evaluation,
-            'features_csv': features_csv,
+            'features_path': features_path,
             'model_path': save_model
         }
     
@@ -251,6 +254,14 @@ def main():
     train_parser.add_argument('--max-files', type=int, default=1000, help='Maximum files for training')
     train_parser.add_argument('--save-model', help='Path to save trained model')
     
+    # Grouped cross-validation
+    cv_parser = subparsers.add_parser('cv', help='Grouped cross-validation by problem_id on extracted features')
+    cv_parser.add_argument('features', help=f'Extracted features file (vd: training_features{FEATURES_EXTENSION})')
+    cv_parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS, help='Number of folds')
+    cv_parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: min(folds, CPUs))')
+    cv_parser.add_argument('--seed', type=int, default=42, help='Seed for assigning problems to folds')
+    cv_parser.add_argument('--output', help='Output JSON file')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -344,6 +355,29 @@ def main():
             if args.save_model:
                 print(f"💾 Model saved to {args.save_model}")
         
+        elif args.command == 'cv':
+            logger.info(f"Cross-validating on: {args.features}")
+            
+            cv_result = cross_validate(args.features, n_folds=args.folds, workers=args.workers, seed=args.seed)
+            summary = cv_result.summary
+            
+            print(f"\n🎯 {cv_result.n_folds}-FOLD GROUPED CV (by problem_id, {cv_result.workers} workers)")
+            for fold in cv_result.folds:
+                ev = fold.evaluation
+                print(f"Fold {fold.fold + 1}: {len(fold.test_problems)} problems, {fold.test_samples} samples | "
+                      f"acc {ev['overall_accuracy']:.3f} (AI {ev['ai_accuracy']:.3f}, Human {ev['human_accuracy']:.3f}) | "
+                      f"fit {fold.fit_seconds:.2f}s, eval {fold.eval_seconds:.2f}s, wall {fold.wall_seconds:.2f}s")
+            print(f"\n📊 SUMMARY")
+            for key in ('overall_accuracy', 'ai_accuracy', 'human_accuracy'):
+                print(f"{key}: {summary[key]['mean']:.3f} ± {summary[key]['std']:.3f}")
+            print(f"Pooled accuracy: {summary['pooled_accuracy']:.3f}")
+            print(f"Total wall time: {cv_result.wall_seconds:.2f}s")
+            
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(asdict(cv_result), f, indent=2, ensure_ascii=False)
+                print(f"💾 CV results saved to {args.output}")
+        
         return 0
         
     except Exception as e:
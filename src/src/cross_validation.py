@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Cross Validation
+Grouped k-fold cross-validation theo problem_id cho OptimizedBinaryClassifier: không có problem nào
+nằm ở cả train và test, các folds được fit/evaluate song song trong process pool
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from feature_store import feature_columns, read_features
+from optimized_binary_classifier import OptimizedBinaryClassifier
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FOLDS = 5
+GROUP_COLUMN = 'problem_id'
+METRIC_KEYS = ('overall_accuracy', 'ai_accuracy', 'human_accuracy')
+
+
+@dataclass
+class FoldResult:
+    fold: int
+    test_problems: List[str]
+    train_samples: int
+    test_samples: int
+    evaluation: Dict[str, Any]
+    fit_seconds: float
+    eval_seconds: float
+    wall_seconds: float
+
+
+@dataclass
+class CrossValidationResult:
+    n_folds: int
+    workers: int
+    folds: List[FoldResult]
+    wall_seconds: float
+    summary: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_cv_frame(features_path: str) -> pd.DataFrame:
+    """Đọc feature store một lần: các cột số + label + problem_id"""
+    numeric_columns = feature_columns(features_path, numeric_only=True)
+    columns = None if numeric_columns is None else numeric_columns + ['label', GROUP_COLUMN]
+    df = read_features(features_path, columns=columns)
+    return df[df['label'].isin(['AI', 'Human'])].reset_index(drop=True)
+
+
+def group_folds(groups: pd.Series, n_folds: int = DEFAULT_FOLDS, seed: int = 42) -> List[List[str]]:
+    """
+    Chia các groups (problem_id) vào n_folds sao cho số samples mỗi fold gần bằng nhau
+
+    Groups lớn được xếp trước vào fold đang ít samples nhất; seed quyết định thứ tự các groups cùng kích thước
+    """
+    sizes = groups.astype(str).value_counts()
+    if len(sizes) < n_folds:
+        raise ValueError(f"Cần ít nhất {n_folds} problems cho {n_folds}-fold CV, chỉ có {len(sizes)}")
+
+    rng = np.random.default_rng(seed)
+    names = sizes.index.to_numpy()[rng.permutation(len(sizes))]
+    counts = sizes.loc[names].to_numpy()
+    order = np.argsort(-counts, kind='stable')
+
+    folds: List[List[str]] = [[] for _ in range(n_folds)]
+    fold_sizes = np.zeros(n_folds, dtype=int)
+    for i in order:
+        target = int(np.argmin(fold_sizes))
+        folds[target].append(str(names[i]))
+        fold_sizes[target] += counts[i]
+    return [sorted(fold) for fold in folds]
+
+
+def run_fold(df: pd.DataFrame, fold: int, test_problems: List[str]) -> FoldResult:
+    """Fit weights trên các problems còn lại, đánh giá trên test_problems"""
+    start = time.perf_counter()
+    is_test = df[GROUP_COLUMN].astype(str).isin(test_problems).to_numpy()
+    train_df, test_df = df[~is_test], df[is_test]
+
+    classifier = OptimizedBinaryClassifier()
+    classifier.fit(train_df)
+    fitted = time.perf_counter()
+    evaluation = classifier.evaluate_frame(test_df)
+    done = time.perf_counter()
+
+    return FoldResult(
+        fold=fold,
+        test_problems=test_problems,
+        train_samples=len(train_df),
+        test_samples=len(test_df),
+        evaluation=evaluation,
+        fit_seconds=fitted - start,
+        eval_seconds=done - fitted,
+        wall_seconds=done - start
+    )
+
+
+# NOTE: DataFrame riêng của mỗi worker process, đọc từ feature store một lần trong _init_worker
+_worker_frame: Optional[pd.DataFrame] = None
+
+def _init_worker(features_path: str):
+    global _worker_frame
+    # NOTE: Worker chỉ log warning, tránh log lặp lại của từng lần fit
+    logging.getLogger('optimized_binary_classifier').setLevel(logging.WARNING)
+    _worker_frame = load_cv_frame(features_path)
+
+def _run_fold_in_worker(fold: int, test_problems: List[str]) -> FoldResult:
+    return run_fold(_worker_frame, fold, test_problems)
+
+
+def summarize_folds(folds: List[FoldResult]) -> Dict[str, Any]:
+    """Mean/std của metrics qua các folds + confusion matrix cộng dồn (pooled)"""
+    summary: Dict[str, Any] = {}
+    for key in METRIC_KEYS:
+        values = np.array([f.evaluation[key] for f in folds], dtype=float)
+        summary[key] = {'mean': float(values.mean()), 'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0}
+
+    confusion: Dict[str, int] = {}
+    for f in folds:
+        for key, value in f.evaluation['confusion_matrix'].items():
+            confusion[key] = confusion.get(key, 0) + value
+    total = sum(confusion.values())
+    summary['pooled_accuracy'] = (confusion['ai_as_ai'] + confusion['human_as_human']) / total if total else 0.0
+    summary['confusion_matrix'] = confusion
+    summary['fold_wall_seconds'] = [round(f.wall_seconds, 3) for f in folds]
+    return summary
+
+
+def cross_validate(features_path: str, n_folds: int = DEFAULT_FOLDS, workers: Optional[int] = None,
+                   seed: int = 42) -> CrossValidationResult:
+    """
+    Grouped k-fold CV theo problem_id trên feature store đã trích xuất
+
+    Args:
+        workers: Số worker processes (mặc định: min(n_folds, số CPU); 1 = tuần tự)
+    """
+    start = time.perf_counter()
+    df = load_cv_frame(features_path)
+    folds = group_folds(df[GROUP_COLUMN], n_folds, seed)
+    workers = min(n_folds, workers or os.cpu_count() or 1)
+    logger.info(f"{n_folds}-fold grouped CV: {len(df)} samples, {df[GROUP_COLUMN].nunique()} problems, "
+                f"{workers} worker(s)")
+
+    if workers <= 1:
+        results = [run_fold(df, i, test_problems) for i, test_problems in enumerate(folds)]
+    else:
+        # NOTE: Mỗi worker tự đọc feature store thay vì nhận DataFrame qua IPC cho từng fold
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(features_path,)) as executor:
+            results = list(executor.map(_run_fold_in_worker, range(n_folds), folds))
+
+    for result in results:
+        logger.info(f"Fold {result.fold + 1}/{n_folds}: {result.test_samples} test samples, "
+                    f"accuracy {result.evaluation['overall_accuracy']:.3f}, {result.wall_seconds:.2f}s")
+
+    return CrossValidationResult(
+        n_folds=n_folds,
+        workers=workers,
+        folds=results,
+        wall_seconds=time.perf_counter() - start,
+        summary=summarize_folds(results)
+    )
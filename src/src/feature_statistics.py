@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Feature Statistics
+Thống kê theo class (AI/Human) cho toàn bộ các cột số trong một lượt NumPy:
+count, mean, std, quantiles và Cohen's d - dùng chung cho training, analysis và feature_stats.json
+"""
+
+import warnings
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _column_stats(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """count / mean / std (ddof=1, bỏ qua NaN) cho từng cột của ma trận"""
+    # NOTE: Fortran order → mỗi cột liền nhau trong bộ nhớ, NumPy cộng pairwise theo cột giống pandas Series
+    values = np.asfortranarray(values)
+    count = np.count_nonzero(~np.isnan(values), axis=0)
+    # NOTE: Cột rỗng hoặc chỉ có 1 giá trị → mean/std NaN giống pandas, không cần warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0, ddof=1)
+    return count, mean, std
+
+
+def _quantile_name(q: float) -> str:
+    return f"q{round(q * 100):02d}"
+
+
+def class_statistics(df: pd.DataFrame, features: Optional[Sequence[str]] = None,
+                     label_column: str = 'label', ai_label: str = 'AI', human_label: str = 'Human',
+                     quantiles: Sequence[float] = DEFAULT_QUANTILES) -> pd.DataFrame:
+    """
+    Thống kê từng feature theo class, index = feature name
+
+    Columns: count/mean/std (toàn bộ rows), ai_count/ai_mean/ai_std, human_count/human_mean/human_std,
+    ai_<q>/human_<q> cho mỗi quantile, pooled_std, cohens_d (|Δmean| / pooled_std, NaN nếu pooled_std <= 0),
+    ai_higher
+    """
+    if features is None:
+        features = df.select_dtypes(include=[np.number]).columns
+    features = list(features)
+
+    values = df[features].to_numpy(dtype=float, na_value=np.nan)
+    labels = df[label_column].to_numpy()
+    ai_values = values[labels == ai_label]
+    human_values = values[labels == human_label]
+
+    count, mean, std = _column_stats(values)
+    _, ai_mean, ai_std = _column_stats(ai_values)
+    _, human_mean, human_std = _column_stats(human_values)
+
+    # NOTE: Pooled std dùng số rows mỗi class (giống công thức cũ dùng len(ai_data)/len(human_data))
+    n_ai, n_human = len(ai_values), len(human_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled_std = np.sqrt(((n_ai - 1) * ai_std ** 2 + (n_human - 1) * human_std ** 2) / (n_ai + n_human - 2))
+        cohens_d = np.where(pooled_std > 0, np.abs(ai_mean - human_mean) / pooled_std, np.nan)
+
+    stats = pd.DataFrame({
+        'count': count,
+        'mean': mean,
+        'std': std,
+        'ai_count': np.full(len(features), n_ai),
+        'ai_mean': ai_mean,
+        'ai_std': ai_std,
+        'human_count': np.full(len(features), n_human),
+        'human_mean': human_mean,
+        'human_std': human_std,
+        'pooled_std': pooled_std,
+        'cohens_d': cohens_d,
+        'ai_higher': ai_mean > human_mean
+    }, index=pd.Index(features, name='feature'))
+
+    if len(quantiles):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for prefix, class_values in (('ai', ai_values), ('human', human_values)):
+                if len(class_values):
+                    class_quantiles = np.nanquantile(class_values, quantiles, axis=0)
+                else:
+                    class_quantiles = np.full((len(quantiles), len(features)), np.nan)
+                for q, row in zip(quantiles, class_quantiles):
+                    stats[f"{prefix}_{_quantile_name(q)}"] = row
+
+    return stats
+
+
+class StreamingClassStatistics:
+    """
+    class_statistics (không có quantiles) tính dần qua từng DataFrame, ví dụ từng shard
+
+    Mỗi nhóm (all/ai/human) giữ count, mean và M2 (tổng bình phương độ lệch) theo từng cột;
+    hai phần được gộp bằng công thức của Chan nên kết quả khớp class_statistics trên DataFrame đã ghép
+    """
+
+    _GROUPS = ('all', 'ai', 'human')
+
+    def __init__(self, label_column: str = 'label', ai_label: str = 'AI', human_label: str = 'Human'):
+        self.label_column = label_column
+        self.ai_label = ai_label
+        self.human_label = human_label
+        self.features: List[str] = []
+        self.n_ai = 0
+        self.n_human = 0
+        self._moments = {group: (np.zeros(0), np.zeros(0), np.zeros(0)) for group in self._GROUPS}
+
+    def _grow(self, features: Sequence[str]) -> np.ndarray:
+        """Vị trí của features trong self.features, thêm features mới vào cuối"""
+        known = set(self.features)
+        new = [feature for feature in features if feature not in known]
+        if new:
+            self.features.extend(new)
+            self._moments = {group: tuple(np.concatenate([arr, np.zeros(len(new))]) for arr in moments)
+                             for group, moments in self._moments.items()}
+        position = {feature: i for i, feature in enumerate(self.features)}
+        return np.array([position[feature] for feature in features], dtype=int)
+
+    @staticmethod
+    def _partial_moments(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        count = np.count_nonzero(~np.isnan(values), axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(values.shape[1])
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+        return count, mean, m2
+
+    def update(self, df: pd.DataFrame, features: Optional[Sequence[str]] = None) -> None:
+        if features is None:
+            features = df.select_dtypes(include=[np.number]).columns
+        features = list(features)
+        index = self._grow(features)
+
+        values = np.asfortranarray(df[features].to_numpy(dtype=float, na_value=np.nan))
+        labels = df[self.label_column].to_numpy()
+        is_ai, is_human = labels == self.ai_label, labels == self.human_label
+        self.n_ai += int(is_ai.sum())
+        self.n_human += int(is_human.sum())
+
+        for group, rows in (('all', slice(None)), ('ai', is_ai), ('human', is_human)):
+            count_b, mean_b, m2_b = self._partial_moments(values[rows])
+            count, mean, m2 = (arr.copy() for arr in self._moments[group])
+            count_a, mean_a, m2_a = count[index], mean[index], m2[index]
+            total = count_a + count_b
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weight_b = np.where(total > 0, count_b / total, 0.0)
+            delta = mean_b - mean_a
+            count[index] = total
+            mean[index] = mean_a + delta * weight_b
+            m2[index] = m2_a + m2_b + delta ** 2 * count_a * weight_b
+            self._moments[group] = (count, mean, m2)
+
+    def _group_stats(self, group: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        count, mean, m2 = self._moments[group]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, mean, np.nan)
+            std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+        return count, mean, std
+
+    def result(self) -> pd.DataFrame:
+        """Cùng index và các cột count..ai_higher như class_statistics(quantiles=())"""
+        count, mean, std = self._group_stats('all')
+        _, ai_mean, ai_std = self._group_stats('ai')
+        _, human_mean, human_std = self._group_stats('human')
+
+        n_ai, n_human = self.n_ai, self.n_human
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pooled_std = np.sqrt(((n_ai - 1) * ai_std ** 2 + (n_human - 1) * human_std ** 2) / (n_ai + n_human - 2))
+            cohens_d = np.where(pooled_std > 0, np.abs(ai_mean - human_mean) / pooled_std, np.nan)
+
+        return pd.DataFrame({
+            'count': count,
+            'mean': mean,
+            'std': std,
+            'ai_count': np.full(len(self.features), n_ai),
+            'ai_mean': ai_mean,
+            'ai_std': ai_std,
+            'human_count': np.full(len(self.features), n_human),
+            'human_mean': human_mean,
+            'human_std': human_std,
+            'pooled_std': pooled_std,
+            'cohens_d': cohens_d,
+            'ai_higher': ai_mean > human_mean
+        }, index=pd.Index(self.features, name='feature'))
+
+
+def rank_by_effect_size(stats: pd.DataFrame, top_n: Optional[int] = None) -> List[Tuple[str, float]]:
+    """Features sắp xếp theo Cohen's d giảm dần (bỏ features không tính được effect size)"""
+    ranked = [(feature, float(d)) for feature, d in stats['cohens_d'].items() if not np.isnan(d)]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked[:top_n] if top_n is not None else ranked
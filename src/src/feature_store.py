@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Feature Store
+Lưu features dạng Parquet (typed, nén zstd) với key là content hash + extractor version,
+hỗ trợ column projection khi đọc để training/analysis chỉ load những cột cần thiết
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+try:
+    from features.feature_cache import extractor_fingerprint
+    EXTRACTOR_VERSION = extractor_fingerprint()
+except ImportError:
+    EXTRACTOR_VERSION = "unknown"
+
+logger = logging.getLogger(__name__)
+
+# NOTE: Các cột metadata (không phải feature) trong feature store
+METADATA_COLUMNS = ['file_path', 'filename', 'label', 'problem_id', 'file_extension',
+                    'content_hash', 'extractor_version']
+
+FEATURES_EXTENSION = '.parquet' if PARQUET_AVAILABLE else '.csv'
+
+
+def is_parquet(path) -> bool:
+    return Path(path).suffix == '.parquet'
+
+
+def feature_columns(path, numeric_only: bool = False) -> Optional[List[str]]:
+    """
+    Danh sách cột của file features mà không cần đọc dữ liệu
+
+    Returns None nếu không xác định được (vd: numeric_only với CSV), caller nên đọc tất cả
+    """
+    if is_parquet(path):
+        schema = pq.read_schema(path)
+        if numeric_only:
+            return [field.name for field in schema
+                    if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+                    or pa.types.is_boolean(field.type)]
+        return list(schema.names)
+
+    if numeric_only:
+        return None
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_features(path, columns: Optional[Iterable[str]] = None,
+                  current_version_only: bool = False) -> pd.DataFrame:
+    """
+    Đọc features từ Parquet hoặc CSV, chỉ load các cột trong columns (nếu có)
+
+    current_version_only: chỉ lấy rows có extractor_version của extractor hiện tại
+    (file không có cột extractor_version coi như không có row nào khớp)
+    """
+    if is_parquet(path):
+        return FeatureStore(path).read(columns, current_version_only=current_version_only)
+
+    if columns is not None:
+        # NOTE: Bỏ qua cột không tồn tại thay vì lỗi (vd: detection_* khi không chạy detector)
+        available = set(feature_columns(path))
+        columns = [column for column in dict.fromkeys(columns) if column in available]
+    if not current_version_only:
+        return pd.read_csv(path, usecols=columns)
+
+    read_columns = None if columns is None else list(dict.fromkeys(columns + ['extractor_version']))
+    # NOTE: Version là hex string, đọc dạng str để không bị parse thành số
+    df = pd.read_csv(path, usecols=lambda column: read_columns is None or column in read_columns,
+                     dtype={'extractor_version': str})
+    if 'extractor_version' not in df.columns:
+        return df.iloc[0:0][columns] if columns is not None else df.iloc[0:0]
+    df = df[df['extractor_version'] == EXTRACTOR_VERSION].reset_index(drop=True)
+    return df[columns] if columns is not None else df
+
+
+def write_features(df: pd.DataFrame, path) -> None:
+    """Ghi features, định dạng theo đuôi file (.parquet hoặc .csv)"""
+    if is_parquet(path):
+        FeatureStore(path).write(df)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8')
+
+
+def unified_schema(paths: Sequence) -> Optional['pa.Schema']:
+    """Schema chung của nhiều file Parquet (chỉ đọc footer), None nếu không phải tất cả đều là Parquet"""
+    if not PARQUET_AVAILABLE or not paths or not all(is_parquet(path) for path in paths):
+        return None
+    # NOTE: 'permissive' cho phép int64 ở file này / double ở file khác → double
+    return pa.unify_schemas([pq.read_schema(path) for path in paths], promote_options='permissive')
+
+
+def write_features_stream(frames: Iterable[pd.DataFrame], path, schema: Optional['pa.Schema'] = None) -> int:
+    """
+    Ghi lần lượt nhiều DataFrame vào một file features, bộ nhớ chỉ giữ một DataFrame mỗi lúc
+
+    schema: schema Parquet của output (mặc định lấy từ DataFrame đầu tiên); với CSV chỉ dùng tên cột
+    Returns: tổng số rows đã ghi
+    """
+    if is_parquet(path):
+        return FeatureStore(path).write_frames(frames, schema=schema)
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    columns = list(schema.names) if schema is not None else None
+    total = 0
+    try:
+        for df in frames:
+            if columns is None:
+                columns = list(df.columns)
+            df.reindex(columns=columns).to_csv(tmp_path, mode='a' if total else 'w', header=not total,
+                                               index=False, encoding='utf-8')
+            total += len(df)
+        if columns is None:
+            return 0
+        tmp_path.replace(path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    logger.info(f"Đã lưu {total} records vào {path}")
+    return total
+
+
+class FeatureStore:
+    """Parquet feature store, mỗi row là features của một file code"""
+
+    def __init__(self, path, extractor_version: str = EXTRACTOR_VERSION):
+        if not PARQUET_AVAILABLE:
+            raise ImportError("pyarrow is required for the Parquet feature store")
+        self.path = Path(path)
+        self.extractor_version = extractor_version
+
+    def exists(self) -> bool:
+        # NOTE: File rỗng (placeholder) coi như chưa có dữ liệu
+        return self.path.exists() and self.path.stat().st_size > 0
+
+    def _to_table(self, df: pd.DataFrame) -> 'pa.Table':
+        df = df.copy()
+        # NOTE: Cột object (string) giữ nguyên kiểu string, Parquet tự dictionary-encode
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].astype('string')
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Ghi DataFrame vào store (atomic), rows chưa có extractor_version được gán version hiện tại"""
+        if 'extractor_version' not in df.columns:
+            df = df.assign(extractor_version=self.extractor_version)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        pq.write_table(self._to_table(df), tmp_path, compression='zstd')
+        tmp_path.replace(self.path)
+        logger.info(f"Đã lưu {len(df)} records vào {self.path}")
+
+    def write_frames(self, frames: Iterable[pd.DataFrame], schema: Optional['pa.Schema'] = None) -> int:
+        """
+        Ghi nhiều DataFrame thành các row groups của một file (atomic), không ghép chúng trong bộ nhớ
+
+        Cột thiếu được điền null và kiểu được cast theo schema. Không ghi gì nếu frames rỗng
+        Returns: tổng số rows đã ghi
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        writer = None
+        total = 0
+        try:
+            for df in frames:
+                if 'extractor_version' not in df.columns:
+                    df = df.assign(extractor_version=self.extractor_version)
+                table = self._to_table(df)
+                if writer is None:
+                    schema = schema or table.schema
+                    writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+                columns = [table.column(field.name).cast(field.type) if field.name in table.column_names
+                           else pa.nulls(len(table), field.type) for field in schema]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                total += len(table)
+            if writer is None:
+                return 0
+            writer.close()
+            writer = None
+            tmp_path.replace(self.path)
+        finally:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+        logger.info(f"Đã lưu {total} records vào {self.path}")
+        return total
+
+    def read(self, columns: Optional[Iterable[str]] = None, current_version_only: bool = False) -> pd.DataFrame:
+        """
+        Đọc features với column projection, lọc theo extractor version nếu cần
+
+        Args:
+            columns: Chỉ load các cột này (None = tất cả, cột không tồn tại bị bỏ qua)
+            current_version_only: Chỉ lấy rows được trích xuất bởi extractor version hiện tại
+        """
+        available = set(pq.read_schema(self.path).names)
+        if columns is not None:
+            columns = [column for column in dict.fromkeys(columns) if column in available]
+
+        filters = None
+        if current_version_only:
+            if 'extractor_version' not in available:
+                return pq.read_table(self.path, columns=columns).slice(0, 0).to_pandas()
+            filters = [('extractor_version', '==', self.extractor_version)]
+
+        table = pq.read_table(self.path, columns=columns, filters=filters)
+        return table.to_pandas()
+
+    def columns(self, numeric_only: bool = False) -> List[str]:
+        return feature_columns(self.path, numeric_only=numeric_only)
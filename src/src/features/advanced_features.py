@@ -8,11 +8,21 @@ from pathlib import Path
 
 # Import existing modules
 try:
+    from .lexer import LexedSource, lex_code
     from .ast_analyzer import CppASTAnalyzer, ASTFeatures
     from .human_style_analyzer import HumanStyleAnalyzer, HumanStyleFeatures
+    from .feature_cache import FeatureCache, get_feature_cache
 except ImportError:
     pass
 
+# NOTE: Chuỗi operator liên tiếp - định nghĩa token operator của token_count/Halstead
+_OPERATOR_RUN = re.compile(r'[+\-*/=<>!&|]+')
+_TOKEN = re.compile(r'\b\w+\b|[+\-*/=<>!&|]+|[{}();,.]')
+_STRING_LITERAL = re.compile(r'"[^"]*"')
+_CHAR_LITERAL = re.compile(r"'[^']*'")
+_CAMEL_CASE = re.compile(r'[a-z][a-zA-Z0-9]*[A-Z][a-zA-Z0-9]*')
+_SNAKE_CASE = re.compile(r'[a-z]+_[a-z_0-9]*')
+
 @dataclass
 class CodeRedundancyFeatures:
     # NOTE: Đặc trưng về code redundancy và repetition - đã chuẩn hóa
@@ -124,23 +134,117 @@ class ComprehensiveFeatures:
         
         return result
 
+def _suffix_array(ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Suffix array của một dãy số nguyên (prefix doubling, mỗi vòng là một lexsort)
+    
+    Returns:
+        (suffix_array, ranks) với ranks[suffix_array[r]] == r
+    """
+    n = len(ids)
+    rank = np.asarray(ids, dtype=np.int64)
+    suffix_array = np.argsort(rank, kind='stable')
+    step = 1
+    
+    while True:
+        # Sắp xếp theo cặp (rank[i], rank[i + step]), -1 nếu vượt quá cuối dãy
+        second = np.full(n, -1, dtype=np.int64)
+        if step < n:
+            second[:n - step] = rank[step:]
+        suffix_array = np.lexsort((second, rank))
+        
+        first_sorted = rank[suffix_array]
+        second_sorted = second[suffix_array]
+        changed = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[suffix_array] = np.concatenate(([0], np.cumsum(changed)))
+        
+        if rank[suffix_array[-1]] == n - 1 or step >= n:
+            return suffix_array, rank
+        step *= 2
+
+
+def _lcp_array(ids: List[int], suffix_array: np.ndarray, ranks: np.ndarray) -> List[int]:
+    """
+    LCP array (Kasai, O(n)): lcp[r] = độ dài prefix chung của suffix_array[r - 1] và suffix_array[r]
+    """
+    n = len(ids)
+    suffix_array = suffix_array.tolist()
+    ranks = ranks.tolist()
+    lcp = [0] * n
+    common = 0
+    
+    for position in range(n):
+        rank = ranks[position]
+        if rank == 0:
+            common = 0
+            continue
+        previous = suffix_array[rank - 1]
+        while (position + common < n and previous + common < n
+               and ids[position + common] == ids[previous + common]):
+            common += 1
+        lcp[rank] = common
+        if common:
+            common -= 1
+    
+    return lcp
+
 class AdvancedFeatureExtractor:
     # NOTE: Hệ thống trích xuất đặc trưng nâng cao
     
-    def __init__(self):
+    def __init__(self, cache: Optional['FeatureCache'] = None):
         self.ast_analyzer = CppASTAnalyzer() if 'CppASTAnalyzer' in globals() else None
         self.human_style_analyzer = HumanStyleAnalyzer() if 'HumanStyleAnalyzer' in globals() else None
+        # NOTE: Mặc định dùng cache chung của process (content-hash LRU)
+        if cache is None and 'get_feature_cache' in globals():
+            cache = get_feature_cache()
+        self.cache = cache
         self.setup_patterns()
     
     def setup_patterns(self):
         # NOTE: Setup regex patterns cho việc phân tích code
-        self.template_patterns = [
+        # NOTE: Các pattern đếm được match trên toàn bộ text (kể cả comment/string) như khi
+        # feature_stats.json và model được fit - LexedSource chỉ cache lines/words, không đổi cách đếm
+        self.template_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in (
             r'#include\s*<stdio\.h>',
             r'#include\s*<iostream>',
             r'int\s+main\s*\(\s*\)',
             r'return\s+0\s*;',
             r'using\s+namespace\s+std\s*;'
-        ]
+        )]
+        
+        self.error_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in (
+            r'if\s*\(\s*\w+\s*==\s*NULL\s*\)',
+            r'if\s*\(\s*!\s*\w+\s*\)',
+            r'if\s*\(\s*\w+\s*!=\s*NULL\s*\)',
+            r'return\s+1\s*;',  # Error return
+            r'printf\s*\(\s*".*error.*"',  # Error messages
+        )]
+        
+        self.decision_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in (
+            r'\bif\s*\(',
+            r'\bwhile\s*\(',
+            r'\bfor\s*\(',
+            r'\bswitch\s*\(',
+            r'\bcase\s+',
+            r'\?.*:',  # ternary operator
+        )]
+        
+        # Function definitions: type [*] name (params) {
+        self.function_definition_pattern = re.compile(
+            r'\b(?:int|void|float|double|char|string|bool|long|short|unsigned)\s+'  # return type
+            r'(?:\*\s*)?'  # optional pointer
+            r'([a-zA-Z_][a-zA-Z0-9_]*)\s*'  # function name
+            r'\([^)]*\)\s*'  # parameters
+            r'\{'  # opening brace
+        )
+        self.function_pattern = re.compile(r'\b(?:int|void|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(')
+        self.function_call_pattern = re.compile(r'\b(?:int|void|float|double|char|string|bool)\s+\w+\s*\(')
+        self.variable_pattern = re.compile(r'\b(?:int|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\b')
+        # NOTE: for (int i = 0 / for (i < ... - chỉ cần cho các biến vòng lặp i, j, k
+        self.loop_context_patterns = {
+            var: re.compile(rf'for\s*\(\s*(?:int\s+)?{var}\s*[=<>]', re.IGNORECASE) for var in ('i', 'j', 'k')
+        }
         
         # NOTE: Tên biến chung chung
         self.generic_vars = {
@@ -179,154 +283,143 @@ class AdvancedFeatureExtractor:
     
     def extract_all_features(self, code: str, filename: str = "") -> ComprehensiveFeatures:
         # NOTE: Trích xuất tất cả features từ source code
+        # NOTE: Features chỉ phụ thuộc nội dung code nên kết quả được cache theo hash của code
+        if self.cache is None or not self.cache.enabled:
+            return self._extract_all_features(code, filename)
+        
+        key = self.cache.make_key(code)
+        features = self.cache.get(key)
+        if features is None:
+            features = self._extract_all_features(code, filename)
+            self.cache.put(key, features)
+        return features
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss metrics của feature cache"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def _extract_all_features(self, code: str, filename: str = "") -> ComprehensiveFeatures:
+        # NOTE: Mỗi file tạo đúng một LexedSource, mọi analyzer dùng chung các view đã cache (lines, words, ...)
         features = ComprehensiveFeatures()
+        lexed = lex_code(code)
         
         # Basic features
-        features = self._extract_basic_features(code, features)
+        features = self._extract_basic_features(lexed, features)
         
         # AST features
         if self.ast_analyzer:
-            features.ast_features = self.ast_analyzer.analyze_code(code, filename)
+            features.ast_features = self.ast_analyzer.analyze_code(code, filename, lexed=lexed)
         
         # Advanced features
-        features.redundancy = self._extract_redundancy_features(code)
-        features.naming_patterns = self._extract_naming_features(code)
-        features.complexity = self._extract_complexity_features(code)
-        features.ai_patterns = self._extract_ai_pattern_features(code)
+        features.redundancy = self._extract_redundancy_features(lexed)
+        features.naming_patterns = self._extract_naming_features(lexed)
+        features.complexity = self._extract_complexity_features(lexed)
+        features.ai_patterns = self._extract_ai_pattern_features(lexed)
         
         # Human style features
         if self.human_style_analyzer:
-            features.human_style = self.human_style_analyzer.analyze_code(code, filename)
+            features.human_style = self.human_style_analyzer.analyze_code(code, filename, lexed=lexed)
         
         return features
 
-    def _extract_basic_features(self, code: str, features: ComprehensiveFeatures) -> ComprehensiveFeatures:
+    def _extract_basic_features(self, lexed: LexedSource, features: ComprehensiveFeatures) -> ComprehensiveFeatures:
         # NOTE: Trích xuất basic features
-        lines = code.splitlines()
+        lines = lexed.lines
         features.loc = len(lines)
         
         # NOTE: Tỷ lệ comment
-        comment_lines = len([l for l in lines if l.strip().startswith('//') or '/*' in l])
+        comment_lines = lexed.comment_line_count
         features.comment_ratio = comment_lines / len(lines) if lines else 0
         
         # NOTE: Tỷ lệ dòng trống
-        blank_lines = len([l for l in lines if not l.strip()])
+        blank_lines = len(lines) - len(lexed.non_empty_lines)
         features.blank_ratio = blank_lines / len(lines) if lines else 0
         
         # NOTE: Token count - đếm các tokens cơ bản
-        features.token_count = self._count_tokens(code)
+        features.token_count = self._count_tokens(lexed)
         
         # NOTE: Function count - đếm số hàm
-        features.functions = self._count_functions(code)
+        features.functions = self._count_functions(lexed)
         
         # NOTE: Cyclomatic complexity - tính toán dựa trên control flow
-        features.cyclomatic_complexity = self._calculate_cyclomatic_complexity(code)
+        features.cyclomatic_complexity = self._calculate_cyclomatic_complexity(lexed)
         
         return features
     
-    def _count_tokens(self, code: str) -> int:
+    def _count_tokens(self, lexed: LexedSource) -> int:
         """Đếm số tokens trong code"""
         # Đơn giản hóa: đếm words, operators và separators
-        import re
-        
         # Loại bỏ comments và string literals
-        clean_code = re.sub(r'//.*$', '', code, flags=re.MULTILINE)
-        clean_code = re.sub(r'/\*.*?\*/', '', clean_code, flags=re.DOTALL)
-        clean_code = re.sub(r'"[^"]*"', '""', clean_code)
-        clean_code = re.sub(r"'[^']*'", "''", clean_code)
+        clean_code = _STRING_LITERAL.sub('""', lexed.regex_stripped_code)
+        clean_code = _CHAR_LITERAL.sub("''", clean_code)
         
         # Tách tokens: identifiers, numbers, operators, punctuation
-        tokens = re.findall(r'\b\w+\b|[+\-*/=<>!&|]+|[{}();,.]', clean_code)
-        return len(tokens)
+        return len(_TOKEN.findall(clean_code))
     
-    def _count_functions(self, code: str) -> int:
+    def _count_functions(self, lexed: LexedSource) -> int:
         """Đếm số functions trong code"""
-        # Pattern phức tạp hơn để bắt các function definitions
-        function_pattern = re.compile(
-            r'\b(?:int|void|float|double|char|string|bool|long|short|unsigned)\s+'  # return type
-            r'(?:\*\s*)?'  # optional pointer
-            r'([a-zA-Z_][a-zA-Z0-9_]*)\s*'  # function name
-            r'\([^)]*\)\s*'  # parameters
-            r'\{'  # opening brace
-        , re.MULTILINE)
-        
-        functions = function_pattern.findall(code)
-        return len(functions)
+        return len(self.function_definition_pattern.findall(lexed.code))
     
-    def _calculate_cyclomatic_complexity(self, code: str) -> float:
+    def _calculate_cyclomatic_complexity(self, lexed: LexedSource) -> float:
         """Tính cyclomatic complexity dựa trên decision points"""
         # Cyclomatic complexity = edges - nodes + 2*connected_components
         # Simplified: count decision points + 1
-        
-        decision_patterns = [
-            r'\bif\s*\(',
-            r'\bwhile\s*\(',
-            r'\bfor\s*\(',
-            r'\bswitch\s*\(',
-            r'\bcase\s+',
-            r'\?.*:',  # ternary operator
-        ]
-        
         total_decisions = 0
-        for pattern in decision_patterns:
-            total_decisions += len(re.findall(pattern, code, re.IGNORECASE))
+        for pattern in self.decision_patterns:
+            total_decisions += len(pattern.findall(lexed.code))
         
         # Base complexity + decision points
         return max(1.0, float(total_decisions + 1))
     
-    def _extract_redundancy_features(self, code: str) -> CodeRedundancyFeatures:
+    def _extract_redundancy_features(self, lexed: LexedSource) -> CodeRedundancyFeatures:
         # NOTE: Trích xuất features về code redundancy
         features = CodeRedundancyFeatures()
         
-        lines = [l.strip() for l in code.splitlines() if l.strip()]
+        lines = lexed.non_empty_lines
         
         if not lines:
             return features
         
+        # NOTE: Mỗi dòng được map sang một id, các phép so sánh bên dưới chạy trên ids
+        line_ids = {}
+        ids = [line_ids.setdefault(line, len(line_ids)) for line in lines]
+        
         # NOTE: Dòng trùng lặp
-        line_counts = Counter(lines)
-        duplicates = sum(count - 1 for count in line_counts.values() if count > 1)
+        duplicates = len(lines) - len(line_ids)
         features.duplicate_lines = duplicates
         features.duplicate_line_ratio = duplicates / len(lines)
         
-        # NOTE: Các patterns lặp lại (tìm kiếm các khối code tương tự)
-        patterns = []
-        for i, line in enumerate(lines):
-            # Create 3-gram patterns
-            if i + 2 < len(lines):
-                pattern = (lines[i], lines[i+1], lines[i+2])
-                patterns.append(pattern)
-        
-        pattern_counts = Counter(patterns)
-        repeated = sum(1 for count in pattern_counts.values() if count > 1)
+        # NOTE: Suffix array + LCP trên dãy line ids. Các suffix chung prefix nằm liền
+        # nhau trong suffix array nên cả hai metric dưới đây chỉ cần một lượt qua LCP
+        suffix_array, ranks = _suffix_array(ids)
+        lcp = _lcp_array(ids, suffix_array, ranks)
+        
+        # NOTE: Các patterns lặp lại - số 3-gram (3 dòng liên tiếp) khác nhau xuất hiện >= 2 lần,
+        # mỗi nhóm là một đoạn liên tiếp có LCP >= 3 trong suffix array
+        repeated = sum(
+            1 for rank in range(1, len(lcp))
+            if lcp[rank] >= 3 and lcp[rank - 1] < 3
+        )
         features.repeated_patterns = repeated
         # Normalize by LOC
         features.repeated_patterns_per_loc = repeated / max(1, len(lines))
         
         # NOTE: Điểm copy-paste (heuristic dựa trên các chuỗi giống hệt nhau)
-        max_sequence = 0
-        for i in range(len(lines)):
-            for j in range(i + 1, len(lines)):
-                seq_len = 0
-                while (i + seq_len < len(lines) and 
-                       j + seq_len < len(lines) and 
-                       lines[i + seq_len] == lines[j + seq_len]):
-                    seq_len += 1
-                max_sequence = max(max_sequence, seq_len)
+        # Chuỗi dòng lặp lại dài nhất = LCP lớn nhất giữa hai suffix
+        max_sequence = max(lcp)
         
         features.copy_paste_score = max_sequence / len(lines) if lines else 0
         
         return features
     
-    def _extract_naming_features(self, code: str) -> NamingPatternFeatures:
+    def _extract_naming_features(self, lexed: LexedSource) -> NamingPatternFeatures:
         # NOTE: Trích xuất features về naming patterns
         features = NamingPatternFeatures()
         
         # NOTE: Tìm tất cả các identifiers
-        # Find all identifiers for naming analysis
-        identifiers = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', code)
-        variables = re.findall(r'\b(?:int|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\b', code)
-        functions = re.findall(r'\b(?:int|void|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(', code)
+        identifiers = lexed.words
+        variables = self.variable_pattern.findall(lexed.code)
+        functions = self.function_pattern.findall(lexed.code)
         
         if not identifiers:
             return features
@@ -342,7 +435,7 @@ class AdvancedFeatureExtractor:
             # Single character variables (nhưng có thể có ý nghĩa trong context)
             elif len(var) == 1:
                 # Kiểm tra context - ví dụ 'i', 'j' trong loop là OK
-                if var in ['i', 'j', 'k'] and self._is_loop_context(code, var):
+                if var in ['i', 'j', 'k'] and self.loop_context_patterns[var].search(lexed.code):
                     # Không đếm vào generic nếu đúng context
                     pass
                 else:
@@ -389,8 +482,9 @@ class AdvancedFeatureExtractor:
         features.meaningful_names_score = meaningful_score / len(set(identifiers)) if identifiers else 0
         
         # NOTE: Độ nhất quán của naming (camelCase vs snake_case consistency)
-        camel_case_count = len(re.findall(r'\b[a-z][a-zA-Z0-9]*[A-Z][a-zA-Z0-9]*\b', code))
-        snake_case_count = len(re.findall(r'\b[a-z]+_[a-z_0-9]*\b', code))
+        word_counts = lexed.word_counts
+        camel_case_count = sum(count for word, count in word_counts.items() if _CAMEL_CASE.fullmatch(word))
+        snake_case_count = sum(count for word, count in word_counts.items() if _SNAKE_CASE.fullmatch(word))
         
         total_naming = camel_case_count + snake_case_count
         if total_naming > 0:
@@ -398,32 +492,27 @@ class AdvancedFeatureExtractor:
         
         return features
     
-    def _is_loop_context(self, code: str, var: str) -> bool:
-        """Kiểm tra xem variable có được sử dụng trong context của loop không"""
-        # Tìm patterns như "for(int i = 0" hoặc "for(i = 0"
-        loop_pattern = re.compile(rf'for\s*\(\s*(?:int\s+)?{var}\s*[=<>]', re.IGNORECASE)
-        return bool(loop_pattern.search(code))
-    
-    def _extract_complexity_features(self, code: str) -> CodeComplexityFeatures:
+    def _extract_complexity_features(self, lexed: LexedSource) -> CodeComplexityFeatures:
         # NOTE: Trích xuất features về complexity với normalization
         features = CodeComplexityFeatures()
         
-        lines = code.splitlines()
-        code_lines = [l for l in lines if l.strip() and not l.strip().startswith('//')]
-        comment_lines = [l for l in lines if l.strip().startswith('//') or '/*' in l]
+        code_lines = [l for l in lexed.non_empty_lines if not l.startswith('//')]
+        comment_lines = lexed.comment_line_count
         
         # Safe LOC for normalization
         safe_loc = max(1, len(code_lines))
         
         # NOTE: Tỷ lệ code to comment (already a ratio)
         if comment_lines:
-            features.code_to_comment_ratio = len(code_lines) / len(comment_lines)
+            features.code_to_comment_ratio = len(code_lines) / comment_lines
         else:
             # NOTE: Sử dụng một giá trị cao nhưng hữu hạn để tránh vấn đề với ML training
             features.code_to_comment_ratio = 999.0 if code_lines else 0
         
-        operators = re.findall(r'[+\-*/=<>!&|]+', code)
-        operands = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', code)
+        # NOTE: Halstead đếm operators và operands trên toàn bộ text (kể cả comment/string) như baseline,
+        # để halstead/maintainability khớp với feature_stats.json và model đã train
+        operators = _OPERATOR_RUN.findall(lexed.code)
+        operands = lexed.words
         
         unique_operators = len(set(operators))
         unique_operands = len(set(operands))
@@ -445,7 +534,6 @@ class AdvancedFeatureExtractor:
         current_depth = 0
         
         for line in code_lines:
-            line = line.strip()
             if any(keyword in line for keyword in ['if', 'for', 'while', 'switch']):
                 current_depth += 1
                 nesting_score += current_depth
@@ -462,24 +550,22 @@ class AdvancedFeatureExtractor:
         
         return features
     
-    def _extract_ai_pattern_features(self, code: str) -> AIPatternFeatures:
+    def _extract_ai_pattern_features(self, lexed: LexedSource) -> AIPatternFeatures:
         # NOTE: Trích xuất features đặc trưng của AI-generated code
         features = AIPatternFeatures()
         
-        lines = code.splitlines()
-        code_content = ' '.join(lines)
+        lines = lexed.lines
         
         # NOTE: Điểm sử dụng template
         template_matches = 0
         for pattern in self.template_patterns:
-            template_matches += len(re.findall(pattern, code, re.IGNORECASE))
+            template_matches += len(pattern.findall(lexed.code))
         
         features.template_usage_score = template_matches / len(lines) if lines else 0
         
         # NOTE: Tỷ lệ boilerplate
         boilerplate_lines = 0
-        for line in lines:
-            line = line.strip()
+        for line in lexed.stripped_lines:
             if (line.startswith('#include') or 
                 line.startswith('using namespace') or
                 line == 'return 0;' or
@@ -492,16 +578,8 @@ class AdvancedFeatureExtractor:
         error_handling_score = 0
         
         # Specific error handling patterns
-        error_patterns = [
-            r'if\s*\(\s*\w+\s*==\s*NULL\s*\)',
-            r'if\s*\(\s*!\s*\w+\s*\)',
-            r'if\s*\(\s*\w+\s*!=\s*NULL\s*\)',
-            r'return\s+1\s*;',  # Error return
-            r'printf\s*\(\s*".*error.*"',  # Error messages
-        ]
-        
-        for pattern in error_patterns:
-            error_handling_score += len(re.findall(pattern, code, re.IGNORECASE))
+        for pattern in self.error_patterns:
+            error_handling_score += len(pattern.findall(lexed.code))
         
         features.error_handling_score = error_handling_score / len(lines) if lines else 0
         
@@ -510,12 +588,12 @@ class AdvancedFeatureExtractor:
         defensive_score = 0
         
         for pattern in defensive_patterns:
-            defensive_score += code_content.lower().count(pattern.lower())
+            defensive_score += lexed.lowered_code.count(pattern)
         
         features.defensive_programming_score = defensive_score / len(lines) if lines else 0
         
         # NOTE: Điểm over-engineering (quá nhiều hàm cho các tác vụ đơn giản)
-        function_count = len(re.findall(r'\b(?:int|void|float|double|char|string|bool)\s+\w+\s*\(', code))
+        function_count = len(self.function_call_pattern.findall(lexed.code))
         if function_count > 1 and len(lines) < 50:  # NOTE: Nhiều hàm trong code ngắn
             features.over_engineering_score = function_count / len(lines)
         
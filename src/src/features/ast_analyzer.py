@@ -8,6 +8,8 @@ from typing import Dict, List, Tuple, Optional, Set
 from dataclasses import dataclass
 from collections import Counter, defaultdict
 
+from .lexer import LexedSource, regex_strip_comments
+
 @dataclass
 class ASTFeatures:
     # NOTE: Cấu trúc dữ liệu cho AST features - đã chuẩn hóa
@@ -114,12 +116,15 @@ class CppASTAnalyzer:
         self.brace_sameline = re.compile(r'\S\s*\{')
         self.operator_spacing = re.compile(r'(\w+)\s*([=+\-*/])\s*(\w+)')
     
-    def analyze_code(self, code: str, filename: str = "") -> ASTFeatures:
+    def analyze_code(self, code: str, filename: str = "",
+                     lexed: Optional[LexedSource] = None) -> ASTFeatures:
         # NOTE: Phân tích code và trả về AST features với normalization
+        # NOTE: lexed được truyền vào từ AdvancedFeatureExtractor để dùng chung code đã xóa comment
         features = ASTFeatures()
         
         # Clean code
-        clean_code = self._preprocess_code(code)
+        stripped = lexed.regex_stripped_code if lexed is not None else regex_strip_comments(code)
+        clean_code = self._preprocess_code(stripped)
         lines = clean_code.split('\n')
         non_empty_lines = [l for l in lines if l.strip()]
         loc = len(non_empty_lines)
@@ -138,9 +143,8 @@ class CppASTAnalyzer:
         return features
     
     def _preprocess_code(self, code: str) -> str:
-        # NOTE: Tiền xử lý code để loại bỏ comments và normalize
-        code = re.sub(r'//.*$', '', code, flags=re.MULTILINE)
-        code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
+        # NOTE: Normalize code đã được xóa comments
+        # NOTE: Comments được xóa bằng regex như trước để features khớp với feature_stats.json và model đã train
         code = re.sub(r'\n\s*\n', '\n', code)
         
         return code
@@ -1,8 +1,10 @@
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Sequence
 from dataclasses import dataclass
 from pathlib import Path
+import json
 import pickle
 from abc import ABC, abstractmethod
+import numpy as np
 
 try:
     from .advanced_features import AdvancedFeatureExtractor, ComprehensiveFeatures
@@ -18,9 +20,77 @@ class DetectionResult:
     feature_importance: Dict[str, float]
     method_used: str  # "heuristic-static"
 
+@dataclass
+class BatchDetectionResult:
+    # NOTE: Kết quả detect cho N samples, mỗi field là một array độ dài N
+    scores: np.ndarray  # Điểm cuối cùng (cao = AI-like)
+    predictions: np.ndarray
+    confidences: np.ndarray
+    components: Dict[str, np.ndarray]  # Các sub-score/contribution theo từng sample
+    method_used: str
+    reasoning: Optional[List[List[str]]] = None  # Chỉ có khi explain=True
+    feature_importance: Optional[List[Dict[str, float]]] = None  # Chỉ có khi explain=True
+    timings: Optional[Dict[str, float]] = None  # Latency (ms) của từng detector thành viên (ensemble)
+    
+    def __len__(self) -> int:
+        return len(self.scores)
+    
+    def to_results(self) -> List[DetectionResult]:
+        return [
+            DetectionResult(
+                prediction=str(self.predictions[i]),
+                confidence=round(float(self.confidences[i]), 3),
+                reasoning=self.reasoning[i] if self.reasoning is not None else [],
+                feature_importance=self.feature_importance[i] if self.feature_importance is not None else {},
+                method_used=self.method_used
+            )
+            for i in range(len(self))
+        ]
+
+def feature_matrix(rows: Sequence[Dict[str, Any]], feature_names: Sequence[str]) -> np.ndarray:
+    """Chuyển list feature dicts thành ma trận (N x len(feature_names)), thiếu/None → NaN"""
+    matrix = np.full((len(rows), len(feature_names)), np.nan)
+    for i, row in enumerate(rows):
+        for j, name in enumerate(feature_names):
+            value = row.get(name)
+            if value is not None:
+                matrix[i, j] = float(value)
+    return matrix
+
+class FeatureColumns:
+    # NOTE: Truy cập cột theo tên trên ma trận features, cột thiếu/NaN → giá trị mặc định
+    
+    def __init__(self, matrix: np.ndarray, feature_names: Sequence[str]):
+        self.matrix = np.asarray(matrix, dtype=float)
+        if self.matrix.ndim == 1:
+            self.matrix = self.matrix.reshape(1, -1)
+        self.index = {name: j for j, name in enumerate(feature_names)}
+        self.size = self.matrix.shape[0]
+    
+    def has(self, name: str) -> np.ndarray:
+        if name not in self.index:
+            return np.zeros(self.size, dtype=bool)
+        return ~np.isnan(self.matrix[:, self.index[name]])
+    
+    def get(self, name: str, default: float = 0.0) -> np.ndarray:
+        if name not in self.index:
+            return np.full(self.size, float(default))
+        column = self.matrix[:, self.index[name]]
+        return np.where(np.isnan(column), default, column)
+    
+    def get_first(self, names: Sequence[str], default: float = 0.0) -> np.ndarray:
+        # NOTE: Giá trị của cột đầu tiên có mặt (vd: cyclomatic_complexity rồi cyclomatic_avg)
+        result = np.full(self.size, float(default))
+        for name in reversed(names):
+            result = np.where(self.has(name), self.get(name, default), result)
+        return result
+
 class BaseDetector(ABC):
     # NOTE: Base class cho các detector
     
+    # NOTE: Các features detector sử dụng - detect() chỉ đưa những cột này vào detect_batch
+    required_features: Tuple[str, ...] = ()
+    
     @abstractmethod
     def detect(self, features: Dict[str, Any]) -> DetectionResult:
         pass
@@ -28,8 +98,52 @@ class BaseDetector(ABC):
     @abstractmethod
     def get_name(self) -> str:
         pass
+    
+    def detect_batch(self, matrix: np.ndarray, feature_names: Sequence[str],
+                     explain: bool = False) -> BatchDetectionResult:
+        # NOTE: Mặc định gọi detect() cho từng sample, các detector có thể override bằng bản vectorized
+        names = list(feature_names)
+        results = [
+            self.detect({name: value for name, value in zip(names, row) if not np.isnan(value)})
+            for row in np.asarray(matrix, dtype=float).reshape(-1, len(names))
+        ]
+        return BatchDetectionResult(
+            scores=np.array([r.confidence for r in results]),
+            predictions=np.array([r.prediction for r in results], dtype=object),
+            confidences=np.array([r.confidence for r in results]),
+            components={},
+            method_used=results[0].method_used if results else "",
+            reasoning=[r.reasoning for r in results] if explain else None,
+            feature_importance=[r.feature_importance for r in results] if explain else None
+        )
+    
+    def load_thresholds(self, path: str) -> None:
+        # NOTE: Thresholds đã tune (vd: bằng threshold_tuning.py) thay cho giá trị mặc định
+        with open(path, 'r', encoding='utf-8') as f:
+            thresholds = json.load(f)
+        self.ai_threshold = float(thresholds['ai_threshold'])
+        self.human_threshold = float(thresholds['human_threshold'])
+    
+    def save_thresholds(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'ai_threshold': self.ai_threshold, 'human_threshold': self.human_threshold,
+                       'detector': self.get_name()}, f, indent=2)
+    
+    def _detect_single(self, features: Dict[str, Any]) -> DetectionResult:
+        # NOTE: detect() cho một sample = detect_batch với ma trận 1 dòng
+        names = list(self.required_features)
+        return self.detect_batch(feature_matrix([features], names), names, explain=True).to_results()[0]
 
 class HeuristicScoringDetector(BaseDetector):
+    required_features = (
+        'loc', 'functions', 'cyclomatic_complexity', 'cyclomatic_avg', 'comment_ratio',
+        'ast_indentation_consistency', 'ast_operator_spacing_consistency',
+        'naming_naming_consistency_score', 'naming_generic_var_ratio',
+        'ai_pattern_template_usage_score', 'ai_pattern_boilerplate_ratio', 'ai_pattern_error_handling_score',
+        'redundancy_copy_paste_score', 'redundancy_duplicate_line_ratio',
+        'ast_single_char_vars', 'ast_variable_count', 'variable_count',
+    )
+
     def __init__(self):
         # NOTE: Feature weights cho AI-leaning (positive) và Human-leaning (negative)
         # NOTE: Tổng các trọng số tuyệt đối <= 1.0 để giữ điểm ổn định
@@ -64,132 +178,106 @@ class HeuristicScoringDetector(BaseDetector):
         self.human_threshold = 0.40
 
     @staticmethod
-    def _clamp(value: float, low: float = 0.0, high: float = 1.0) -> float:
-        return max(low, min(high, value))
-
-    @staticmethod
-    def _normalize_high(value: float, low: float, high: float) -> float:
+    def _normalize_high(values: np.ndarray, low: float, high: float) -> np.ndarray:
         # NOTE: Chuẩn hóa giá trị cao hơn
         if high <= low:
-            return 0.0
-        return HeuristicScoringDetector._clamp((value - low) / (high - low))
+            return np.zeros_like(values)
+        return np.clip((values - low) / (high - low), 0.0, 1.0)
 
     @staticmethod
-    def _normalize_low(value: float, low: float, high: float) -> float:
+    def _normalize_low(values: np.ndarray, low: float, high: float) -> np.ndarray:
         # NOTE: Chuẩn hóa giá trị thấp hơn
         if high <= low:
-            return 0.0
-        return HeuristicScoringDetector._clamp((high - value) / (high - low))
+            return np.zeros_like(values)
+        return np.clip((high - values) / (high - low), 0.0, 1.0)
 
     def detect(self, features: Dict[str, Any]) -> DetectionResult:
         # NOTE: Tính toán điểm heuristic -> đưa ra dự đoán
-        contributions: Dict[str, float] = {}
-        reasons: List[str] = []
-
-        def add_ai(name: str, score: float, desc: str):
-            if score <= 0:
-                return
-            weight = self.ai_feature_weights[name]
-            contrib = weight * score
-            contributions[name] = contrib
-            reasons.append(f"{desc} (+{contrib:.3f})")
-
-        def add_human(name: str, score: float, desc: str):
-            if score <= 0:
-                return
-            weight = self.human_feature_weights[name]
-            contrib = weight * score
-            contributions[name] = -contrib
-            reasons.append(f"{desc} (-{contrib:.3f})")
+        return self._detect_single(features)
 
+    def _signal_scores(self, cols: FeatureColumns) -> List[Tuple[str, bool, np.ndarray, str]]:
+        """Các tín hiệu theo đúng thứ tự cộng điểm: (tên, là AI-leaning, score [0-1], mô tả)"""
         # NOTE: Lấy các metrics raw với giá trị mặc định an toàn
-        loc = float(features.get('loc', 0) or 0)
-        functions = float(features.get('functions', 0) or 0)
-        cyclomatic = float(features.get('cyclomatic_complexity', features.get('cyclomatic_avg', 0) or 0))
-
-        comment_ratio = float(features.get('comment_ratio', 0) or 0)
-        indentation_consistency = float(features.get('ast_indentation_consistency', 0) or 0)
-        operator_spacing_consistency = float(features.get('ast_operator_spacing_consistency', 0) or 0)
-
-        naming_consistency = float(features.get('naming_naming_consistency_score', 0) or 0)
-        naming_generic_ratio = float(features.get('naming_generic_var_ratio', 0) or 0)
-
-        template_usage = float(features.get('ai_pattern_template_usage_score', 0) or 0)
-        boilerplate_ratio = float(features.get('ai_pattern_boilerplate_ratio', 0) or 0)
-        error_handling_score = float(features.get('ai_pattern_error_handling_score', 0) or 0)
-
-        copy_paste_score = float(features.get('redundancy_copy_paste_score', 0) or 0)
-        duplicate_line_ratio = float(features.get('redundancy_duplicate_line_ratio', 0) or 0)
-
-        ast_single_char_vars = float(features.get('ast_single_char_vars', 0) or 0)
-        ast_variable_count = float(features.get('ast_variable_count', features.get('variable_count', 0) or 0))
+        loc = cols.get('loc')
+        functions = cols.get('functions')
+        cyclomatic = cols.get_first(('cyclomatic_complexity', 'cyclomatic_avg'))
+        operator_spacing_consistency = cols.get('ast_operator_spacing_consistency')
+        ast_single_char_vars = cols.get('ast_single_char_vars')
+        ast_variable_count = cols.get_first(('ast_variable_count', 'variable_count'))
 
         # NOTE: Các metrics dẫn xuất
-        function_density = functions / max(loc, 1.0)  # NOTE: Mật độ cao hơn trong code ngắn thì có thể là AI-generated
-
-        add_ai('comment_ratio', self._normalize_high(comment_ratio, 0.10, 0.35), 'Tỷ lệ comment cao')
-        add_ai('ast_indentation_consistency', self._normalize_high(indentation_consistency, 0.6, 1.0), 'Cách thụt lề nhất quán')
-        add_ai('naming_naming_consistency_score', self._normalize_high(naming_consistency, 0.5, 1.0), 'Cách đặt tên nhất quán')
-
-        add_ai('ai_pattern_template_usage_score', self._normalize_high(template_usage, 0.05, 0.30), 'Tồn tại các mẫu/template/boilerplate')
-        add_ai('ai_pattern_boilerplate_ratio', self._normalize_high(boilerplate_ratio, 0.05, 0.30), 'Tỷ lệ boilerplate cao')
-        add_ai('ai_pattern_error_handling_score', self._normalize_high(error_handling_score, 0.02, 0.20), 'Có mẫu xử lý lỗi rõ ràng')
-
-        add_ai('redundancy_copy_paste_score', self._normalize_high(copy_paste_score, 0.05, 0.40), 'Có lặp lại copy-paste')
-        add_ai('redundancy_duplicate_line_ratio', self._normalize_high(duplicate_line_ratio, 0.02, 0.25), 'Có dòng trùng lặp')
-
-        # NOTE: Độ phức tạp của code → AI-generated
-        add_ai('low_cyclomatic_complexity', self._normalize_low(cyclomatic, 1.0, 6.0), 'Độ phức tạp cyclomatic thấp')
-
-        # NOTE: Nhiều hàm trên mỗi LOC trong code ngắn → AI-generated
-        add_ai('function_density', self._normalize_high(function_density, 0.02, 0.12), 'Mật độ hàm cao so với độ dài code')
-
-        # NOTE: Chuẩn hóa và thêm tín hiệu nghiêng về code của người viết
-        add_human('short_loc', self._normalize_low(loc, 20.0, 80.0), 'Code rất ngắn')
-        add_human('naming_generic_var_ratio', self._normalize_high(naming_generic_ratio, 0.20, 0.70), 'Tên biến chung chung')
-
-        # NOTE: Không nhất quán khoảng cách toán tử (đảo ngược tính nhất quán)  
-        op_inconsistency = self._clamp(1.0 - operator_spacing_consistency)
-        add_human('ast_operator_spacing_inconsistency', self._normalize_high(op_inconsistency, 0.20, 0.80), 'Khoảng cách toán tử không nhất quán')
-
-        # NOTE: Mật độ biến ký tự đơn
-        scv_density = ast_single_char_vars / max(ast_variable_count, 1.0)
-        add_human('ast_single_char_vars_density', self._normalize_high(scv_density, 0.10, 0.50), 'Sử dụng biến ký tự đơn cao')
-
-        # NOTE: Tổng hợp điểm xung quanh mốc 0.5
-        total = 0.5
-        for k, v in contributions.items():
-            total += v
-        total = self._clamp(total)
-
-        if total > self.ai_threshold:
-            prediction = "AI-generated"
-            confidence = total
-        elif total < self.human_threshold:
-            prediction = "Human-written"
-            confidence = 1.0 - total
-        else:
-            prediction = "Uncertain"
-            confidence = 0.5
-
-        # NOTE: Sắp xếp lý do theo đóng góp tuyệt đối và giữ lại top 6
-        sorted_items = sorted(contributions.items(), key=lambda x: abs(x[1]), reverse=True)
-        top_keys = set(k for k, _ in sorted_items[:6])
-        filtered_reasons = [r for r in reasons if any(r.startswith(lbl) for lbl in [
-            'Tỷ lệ comment cao', 'Cách thụt lề nhất quán', 'Cách đặt tên nhất quán',
-            'Tồn tại các mẫu/template/boilerplate', 'Tỷ lệ boilerplate cao', 'Có mẫu xử lý lỗi rõ ràng',
-            'Có lặp lại copy-paste', 'Có dòng trùng lặp', 'Độ phức tạp cyclomatic thấp',
-            'Mật độ hàm cao so với độ dài code', 'Code rất ngắn', 'Tên biến chung chung',
-            'Khoảng cách toán tử không nhất quán', 'Sử dụng biến ký tự đơn cao'])]
-
-        feature_importance = {k: round(abs(v), 4) for k, v in contributions.items() if k in top_keys}
-
-        return DetectionResult(
-            prediction=prediction,
-            confidence=round(confidence, 3),
-            reasoning=filtered_reasons[:6],
-            feature_importance=feature_importance,
+        function_density = functions / np.maximum(loc, 1.0)  # NOTE: Mật độ cao hơn trong code ngắn thì có thể là AI-generated
+        op_inconsistency = np.clip(1.0 - operator_spacing_consistency, 0.0, 1.0)  # NOTE: Đảo ngược tính nhất quán
+        scv_density = ast_single_char_vars / np.maximum(ast_variable_count, 1.0)
+
+        high, low = self._normalize_high, self._normalize_low
+        return [
+            ('comment_ratio', True, high(cols.get('comment_ratio'), 0.10, 0.35), 'Tỷ lệ comment cao'),
+            ('ast_indentation_consistency', True, high(cols.get('ast_indentation_consistency'), 0.6, 1.0), 'Cách thụt lề nhất quán'),
+            ('naming_naming_consistency_score', True, high(cols.get('naming_naming_consistency_score'), 0.5, 1.0), 'Cách đặt tên nhất quán'),
+
+            ('ai_pattern_template_usage_score', True, high(cols.get('ai_pattern_template_usage_score'), 0.05, 0.30), 'Tồn tại các mẫu/template/boilerplate'),
+            ('ai_pattern_boilerplate_ratio', True, high(cols.get('ai_pattern_boilerplate_ratio'), 0.05, 0.30), 'Tỷ lệ boilerplate cao'),
+            ('ai_pattern_error_handling_score', True, high(cols.get('ai_pattern_error_handling_score'), 0.02, 0.20), 'Có mẫu xử lý lỗi rõ ràng'),
+
+            ('redundancy_copy_paste_score', True, high(cols.get('redundancy_copy_paste_score'), 0.05, 0.40), 'Có lặp lại copy-paste'),
+            ('redundancy_duplicate_line_ratio', True, high(cols.get('redundancy_duplicate_line_ratio'), 0.02, 0.25), 'Có dòng trùng lặp'),
+
+            # NOTE: Độ phức tạp thấp / nhiều hàm trên mỗi LOC trong code ngắn → AI-generated
+            ('low_cyclomatic_complexity', True, low(cyclomatic, 1.0, 6.0), 'Độ phức tạp cyclomatic thấp'),
+            ('function_density', True, high(function_density, 0.02, 0.12), 'Mật độ hàm cao so với độ dài code'),
+
+            # NOTE: Tín hiệu nghiêng về code của người viết
+            ('short_loc', False, low(loc, 20.0, 80.0), 'Code rất ngắn'),
+            ('naming_generic_var_ratio', False, high(cols.get('naming_generic_var_ratio'), 0.20, 0.70), 'Tên biến chung chung'),
+            ('ast_operator_spacing_inconsistency', False, high(op_inconsistency, 0.20, 0.80), 'Khoảng cách toán tử không nhất quán'),
+            ('ast_single_char_vars_density', False, high(scv_density, 0.10, 0.50), 'Sử dụng biến ký tự đơn cao'),
+        ]
+
+    def detect_batch(self, matrix: np.ndarray, feature_names: Sequence[str],
+                     explain: bool = False) -> BatchDetectionResult:
+        # NOTE: Tính điểm cho N samples cùng lúc; lý do (strings) chỉ được tạo khi explain=True
+        cols = FeatureColumns(matrix, feature_names)
+        signals = self._signal_scores(cols)
+
+        # NOTE: Tổng hợp điểm xung quanh mốc 0.5, chỉ tín hiệu có score > 0 mới đóng góp
+        total = np.full(cols.size, 0.5)
+        contributions: Dict[str, np.ndarray] = {}
+        for name, ai_leaning, score, _ in signals:
+            weight = self.ai_feature_weights[name] if ai_leaning else self.human_feature_weights[name]
+            contrib = np.where(score > 0, weight * score, 0.0)
+            contributions[name] = contrib if ai_leaning else -contrib
+            total = total + contributions[name]
+        total = np.clip(total, 0.0, 1.0)
+
+        is_ai = total > self.ai_threshold
+        is_human = total < self.human_threshold
+        predictions = np.where(is_ai, "AI-generated", np.where(is_human, "Human-written", "Uncertain")).astype(object)
+        confidences = np.where(is_ai, total, np.where(is_human, 1.0 - total, 0.5))
+
+        reasoning = feature_importance = None
+        if explain:
+            reasoning, feature_importance = [], []
+            for i in range(cols.size):
+                # NOTE: Lý do theo thứ tự tín hiệu, giữ top 6
+                active = [(name, contributions[name][i], desc)
+                          for name, _, score, desc in signals if score[i] > 0]
+                reasoning.append([f"{desc} ({'+' if value > 0 else '-'}{abs(value):.3f})"
+                                  for _, value, desc in active][:6])
+
+                # NOTE: Feature importance của top 6 đóng góp tuyệt đối lớn nhất
+                top_keys = {name for name, value, _ in sorted(active, key=lambda x: abs(x[1]), reverse=True)[:6]}
+                feature_importance.append({name: round(abs(float(value)), 4)
+                                           for name, value, _ in active if name in top_keys})
+
+        return BatchDetectionResult(
+            scores=total,
+            predictions=predictions,
+            confidences=confidences,
+            components=contributions,
             method_used="heuristic-static",
+            reasoning=reasoning,
+            feature_importance=feature_importance
         )
 
     def get_name(self) -> str:
@@ -197,14 +285,22 @@ class HeuristicScoringDetector(BaseDetector):
 
 def create_detector(detector_type: str = "enhanced", model_path: Optional[str] = None) -> BaseDetector:
     # NOTE: Factory function để tạo detector - Updated to use enhanced model by default
+    # model_path: file thresholds JSON (ai_threshold/human_threshold) thay cho giá trị mặc định
     if detector_type in ("enhanced", "baseline-aware"):
         try:
             from .enhanced_detection_model import create_enhanced_detector
-            return create_enhanced_detector()
+            detector = create_enhanced_detector()
         except ImportError:
             print("Enhanced detector not available, falling back to heuristic")
-            return HeuristicScoringDetector()
+            detector = HeuristicScoringDetector()
     elif detector_type in ("heuristic", "legacy"):
-        return HeuristicScoringDetector()
+        detector = HeuristicScoringDetector()
+    elif detector_type == "ensemble":
+        from .ensemble_detector import create_ensemble_detector
+        detector = create_ensemble_detector()
     else:
-        raise ValueError(f"Unknown detector type: {detector_type}. Available: enhanced, heuristic")
\ No newline at end of file
+        raise ValueError(f"Unknown detector type: {detector_type}. Available: enhanced, heuristic, ensemble")
+    
+    if model_path:
+        detector.load_thresholds(model_path)
+    return detector
\ No newline at end of file
@@ -3,15 +3,16 @@ Enhanced AI Code Detection Model với baseline-aware scoring
 Dựa trên phân tích dataset để tạo ra detection model chính xác hơn
 """
 
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Sequence
 from dataclasses import dataclass
 import math
+import os
 import numpy as np
 from abc import ABC, abstractmethod
 
 # Import base classes
 try:
-    from .detection_models import BaseDetector, DetectionResult
+    from .detection_models import BaseDetector, BatchDetectionResult, DetectionResult, FeatureColumns
 except ImportError:
     from dataclasses import dataclass
     @dataclass 
@@ -117,25 +118,35 @@ class FallbackBaselineStats:
         'complexity_cognitive_per_loc': 0.186,
     }
 
+# NOTE: (mask theo sample, template, values dùng để format template hoặc None)
+Indicator = Tuple[np.ndarray, str, Optional[np.ndarray]]
+
 class EnhancedAIDetector(BaseDetector):
     """
     Enhanced AI Detection Model với baseline-aware scoring
     Sử dụng dynamic loading từ feature_stats.json
     """
     
-    def __init__(self):
-        # Load baseline stats dynamically
-        if HAS_BASELINE_LOADER:
+    def __init__(self, use_baseline_features: Optional[bool] = None):
+        self._use_fallback_stats()
+        
+        # NOTE: Mặc định giữ 6 fallback features; ENHANCED_BASELINE_FEATURES=1 chuyển sang critical features
+        # (trọng số theo effect size) của baseline_loader - đây là thay đổi model, chưa được kiểm chứng trên dữ liệu có nhãn
+        if use_baseline_features is None:
+            use_baseline_features = os.getenv("ENHANCED_BASELINE_FEATURES", "0") == "1"
+        
+        # Không copy stats - mỗi lần detect đọc snapshot hiện tại nên hot-reload có hiệu lực ngay
+        self.baseline_loader = None
+        if use_baseline_features and HAS_BASELINE_LOADER:
             try:
                 self.baseline_loader = get_baseline_loader()
-                self.baseline_stats = self.baseline_loader.get_baseline_stats()
-                self.critical_features = self.baseline_loader.get_critical_features()
-                print(f"Loaded {len(self.critical_features)} critical features from baseline stats")
+                critical_features = self.baseline_loader.get_critical_features()
+                if not critical_features:
+                    raise ValueError("no critical features in baseline stats")
+                print(f"Loaded {len(critical_features)} critical features from baseline stats")
             except Exception as e:
+                self.baseline_loader = None
                 print(f"Failed to load baseline stats: {e}, using fallback")
-                self._use_fallback_stats()
-        else:
-            self._use_fallback_stats()
         
         # Thresholds cho classification
         self.ai_threshold = 0.65      # Confidence > 65% → AI
@@ -148,13 +159,13 @@ class EnhancedAIDetector(BaseDetector):
         fallback = FallbackBaselineStats()
         
         # Create a minimal baseline stats object
-        self.baseline_stats = SimpleNamespace(
+        self._fallback_stats = SimpleNamespace(
             ai_stats=fallback.ai_stats,
             human_stats=fallback.human_stats
         )
         
         # Create minimal critical features
-        self.critical_features = {
+        self._fallback_critical_features = {
             'ast_indentation_consistency': {'weight': 0.15, 'ai_better': True},
             'comment_ratio': {'weight': 0.12, 'ai_better': True},
             'naming_generic_var_ratio': {'weight': 0.12, 'ai_better': False},
@@ -163,232 +174,203 @@ class EnhancedAIDetector(BaseDetector):
             'human_style_overall_score': {'weight': 0.12, 'ai_better': False}
         }
         
-    def _calculate_feature_score(self, feature_name: str, value: float) -> Tuple[float, str]:
+    # NOTE: Các features dùng cho perfection/simplicity/chaos scores
+    _STYLE_FEATURES = (
+        'ast_indentation_consistency', 'spacing_spacing_issues_ratio',
+        'naming_inconsistency_naming_inconsistency_ratio', 'ast_variable_uniqueness_ratio',
+        'cyclomatic_complexity', 'ast_if_statements_per_loc', 'ast_for_loops_per_loc',
+        'complexity_maintainability_index', 'naming_generic_var_ratio',
+        'ast_avg_variable_name_length', 'ast_single_char_vars_ratio',
+    )
+    
+    def _current_baseline(self) -> Tuple[Any, Dict[str, Dict]]:
+        # NOTE: Đọc snapshot một lần cho mỗi lần detect để không lẫn hai phiên bản stats khi đang reload
+        if self.baseline_loader is not None:
+            snapshot = self.baseline_loader.get_snapshot()
+            if snapshot.critical_features:
+                return snapshot.baseline_stats, snapshot.critical_features
+        return self._fallback_stats, self._fallback_critical_features
+    
+    @property
+    def baseline_stats(self) -> Any:
+        return self._current_baseline()[0]
+    
+    @property
+    def critical_features(self) -> Dict[str, Dict]:
+        return self._current_baseline()[1]
+    
+    @property
+    def required_features(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(list(self.critical_features) + list(self._STYLE_FEATURES)))
+    
+    def _calculate_feature_scores(self, feature_name: str, values: np.ndarray,
+                                  baseline_stats: Any) -> Tuple[np.ndarray, Optional[np.ndarray]]:
         """
-        Tính điểm cho một feature dựa trên baseline comparison
-        Returns: (score, explanation)
+        Tính điểm cho một feature của N samples dựa trên baseline comparison
+        Returns: (scores, closer_to_ai) - closer_to_ai là None nếu không có baseline để so sánh
         score: 0.0-1.0 where 1.0 = strongly AI-like, 0.0 = strongly Human-like
         """
-        if feature_name not in self.baseline_stats.ai_stats or feature_name not in self.baseline_stats.human_stats:
-            return 0.5, f"No baseline data for {feature_name}"
+        if feature_name not in baseline_stats.ai_stats or feature_name not in baseline_stats.human_stats:
+            return np.full(len(values), 0.5), None
             
-        ai_baseline = self.baseline_stats.ai_stats[feature_name]
-        human_baseline = self.baseline_stats.human_stats[feature_name]
+        ai_baseline = baseline_stats.ai_stats[feature_name]
+        human_baseline = baseline_stats.human_stats[feature_name]
         
         # Handle edge cases
         if ai_baseline == human_baseline:
-            return 0.5, f"{feature_name}: No difference between AI/Human baselines"
+            return np.full(len(values), 0.5), None
             
         # Calculate distance from each baseline (normalized)
         range_val = abs(ai_baseline - human_baseline)
-        
-        # Distance to AI baseline (0.0 = exactly AI-like)
-        ai_distance = abs(value - ai_baseline) / range_val if range_val > 0 else 0
-        
-        # Distance to Human baseline (0.0 = exactly Human-like)  
-        human_distance = abs(value - human_baseline) / range_val if range_val > 0 else 0
-        
-        # Convert to score (0.0 = Human-like, 1.0 = AI-like)
-        if ai_distance < human_distance:
-            # Closer to AI baseline
-            similarity_to_ai = 1.0 - ai_distance
-            score = 0.5 + (similarity_to_ai * 0.5)  # Map to [0.5, 1.0]
-            explanation = f"Closer to AI baseline ({ai_baseline:.3f}) than Human ({human_baseline:.3f})"
-        else:
-            # Closer to Human baseline
-            similarity_to_human = 1.0 - human_distance
-            score = 0.5 - (similarity_to_human * 0.5)  # Map to [0.0, 0.5]
-            explanation = f"Closer to Human baseline ({human_baseline:.3f}) than AI ({ai_baseline:.3f})"
-            
-        return max(0.0, min(1.0, score)), explanation
+        ai_distance = np.abs(values - ai_baseline) / range_val      # 0.0 = exactly AI-like
+        human_distance = np.abs(values - human_baseline) / range_val  # 0.0 = exactly Human-like
+        
+        # Convert to score: closer to AI → [0.5, 1.0], closer to Human → [0.0, 0.5]
+        closer_to_ai = ai_distance < human_distance
+        scores = np.where(closer_to_ai,
+                          0.5 + ((1.0 - ai_distance) * 0.5),
+                          0.5 - ((1.0 - human_distance) * 0.5))
+        return np.clip(scores, 0.0, 1.0), closer_to_ai
+    
+    @staticmethod
+    def _baseline_explanation(feature_name: str, closer_to_ai: bool, baseline_stats: Any) -> str:
+        ai_baseline = baseline_stats.ai_stats[feature_name]
+        human_baseline = baseline_stats.human_stats[feature_name]
+        if closer_to_ai:
+            return f"Closer to AI baseline ({ai_baseline:.3f}) than Human ({human_baseline:.3f})"
+        return f"Closer to Human baseline ({human_baseline:.3f}) than AI ({ai_baseline:.3f})"
+    
+    @staticmethod
+    def _tiered(full: np.ndarray, partial: np.ndarray, partial_score: float = 0.6) -> np.ndarray:
+        # NOTE: 1.0 nếu đạt mức full, partial_score nếu đạt mức partial, còn lại 0.0
+        return np.where(full, 1.0, np.where(partial, partial_score, 0.0))
     
-    def _calculate_perfection_score(self, features: Dict[str, Any]) -> Tuple[float, List[str]]:
+    def _calculate_perfection_scores(self, cols: FeatureColumns) -> Tuple[np.ndarray, List[Indicator]]:
         """
         Tính điểm về sự hoàn hảo của code - AI code thường hoàn hảo hơn
         """
-        perfection_indicators = []
-        total_score = 0.0
-        count = 0
-        
-        # Perfect indentation
-        indentation_consistency = features.get('ast_indentation_consistency', 0.5)
-        if indentation_consistency >= 0.99:
-            perfection_indicators.append("Perfect indentation consistency (100%)")
-            total_score += 1.0
-        elif indentation_consistency >= 0.95:
-            perfection_indicators.append(f"Very high indentation consistency ({indentation_consistency:.1%})")
-            total_score += 0.7
-        else:
-            total_score += 0.0
-        count += 1
-        
-        # Spacing consistency
-        spacing_issues = features.get('spacing_spacing_issues_ratio', 1.0)
-        if spacing_issues <= 0.1:
-            perfection_indicators.append("Excellent spacing consistency")
-            total_score += 1.0
-        elif spacing_issues <= 0.5:
-            perfection_indicators.append("Good spacing consistency")
-            total_score += 0.6
-        count += 1
-        
-        # Naming consistency
-        naming_inconsistency = features.get('naming_inconsistency_naming_inconsistency_ratio', 1.0)
-        if naming_inconsistency <= 0.2:
-            perfection_indicators.append("Excellent naming consistency")
-            total_score += 1.0
-        elif naming_inconsistency <= 0.8:
-            perfection_indicators.append("Good naming consistency")
-            total_score += 0.6
-        count += 1
-        
+        indentation_consistency = cols.get('ast_indentation_consistency', 0.5)
+        spacing_issues = cols.get('spacing_spacing_issues_ratio', 1.0)
+        naming_inconsistency = cols.get('naming_inconsistency_naming_inconsistency_ratio', 1.0)
         # Variable uniqueness (AI tends to avoid duplicate variable names)
-        var_uniqueness = features.get('ast_variable_uniqueness_ratio', 0.5)
-        if var_uniqueness >= 0.95:
-            perfection_indicators.append(f"Very high variable uniqueness ({var_uniqueness:.1%})")
-            total_score += 1.0
-        elif var_uniqueness >= 0.8:
-            perfection_indicators.append(f"High variable uniqueness ({var_uniqueness:.1%})")
-            total_score += 0.6
-        count += 1
-        
-        return total_score / count if count > 0 else 0.0, perfection_indicators
+        var_uniqueness = cols.get('ast_variable_uniqueness_ratio', 0.5)
+        
+        indicators = [
+            (indentation_consistency >= 0.99, "Perfect indentation consistency (100%)", None),
+            ((indentation_consistency < 0.99) & (indentation_consistency >= 0.95),
+             "Very high indentation consistency ({value:.1%})", indentation_consistency),
+            (spacing_issues <= 0.1, "Excellent spacing consistency", None),
+            ((spacing_issues > 0.1) & (spacing_issues <= 0.5), "Good spacing consistency", None),
+            (naming_inconsistency <= 0.2, "Excellent naming consistency", None),
+            ((naming_inconsistency > 0.2) & (naming_inconsistency <= 0.8), "Good naming consistency", None),
+            (var_uniqueness >= 0.95, "Very high variable uniqueness ({value:.1%})", var_uniqueness),
+            ((var_uniqueness < 0.95) & (var_uniqueness >= 0.8), "High variable uniqueness ({value:.1%})", var_uniqueness),
+        ]
+        
+        total_score = (self._tiered(indentation_consistency >= 0.99, indentation_consistency >= 0.95, 0.7)
+                       + self._tiered(spacing_issues <= 0.1, spacing_issues <= 0.5)
+                       + self._tiered(naming_inconsistency <= 0.2, naming_inconsistency <= 0.8)
+                       + self._tiered(var_uniqueness >= 0.95, var_uniqueness >= 0.8))
+        return total_score / 4, indicators
     
-    def _calculate_simplicity_score(self, features: Dict[str, Any]) -> Tuple[float, List[str]]:
+    def _calculate_simplicity_scores(self, cols: FeatureColumns) -> Tuple[np.ndarray, List[Indicator]]:
         """
         Tính điểm về sự đơn giản của code - AI code thường đơn giản hơn
         """
-        simplicity_indicators = []
-        total_score = 0.0
-        count = 0
-        
-        # Low cyclomatic complexity
-        cyclomatic = features.get('cyclomatic_complexity', 5.0)
-        if cyclomatic <= 2.0:
-            simplicity_indicators.append(f"Very low complexity (CC={cyclomatic:.1f})")
-            total_score += 1.0
-        elif cyclomatic <= 4.0:
-            simplicity_indicators.append(f"Low complexity (CC={cyclomatic:.1f})")
-            total_score += 0.6
-        count += 1
-        
-        # Few control structures
-        if_density = features.get('ast_if_statements_per_loc', 0.05)
-        for_density = features.get('ast_for_loops_per_loc', 0.05)
-        
-        if if_density <= 0.02 and for_density <= 0.02:
-            simplicity_indicators.append("Very few control structures")
-            total_score += 1.0
-        elif if_density <= 0.04 and for_density <= 0.04:
-            simplicity_indicators.append("Few control structures")
-            total_score += 0.6
-        count += 1
-        
-        # High maintainability
-        maintainability = features.get('complexity_maintainability_index', 50)
-        if maintainability >= 100:
-            simplicity_indicators.append(f"Excellent maintainability ({maintainability:.0f})")
-            total_score += 1.0
-        elif maintainability >= 80:
-            simplicity_indicators.append(f"Good maintainability ({maintainability:.0f})")
-            total_score += 0.6
-        count += 1
-        
-        return total_score / count if count > 0 else 0.0, simplicity_indicators
+        cyclomatic = cols.get('cyclomatic_complexity', 5.0)
+        if_density = cols.get('ast_if_statements_per_loc', 0.05)
+        for_density = cols.get('ast_for_loops_per_loc', 0.05)
+        maintainability = cols.get('complexity_maintainability_index', 50)
+        
+        very_few_controls = (if_density <= 0.02) & (for_density <= 0.02)
+        few_controls = (if_density <= 0.04) & (for_density <= 0.04)
+        
+        indicators = [
+            (cyclomatic <= 2.0, "Very low complexity (CC={value:.1f})", cyclomatic),
+            ((cyclomatic > 2.0) & (cyclomatic <= 4.0), "Low complexity (CC={value:.1f})", cyclomatic),
+            (very_few_controls, "Very few control structures", None),
+            (~very_few_controls & few_controls, "Few control structures", None),
+            (maintainability >= 100, "Excellent maintainability ({value:.0f})", maintainability),
+            ((maintainability < 100) & (maintainability >= 80), "Good maintainability ({value:.0f})", maintainability),
+        ]
+        
+        total_score = (self._tiered(cyclomatic <= 2.0, cyclomatic <= 4.0)
+                       + self._tiered(very_few_controls, few_controls)
+                       + self._tiered(maintainability >= 100, maintainability >= 80))
+        return total_score / 3, indicators
     
-    def _calculate_human_chaos_score(self, features: Dict[str, Any]) -> Tuple[float, List[str]]:
+    def _calculate_human_chaos_scores(self, cols: FeatureColumns) -> Tuple[np.ndarray, List[Indicator]]:
         """
         Tính điểm về sự 'chaos' đặc trưng của human code
         Score cao = nhiều human characteristics
         """
-        chaos_indicators = []
-        total_score = 0.0
-        count = 0
-        
-        # Many generic variable names (i, j, k, temp, etc.)
-        generic_ratio = features.get('naming_generic_var_ratio', 0.3)
-        if generic_ratio >= 0.4:
-            chaos_indicators.append(f"High use of generic variables ({generic_ratio:.1%})")
-            total_score += 1.0
-        elif generic_ratio >= 0.2:
-            chaos_indicators.append(f"Moderate use of generic variables ({generic_ratio:.1%})")
-            total_score += 0.6
-        count += 1
-        
-        # Short variable names
-        avg_var_length = features.get('ast_avg_variable_name_length', 4.0)
-        if avg_var_length <= 2.5:
-            chaos_indicators.append(f"Short variable names (avg={avg_var_length:.1f})")
-            total_score += 1.0
-        elif avg_var_length <= 3.5:
-            chaos_indicators.append(f"Moderately short variable names (avg={avg_var_length:.1f})")
-            total_score += 0.6
-        count += 1
-        
-        # Spacing inconsistencies
-        spacing_issues = features.get('spacing_spacing_issues_ratio', 0.5)
-        if spacing_issues >= 1.0:
-            chaos_indicators.append("Many spacing inconsistencies")
-            total_score += 1.0
-        elif spacing_issues >= 0.5:
-            chaos_indicators.append("Some spacing inconsistencies") 
-            total_score += 0.6
-        count += 1
-        
-        # High single character variable usage
-        single_char_ratio = features.get('ast_single_char_vars_ratio', 0.2)
-        if single_char_ratio >= 0.3:
-            chaos_indicators.append(f"Heavy use of single-char variables ({single_char_ratio:.1%})")
-            total_score += 1.0
-        elif single_char_ratio >= 0.15:
-            chaos_indicators.append(f"Moderate use of single-char variables ({single_char_ratio:.1%})")
-            total_score += 0.6
-        count += 1
-        
-        return total_score / count if count > 0 else 0.0, chaos_indicators
+        generic_ratio = cols.get('naming_generic_var_ratio', 0.3)  # i, j, k, temp, ...
+        avg_var_length = cols.get('ast_avg_variable_name_length', 4.0)
+        spacing_issues = cols.get('spacing_spacing_issues_ratio', 0.5)
+        single_char_ratio = cols.get('ast_single_char_vars_ratio', 0.2)
+        
+        indicators = [
+            (generic_ratio >= 0.4, "High use of generic variables ({value:.1%})", generic_ratio),
+            ((generic_ratio < 0.4) & (generic_ratio >= 0.2), "Moderate use of generic variables ({value:.1%})", generic_ratio),
+            (avg_var_length <= 2.5, "Short variable names (avg={value:.1f})", avg_var_length),
+            ((avg_var_length > 2.5) & (avg_var_length <= 3.5), "Moderately short variable names (avg={value:.1f})", avg_var_length),
+            (spacing_issues >= 1.0, "Many spacing inconsistencies", None),
+            ((spacing_issues < 1.0) & (spacing_issues >= 0.5), "Some spacing inconsistencies", None),
+            (single_char_ratio >= 0.3, "Heavy use of single-char variables ({value:.1%})", single_char_ratio),
+            ((single_char_ratio < 0.3) & (single_char_ratio >= 0.15), "Moderate use of single-char variables ({value:.1%})", single_char_ratio),
+        ]
+        
+        total_score = (self._tiered(generic_ratio >= 0.4, generic_ratio >= 0.2)
+                       + self._tiered(avg_var_length <= 2.5, avg_var_length <= 3.5)
+                       + self._tiered(spacing_issues >= 1.0, spacing_issues >= 0.5)
+                       + self._tiered(single_char_ratio >= 0.3, single_char_ratio >= 0.15))
+        return total_score / 4, indicators
+    
+    @staticmethod
+    def _indicator_texts(indicators: List[Indicator], i: int) -> List[str]:
+        return [template.format(value=values[i]) if values is not None else template
+                for mask, template, values in indicators if mask[i]]
     
     def detect(self, features: Dict[str, Any]) -> DetectionResult:
         """
         Enhanced detection với baseline-aware scoring
         """
-        feature_scores = {}
-        reasoning = []
-        
-        # 1. Calculate baseline-aware scores for critical features
-        baseline_score = 0.0
-        baseline_weight_sum = 0.0
+        return self._detect_single(features)
+    
+    def detect_batch(self, matrix: np.ndarray, feature_names: Sequence[str],
+                     explain: bool = False) -> BatchDetectionResult:
+        """
+        Enhanced detection cho N samples cùng lúc (ma trận N x len(feature_names))
         
-        for feature_name, config in self.critical_features.items():
-            if feature_name in features:
-                value = features[feature_name]
-                score, explanation = self._calculate_feature_score(feature_name, value)
-                weight = config['weight']
-                
-                feature_scores[f"baseline_{feature_name}"] = score * weight
-                baseline_score += score * weight
-                baseline_weight_sum += weight
-                
-                # Add reasoning
-                if score > 0.6:
-                    reasoning.append(f"AI-like {feature_name}: {explanation}")
-                elif score < 0.4:
-                    reasoning.append(f"Human-like {feature_name}: {explanation}")
+        Reasoning strings chỉ được tạo khi explain=True
+        """
+        cols = FeatureColumns(matrix, feature_names)
+        baseline_stats, critical_features = self._current_baseline()
+        
+        # 1. Calculate baseline-aware scores for critical features (chỉ các feature có mặt)
+        baseline_total = np.zeros(cols.size)
+        baseline_weight_sum = np.zeros(cols.size)
+        baseline_parts = []
+        
+        for feature_name, config in critical_features.items():
+            present = cols.has(feature_name)
+            if not present.any():
+                continue
+            scores, closer_to_ai = self._calculate_feature_scores(feature_name, cols.get(feature_name), baseline_stats)
+            weight = config['weight']
+            
+            baseline_total = baseline_total + np.where(present, scores * weight, 0.0)
+            baseline_weight_sum = baseline_weight_sum + np.where(present, weight, 0.0)
+            baseline_parts.append((feature_name, present, scores, closer_to_ai))
         
         # Normalize baseline score
-        baseline_score = baseline_score / baseline_weight_sum if baseline_weight_sum > 0 else 0.5
+        has_weight = baseline_weight_sum > 0
+        baseline_score = np.where(has_weight, baseline_total / np.where(has_weight, baseline_weight_sum, 1.0), 0.5)
         
         # 2. Calculate advanced scoring
-        perfection_score, perfection_indicators = self._calculate_perfection_score(features)
-        simplicity_score, simplicity_indicators = self._calculate_simplicity_score(features)
-        chaos_score, chaos_indicators = self._calculate_human_chaos_score(features)
-        
-        # Add advanced reasoning
-        if perfection_score > 0.7:
-            reasoning.extend(perfection_indicators[:2])  # Top 2
-        if simplicity_score > 0.7:
-            reasoning.extend(simplicity_indicators[:2])  # Top 2 
-        if chaos_score > 0.7:
-            reasoning.extend(chaos_indicators[:2])  # Top 2
+        perfection_score, perfection_indicators = self._calculate_perfection_scores(cols)
+        simplicity_score, simplicity_indicators = self._calculate_simplicity_scores(cols)
+        chaos_score, chaos_indicators = self._calculate_human_chaos_scores(cols)
         
         # 3. Combine scores với weighted approach
         weights = {
@@ -398,55 +380,66 @@ class EnhancedAIDetector(BaseDetector):
             'chaos': 0.10       # Human chaos (inverted)
         }
         
-        # Final score calculation
+        components = {
+            'baseline_comparison': baseline_score * weights['baseline'],
+            'code_perfection': perfection_score * weights['perfection'],
+            'code_simplicity': simplicity_score * weights['simplicity'],
+            'human_chaos_inverted': (1.0 - chaos_score) * weights['chaos']  # Invert chaos score
+        }
         final_score = (
-            baseline_score * weights['baseline'] +
-            perfection_score * weights['perfection'] +
-            simplicity_score * weights['simplicity'] +
-            (1.0 - chaos_score) * weights['chaos']  # Invert chaos score
+            components['baseline_comparison'] +
+            components['code_perfection'] +
+            components['code_simplicity'] +
+            components['human_chaos_inverted']
         )
         
-        # Store feature importance
-        feature_importance = {
-            'baseline_comparison': round(baseline_score * weights['baseline'], 3),
-            'code_perfection': round(perfection_score * weights['perfection'], 3),
-            'code_simplicity': round(simplicity_score * weights['simplicity'], 3),
-            'human_chaos_inverted': round((1.0 - chaos_score) * weights['chaos'], 3)
-        }
-        
         # 4. Make prediction with confidence
-        if final_score >= self.ai_threshold:
-            prediction = "AI-generated"
-            confidence = final_score
-            # Add confidence reasoning
-            if final_score >= 0.8:
-                reasoning.insert(0, f"Strong AI patterns detected (score: {final_score:.2f})")
-            else:
-                reasoning.insert(0, f"AI patterns detected (score: {final_score:.2f})")
+        is_ai = final_score >= self.ai_threshold
+        is_human = ~is_ai & (final_score <= self.human_threshold)
+        predictions = np.where(is_ai, "AI-generated", np.where(is_human, "Human-written", "Uncertain")).astype(object)
+        confidences = np.where(is_ai, final_score, np.where(is_human, 1.0 - final_score, 0.5))
+        
+        reasoning = feature_importance = None
+        if explain:
+            reasoning, feature_importance = [], []
+            for i in range(cols.size):
+                reasons = []
+                for feature_name, present, scores, closer_to_ai in baseline_parts:
+                    if not present[i] or closer_to_ai is None:
+                        continue
+                    if scores[i] > 0.6 or scores[i] < 0.4:
+                        explanation = self._baseline_explanation(feature_name, closer_to_ai[i], baseline_stats)
+                        leaning = "AI-like" if scores[i] > 0.6 else "Human-like"
+                        reasons.append(f"{leaning} {feature_name}: {explanation}")
                 
-        elif final_score <= self.human_threshold:
-            prediction = "Human-written"
-            confidence = 1.0 - final_score
-            # Add confidence reasoning
-            if final_score <= 0.2:
-                reasoning.insert(0, f"Strong human patterns detected (score: {final_score:.2f})")
-            else:
-                reasoning.insert(0, f"Human patterns detected (score: {final_score:.2f})")
+                # Add advanced reasoning - top 2 mỗi nhóm
+                if perfection_score[i] > 0.7:
+                    reasons.extend(self._indicator_texts(perfection_indicators, i)[:2])
+                if simplicity_score[i] > 0.7:
+                    reasons.extend(self._indicator_texts(simplicity_indicators, i)[:2])
+                if chaos_score[i] > 0.7:
+                    reasons.extend(self._indicator_texts(chaos_indicators, i)[:2])
                 
-        else:
-            prediction = "Uncertain"
-            confidence = 0.5
-            reasoning.insert(0, f"Mixed patterns - inconclusive (score: {final_score:.2f})")
-        
-        # Limit reasoning to top 8 items
-        reasoning = reasoning[:8]
-        
-        return DetectionResult(
-            prediction=prediction,
-            confidence=round(confidence, 3),
+                score = final_score[i]
+                if is_ai[i]:
+                    reasons.insert(0, f"{'Strong AI' if score >= 0.8 else 'AI'} patterns detected (score: {score:.2f})")
+                elif is_human[i]:
+                    reasons.insert(0, f"{'Strong human' if score <= 0.2 else 'Human'} patterns detected (score: {score:.2f})")
+                else:
+                    reasons.insert(0, f"Mixed patterns - inconclusive (score: {score:.2f})")
+                
+                # Limit reasoning to top 8 items
+                reasoning.append(reasons[:8])
+                feature_importance.append({name: round(float(values[i]), 3) for name, values in components.items()})
+        
+        return BatchDetectionResult(
+            scores=final_score,
+            predictions=predictions,
+            confidences=confidences,
+            components=components,
+            method_used="enhanced-baseline-aware",
             reasoning=reasoning,
-            feature_importance=feature_importance,
-            method_used="enhanced-baseline-aware"
+            feature_importance=feature_importance
         )
     
     def get_name(self) -> str:
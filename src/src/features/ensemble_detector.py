@@ -0,0 +1,264 @@
+"""
+Ensemble Detector
+Chạy nhiều detectors (heuristic, enhanced, optimized classifier) trên cùng một lần trích xuất features,
+kết hợp scores theo weights và đo latency của từng detector
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .detection_models import BaseDetector, BatchDetectionResult, DetectionResult, HeuristicScoringDetector
+
+try:
+    from optimized_binary_classifier import OptimizedBinaryClassifier
+    HAS_CLASSIFIER = True
+except ImportError:
+    HAS_CLASSIFIER = False
+
+logger = logging.getLogger(__name__)
+
+# NOTE: ENSEMBLE_WEIGHTS="enhanced=0.5,heuristic=0.25,classifier=0.25" để thay đổi weights
+DEFAULT_ENSEMBLE_WEIGHTS = {'enhanced': 0.50, 'heuristic': 0.25, 'classifier': 0.25}
+DEFAULT_CLASSIFIER_MODEL = Path(__file__).parent.parent / "models" / "model.json"
+# NOTE: Batch nhỏ (vd: một file) chạy tuần tự - overhead của thread lớn hơn phần NumPy nhả GIL
+PARALLEL_MIN_ROWS = 64
+
+_CLASSIFIER_LABELS = {'AI': "AI-generated", 'Human': "Human-written", 'Uncertain': "Uncertain"}
+
+
+class ClassifierDetector(BaseDetector):
+    """Adapter để OptimizedBinaryClassifier chạy như một detector trên ma trận features"""
+
+    def __init__(self, model_path: Optional[str] = None):
+        self.classifier = OptimizedBinaryClassifier()
+        if model_path and Path(model_path).exists():
+            self.classifier.load_model(str(model_path))
+
+    @property
+    def required_features(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(self.classifier.compiled.feature_names))
+
+    def detect(self, features: Dict[str, Any]) -> DetectionResult:
+        return self._detect_single(features)
+
+    def detect_batch(self, matrix: np.ndarray, feature_names: Sequence[str],
+                     explain: bool = False) -> BatchDetectionResult:
+        compiled = self.classifier.compiled
+        positions = {name: j for j, name in enumerate(feature_names)}
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(positions))
+
+        # NOTE: Giống classify(): feature thiếu/NaN → 0
+        values = np.zeros((matrix.shape[0], len(compiled.feature_names)))
+        for j, name in enumerate(compiled.feature_names):
+            if name in positions:
+                values[:, j] = np.nan_to_num(matrix[:, positions[name]], nan=0.0)
+
+        ai_scores = compiled.ai_scores(values)
+        labels = self.classifier.predict_labels(ai_scores)
+        predictions = np.array([_CLASSIFIER_LABELS[label] for label in labels], dtype=object)
+        confidences = np.select([labels == "AI", labels == "Human"], [ai_scores, 1.0 - ai_scores], default=0.5)
+
+        reasoning = feature_importance = None
+        if explain:
+            contributions = compiled.contributions(values)
+            reasoning, feature_importance = [], []
+            for row in contributions:
+                top = sorted(zip(compiled.weight_keys, row.tolist()), key=lambda x: x[1], reverse=True)[:3]
+                reasoning.append([f"{key}: {value:.3f}" for key, value in top if value > 0])
+                feature_importance.append({key: round(value, 3) for key, value in top})
+
+        return BatchDetectionResult(
+            scores=ai_scores,
+            predictions=predictions,
+            confidences=confidences,
+            components={},
+            method_used="optimized-classifier",
+            reasoning=reasoning,
+            feature_importance=feature_importance
+        )
+
+    def get_name(self) -> str:
+        return "Optimized Binary Classifier"
+
+
+@dataclass
+class LatencyStats:
+    calls: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_ms: float = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+
+
+class EnsembleDetector(BaseDetector):
+    """
+    Kết hợp scores (cao = AI-like) của các detectors thành viên theo weights
+
+    Các detectors chạy đồng thời trên cùng ma trận features; detector lỗi bị bỏ qua và weights được chuẩn hóa lại
+    """
+
+    def __init__(self, members: Dict[str, Tuple[BaseDetector, float]], parallel: bool = True):
+        if not members:
+            raise ValueError("Ensemble cần ít nhất một detector")
+        self.members = members
+        self.parallel = parallel and len(members) > 1
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {name: LatencyStats() for name in members}
+        self._stats_lock = threading.Lock()
+
+        self.ai_threshold = 0.60
+        self.human_threshold = 0.40
+
+    @property
+    def required_features(self) -> Tuple[str, ...]:
+        names: Dict[str, None] = {}
+        for detector, _ in self.members.values():
+            names.update(dict.fromkeys(detector.required_features))
+        return tuple(names)
+
+    def detect(self, features: Dict[str, Any]) -> DetectionResult:
+        return self._detect_single(features)
+
+    def _run_member(self, name: str, matrix: np.ndarray, feature_names: Sequence[str],
+                    explain: bool) -> Tuple[Optional[BatchDetectionResult], float]:
+        start = time.perf_counter()
+        try:
+            result = self.members[name][0].detect_batch(matrix, feature_names, explain=explain)
+        except Exception as e:
+            logger.error(f"Detector {name} failed: {e}")
+            result = None
+        return result, (time.perf_counter() - start) * 1000
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.members), thread_name_prefix="ensemble")
+        return self._executor
+
+    def detect_batch(self, matrix: np.ndarray, feature_names: Sequence[str],
+                     explain: bool = False) -> BatchDetectionResult:
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(feature_names))
+        names = list(self.members)
+        if self.parallel and len(matrix) >= PARALLEL_MIN_ROWS:
+            executor = self._get_executor()
+            futures = [executor.submit(self._run_member, name, matrix, feature_names, explain) for name in names]
+            outcomes = [future.result() for future in futures]
+        else:
+            outcomes = [self._run_member(name, matrix, feature_names, explain) for name in names]
+
+        timings: Dict[str, float] = {}
+        results: Dict[str, BatchDetectionResult] = {}
+        with self._stats_lock:
+            for name, (result, elapsed_ms) in zip(names, outcomes):
+                timings[name] = elapsed_ms
+                self._stats[name].record(elapsed_ms)
+                if result is None:
+                    self._stats[name].errors += 1
+                else:
+                    results[name] = result
+        if not results:
+            raise RuntimeError("All ensemble detectors failed")
+
+        # NOTE: Weighted mean của member scores, weights chuẩn hóa trên các detector thành công
+        total_weight = sum(self.members[name][1] for name in results)
+        components = {name: result.scores * (self.members[name][1] / total_weight) for name, result in results.items()}
+        scores = np.clip(sum(components.values()), 0.0, 1.0)
+
+        is_ai = scores > self.ai_threshold
+        is_human = scores < self.human_threshold
+        predictions = np.where(is_ai, "AI-generated", np.where(is_human, "Human-written", "Uncertain")).astype(object)
+        confidences = np.where(is_ai, scores, np.where(is_human, 1.0 - scores, 0.5))
+
+        reasoning = feature_importance = None
+        if explain:
+            reasoning, feature_importance = [], []
+            for i in range(len(scores)):
+                reasons = [f"Ensemble score: {scores[i]:.2f} ({len(results)}/{len(names)} detectors)"]
+                for name, result in results.items():
+                    reasons.append(f"{name}: {result.predictions[i]} (score {result.scores[i]:.2f}, "
+                                   f"weight {self.members[name][1] / total_weight:.2f}, {timings[name]:.1f} ms)")
+                    if result.reasoning is not None:
+                        reasons.extend(f"  [{name}] {reason}" for reason in result.reasoning[i][:2])
+                reasoning.append(reasons)
+                feature_importance.append({name: round(float(values[i]), 3) for name, values in components.items()})
+
+        return BatchDetectionResult(
+            scores=scores,
+            predictions=predictions,
+            confidences=confidences,
+            components=components,
+            method_used="ensemble",
+            reasoning=reasoning,
+            feature_importance=feature_importance,
+            timings=timings
+        )
+
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latency tích lũy của từng detector (ms), dùng để quyết định bỏ các detector chậm"""
+        with self._stats_lock:
+            return {
+                name: {
+                    'weight': self.members[name][1],
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'total_ms': round(stats.total_ms, 3),
+                    'mean_ms': round(stats.total_ms / stats.calls, 3) if stats.calls else 0.0,
+                    'max_ms': round(stats.max_ms, 3),
+                    'last_ms': round(stats.last_ms, 3)
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def get_name(self) -> str:
+        return f"Ensemble Detector ({', '.join(self.members)})"
+
+
+def parse_ensemble_weights(spec: Optional[str]) -> Dict[str, float]:
+    """'enhanced=0.5,heuristic=0.25' → {'enhanced': 0.5, 'heuristic': 0.25}"""
+    if not spec:
+        return dict(DEFAULT_ENSEMBLE_WEIGHTS)
+    weights = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def create_ensemble_detector(weights: Optional[Dict[str, float]] = None,
+                             classifier_model_path: Optional[str] = None) -> EnsembleDetector:
+    """Tạo ensemble từ các detector có weight > 0 (mặc định từ ENSEMBLE_WEIGHTS)"""
+    if weights is None:
+        weights = parse_ensemble_weights(os.getenv("ENSEMBLE_WEIGHTS"))
+    unknown = set(weights) - set(DEFAULT_ENSEMBLE_WEIGHTS)
+    if unknown:
+        raise ValueError(f"Unknown ensemble detectors: {sorted(unknown)}. Available: {list(DEFAULT_ENSEMBLE_WEIGHTS)}")
+
+    members: Dict[str, Tuple[BaseDetector, float]] = {}
+    for name, weight in weights.items():
+        if weight <= 0:
+            continue
+        if name == 'enhanced':
+            from .enhanced_detection_model import create_enhanced_detector
+            members[name] = (create_enhanced_detector(), weight)
+        elif name == 'heuristic':
+            members[name] = (HeuristicScoringDetector(), weight)
+        elif not HAS_CLASSIFIER:
+            logger.warning("OptimizedBinaryClassifier not available, skipping classifier in ensemble")
+        else:
+            model_path = classifier_model_path or os.getenv("CLASSIFIER_MODEL_PATH", str(DEFAULT_CLASSIFIER_MODEL))
+            members[name] = (ClassifierDetector(model_path), weight)
+
+    return EnsembleDetector(members)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+# NOTE: Tăng khi thay đổi định nghĩa features mà không sửa source các analyzer
+FEATURE_EXTRACTOR_VERSION = "1"
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+
+_FINGERPRINT_MODULES = ("lexer.py", "ast_analyzer.py", "human_style_analyzer.py", "advanced_features.py")
+
+
+def extractor_fingerprint(module_names: Iterable[str] = _FINGERPRINT_MODULES) -> str:
+    """Fingerprint của extractor: version + nội dung source các analyzer"""
+    digest = hashlib.sha256(FEATURE_EXTRACTOR_VERSION.encode())
+    features_dir = Path(__file__).parent
+    for name in module_names:
+        try:
+            digest.update((features_dir / name).read_bytes())
+        except OSError:
+            digest.update(name.encode())
+    return digest.hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    LRU cache cho kết quả extract_all_features, key = SHA-256 của code + fingerprint extractor
+
+    Values được lưu dạng pickle: vừa đo được kích thước (bytes), vừa trả về bản copy
+    độc lập cho mỗi lần hit nên caller có thể sửa kết quả mà không ảnh hưởng cache.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 fingerprint: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint or extractor_fingerprint()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def make_key(self, code: str) -> str:
+        digest = hashlib.sha256(self.fingerprint.encode())
+        digest.update(code.encode('utf-8', errors='surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(payload)
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= len(previous)
+            self._entries[key] = payload
+            self._size_bytes += len(payload)
+
+            # NOTE: Evict LRU cho tới khi thỏa cả giới hạn entries và bytes
+            while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'fingerprint': self.fingerprint
+            }
+
+
+_feature_cache: Optional[FeatureCache] = None
+
+
+def get_feature_cache() -> FeatureCache:
+    # NOTE: Cache dùng chung cho mọi AdvancedFeatureExtractor trong process
+    # FEATURE_CACHE_MAX_ENTRIES=0 hoặc FEATURE_CACHE_MAX_BYTES=0 để tắt cache
+    global _feature_cache
+    if _feature_cache is None:
+        _feature_cache = FeatureCache(
+            max_entries=int(os.getenv("FEATURE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(os.getenv("FEATURE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        )
+    return _feature_cache
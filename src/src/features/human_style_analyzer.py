@@ -11,6 +11,8 @@ from typing import Dict, List, Tuple, Set, Optional
 from dataclasses import dataclass, asdict
 from collections import Counter, defaultdict
 
+from .lexer import LexedSource, lex_code
+
 @dataclass
 class SpacingIssues:
     """Các vấn đề về khoảng trắng"""
@@ -143,6 +145,16 @@ class HumanStyleAnalyzer:
         # Operator spacing patterns
         self.operators = ['+', '-', '*', '/', '=', '==', '!=', '<', '>', '<=', '>=', '&&', '||', '&', '|']
         
+        # NOTE: Spacing engine quét một lượt mỗi dòng. Mỗi match là một "anchor" (chuỗi operator,
+        # dấu phẩy, chấm phẩy hoặc ngoặc tròn) kèm word + khoảng trắng ngay trước nó và
+        # khoảng trắng + word ngay sau nó (lookahead, không consume)
+        self.spacing_pattern = re.compile(
+            r'(?:(\w+)(\s*))?'              # word và khoảng trắng trước anchor
+            r'([-+*/=!<>&|]+|[(),;])'       # anchor
+            r'(?=(\s*)(\w?))'               # khoảng trắng và ký tự word sau anchor
+        )
+        self._operator_run_cache: Dict[str, Tuple[int, int]] = {}
+        
         # Common poor naming patterns
         self.poor_naming_patterns = [
             r'\b[a-z]+\d+\b',  # var1, temp2, etc.
@@ -152,6 +164,9 @@ class HumanStyleAnalyzer:
             r'\bfoo\w*\b',     # foo variables
             r'\bbar\w*\b',     # bar variables
         ]
+        # NOTE: Mỗi match của các pattern trên là trọn một từ, nên match trên từng từ
+        self.poor_naming_regexes = [re.compile(p, re.IGNORECASE) for p in self.poor_naming_patterns]
+        self.variable_pattern = re.compile(r'\b(?:int|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\b')
         
         # Global variable patterns
         self.global_patterns = [
@@ -164,6 +179,7 @@ class HumanStyleAnalyzer:
             r'\b(?:[1-9]\d{2,}|[2-9]\d)\b',  # Numbers > 9 (excluding 0, 1)
             r'\b0x[0-9a-fA-F]{3,}\b',         # Large hex numbers
         ]
+        self.magic_number_regexes = [re.compile(p) for p in self.magic_number_patterns]
         
         # Function call patterns for spacing analysis
         self.function_call_pattern = re.compile(r'\w+\s*\([^)]*\)')
@@ -171,16 +187,17 @@ class HumanStyleAnalyzer:
         # Control structure patterns
         self.control_structures = ['if', 'for', 'while', 'switch', 'do']
     
-    def analyze_code(self, code: str, filename: str = "") -> HumanStyleFeatures:
+    def analyze_code(self, code: str, filename: str = "",
+                     lexed: Optional[LexedSource] = None) -> HumanStyleFeatures:
         """Phân tích code và trả về human style features"""
-        
-        lines = code.splitlines()
+        if lexed is None:
+            lexed = lex_code(code)
         
         # Analyze từng khía cạnh
-        spacing = self._analyze_spacing_issues(lines, code)
-        indentation = self._analyze_indentation_issues(lines)
-        naming = self._analyze_naming_inconsistency(code)
-        formatting = self._analyze_formatting_issues(lines, code)
+        spacing = self._analyze_spacing_issues(lexed)
+        indentation = self._analyze_indentation_issues(lexed.lines)
+        naming = self._analyze_naming_inconsistency(lexed)
+        formatting = self._analyze_formatting_issues(lexed)
         
         # Calculate overall human-likeness score
         overall_score = self._calculate_human_score(spacing, indentation, naming, formatting)
@@ -193,12 +210,26 @@ class HumanStyleAnalyzer:
             overall_human_score=overall_score
         )
     
-    def _analyze_spacing_issues(self, lines: List[str], code: str) -> SpacingIssues:
+    def _operator_run_counts(self, run: str) -> Tuple[int, int]:
+        """
+        Số operators (trong self.operators) bắt đầu ở đầu và kết thúc ở cuối một chuỗi operator
+        liền nhau, vd: '==' -> (2, 2) vì cả '=' và '==' đều bắt đầu/kết thúc ở biên
+        Chỉ operators ở biên mới có thể kề với word hoặc khoảng trắng
+        """
+        counts = self._operator_run_cache.get(run)
+        if counts is None:
+            starting = sum(1 for op in self.operators if run.startswith(op))
+            ending = sum(1 for op in self.operators if run.endswith(op))
+            counts = self._operator_run_cache[run] = (starting, ending)
+        return counts
+    
+    def _analyze_spacing_issues(self, lexed: LexedSource) -> SpacingIssues:
         """Phân tích các vấn đề về spacing"""
         issues = SpacingIssues()
+        control_structures = set(self.control_structures)
         
-        for line_num, line in enumerate(lines):
-            if not line.strip():
+        for line, stripped in zip(lexed.lines, lexed.stripped_lines):
+            if not stripped:
                 # Check empty lines with spaces
                 if line and not line.isspace():
                     issues.empty_lines_with_spaces += 1
@@ -208,61 +239,48 @@ class HumanStyleAnalyzer:
             if line.endswith(' ') or line.endswith('\t'):
                 issues.trailing_spaces += 1
             
-            # Check operator spacing
-            for op in self.operators:
-                # Missing space before operator: var+1, x=5
-                pattern_before = re.compile(rf'\w{re.escape(op)}')
-                if pattern_before.search(line):
-                    issues.missing_space_before_operator += len(pattern_before.findall(line))
-                
-                # Missing space after operator: x+ 1, y =5
-                pattern_after = re.compile(rf'{re.escape(op)}\w')
-                if pattern_after.search(line):
-                    issues.missing_space_after_operator += len(pattern_after.findall(line))
-                
-                # Extra spaces: x  +  1, y   =   5
-                pattern_extra_before = re.compile(rf'\w\s{{2,}}{re.escape(op)}')
-                if pattern_extra_before.search(line):
-                    issues.extra_space_before_operator += len(pattern_extra_before.findall(line))
-                
-                pattern_extra_after = re.compile(rf'{re.escape(op)}\s{{2,}}\w')
-                if pattern_extra_after.search(line):
-                    issues.extra_space_after_operator += len(pattern_extra_after.findall(line))
-            
-            # Check comma and semicolon spacing
-            # Missing space after comma: func(a,b,c)
-            if re.search(r',\w', line):
-                issues.missing_space_after_comma += len(re.findall(r',\w', line))
-            
-            # Extra space before comma: func(a , b , c)
-            if re.search(r'\w\s+,', line):
-                issues.extra_space_before_comma += len(re.findall(r'\w\s+,', line))
-            
-            # Missing space after semicolon in for loops: for(i=0;i<n;i++)
-            if re.search(r';\w', line):
-                issues.missing_space_after_semicolon += len(re.findall(r';\w', line))
-            
-            # Extra space before semicolon: for(i=0 ; i<n ; i++)
-            if re.search(r'\w\s+;', line):
-                issues.extra_space_before_semicolon += len(re.findall(r'\w\s+;', line))
-            
-            # Check parentheses spacing
-            # Space after opening paren: func( a, b)
-            if re.search(r'\(\s+\w', line):
-                issues.space_after_opening_paren += len(re.findall(r'\(\s+\w', line))
-            
-            # Space before closing paren: func(a, b )
-            if re.search(r'\w\s+\)', line):
-                issues.space_before_closing_paren += len(re.findall(r'\w\s+\)', line))
-            
-            # Missing space before opening paren in control structures: if(condition)
-            for ctrl in self.control_structures:
-                pattern = rf'\b{ctrl}\('
-                if re.search(pattern, line):
-                    issues.missing_space_before_opening_paren += len(re.findall(pattern, line))
+            for word, gap, anchor, next_gap, next_word in self.spacing_pattern.findall(line):
+                if anchor == '(':
+                    # Missing space before opening paren in control structures: if(condition)
+                    if not gap and word in control_structures:
+                        issues.missing_space_before_opening_paren += 1
+                    # Space after opening paren: func( a, b)
+                    if next_gap and next_word:
+                        issues.space_after_opening_paren += 1
+                elif anchor == ')':
+                    # Space before closing paren: func(a, b )
+                    if word and gap:
+                        issues.space_before_closing_paren += 1
+                elif anchor == ',':
+                    # Missing space after comma: func(a,b,c)
+                    if next_word and not next_gap:
+                        issues.missing_space_after_comma += 1
+                    # Extra space before comma: func(a , b , c)
+                    if word and gap:
+                        issues.extra_space_before_comma += 1
+                elif anchor == ';':
+                    # Missing space after semicolon in for loops: for(i=0;i<n;i++)
+                    if next_word and not next_gap:
+                        issues.missing_space_after_semicolon += 1
+                    # Extra space before semicolon: for(i=0 ; i<n ; i++)
+                    if word and gap:
+                        issues.extra_space_before_semicolon += 1
+                else:
+                    # Check operator spacing: missing (var+1, x=5) hoặc thừa (x  +  1)
+                    starting, ending = self._operator_run_counts(anchor)
+                    if word:
+                        if not gap:
+                            issues.missing_space_before_operator += starting
+                        elif len(gap) >= 2:
+                            issues.extra_space_before_operator += starting
+                    if next_word:
+                        if not next_gap:
+                            issues.missing_space_after_operator += ending
+                        elif len(next_gap) >= 2:
+                            issues.extra_space_after_operator += ending
         
         # Calculate spacing issues ratio
-        total_lines = len([l for l in lines if l.strip()])
+        total_lines = len(lexed.non_empty_lines)
         if total_lines > 0:
             total_spacing_issues = (
                 issues.missing_space_before_operator + issues.missing_space_after_operator +
@@ -359,14 +377,13 @@ class HumanStyleAnalyzer:
         
         return issues
     
-    def _analyze_naming_inconsistency(self, code: str) -> NamingInconsistency:
+    def _analyze_naming_inconsistency(self, lexed: LexedSource) -> NamingInconsistency:
         """Phân tích naming convention inconsistency"""
         issues = NamingInconsistency()
         
-        # Extract all identifiers
-        identifiers = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', code)
-        variables = re.findall(r'\b(?:int|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\b', code)
-        functions = re.findall(r'\b(?:int|void|float|double|char|string|bool)\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(', code)
+        # Extract all identifiers (kể cả trong comments) và variables đã khai báo
+        identifiers = lexed.words
+        variables = self.variable_pattern.findall(lexed.code)
         
         # Analyze naming style consistency
         camel_case_count = 0
@@ -402,14 +419,16 @@ class HumanStyleAnalyzer:
                 issues.inconsistent_variable_naming = len(pattern_counts) - 1
         
         # Poor naming choices
-        for pattern in self.poor_naming_patterns:
-            matches = re.findall(pattern, code, re.IGNORECASE)
-            issues.unclear_abbreviations += len(matches)
+        for pattern in self.poor_naming_regexes:
+            issues.unclear_abbreviations += sum(
+                count for word, count in lexed.word_counts.items() if pattern.fullmatch(word)
+            )
         
         # Check for magic numbers
+        # NOTE: Quét toàn bộ text (kể cả comment/string) như baseline để feature khớp feature_stats.json
         magic_numbers = []
-        for pattern in self.magic_number_patterns:
-            magic_numbers.extend(re.findall(pattern, code))
+        for pattern in self.magic_number_regexes:
+            magic_numbers.extend(pattern.findall(lexed.code))
         
         issues.magic_numbers_without_constants = len(magic_numbers)
         
@@ -426,15 +445,14 @@ class HumanStyleAnalyzer:
         
         return issues
     
-    def _analyze_formatting_issues(self, lines: List[str], code: str) -> FormattingIssues:
+    def _analyze_formatting_issues(self, lexed: LexedSource) -> FormattingIssues:
         """Phân tích formatting issues"""
         issues = FormattingIssues()
         
         brace_styles = []
         comment_styles = []
         
-        for line_num, line in enumerate(lines):
-            stripped = line.strip()
+        for line, stripped in zip(lexed.lines, lexed.stripped_lines):
             if not stripped:
                 continue
             
@@ -474,7 +492,7 @@ class HumanStyleAnalyzer:
                 issues.inconsistent_comment_style = len(comment_counts) - 1
         
         # Calculate formatting issues ratio
-        total_code_lines = len([l for l in lines if l.strip()])
+        total_code_lines = len(lexed.non_empty_lines)
         if total_code_lines > 0:
             total_format_issues = (
                 issues.inconsistent_brace_style + issues.unnecessary_nested_braces +
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Shared source views
+LexedSource cache các view dẫn xuất của một file (lines, words, code đã xóa comment, ...)
+để các analyzer dùng chung thay vì mỗi analyzer tự tách lại trên cùng một code.
+Các features vẫn đếm bằng regex trên text gốc để giữ nguyên giá trị mà feature_stats.json và model đã được fit
+"""
+
+import re
+from collections import Counter
+from functools import cached_property
+from typing import List
+
+
+# NOTE: Từ (identifier-like) trong toàn bộ text, kể cả comment và string literal
+WORD_PATTERN = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')
+
+# NOTE: Cách xóa comment bằng regex mà các analyzer vẫn dùng
+_REGEX_LINE_COMMENT = re.compile(r'//.*$', re.MULTILINE)
+_REGEX_BLOCK_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+
+def regex_strip_comments(code: str) -> str:
+    """Xóa comment bằng regex ('//' trong string cũng bị cắt)"""
+    return _REGEX_BLOCK_COMMENT.sub('', _REGEX_LINE_COMMENT.sub('', code))
+
+
+class LexedSource:
+    """
+    View cache của một file: mỗi view dẫn xuất được tính lazy một lần và dùng chung giữa các analyzer
+    Các analyzer nhận object này thay vì tự tách lines/words và xóa comment lại trên cùng code
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+
+    @cached_property
+    def lines(self) -> List[str]:
+        return self.code.splitlines()
+
+    @cached_property
+    def stripped_lines(self) -> List[str]:
+        return [line.strip() for line in self.lines]
+
+    @cached_property
+    def non_empty_lines(self) -> List[str]:
+        """Các dòng không rỗng, đã strip"""
+        return [line for line in self.stripped_lines if line]
+
+    @cached_property
+    def comment_line_count(self) -> int:
+        """Số dòng bắt đầu bằng '//' hoặc chứa '/*' (định nghĩa line-based cũ)"""
+        return sum(1 for line in self.stripped_lines if line.startswith('//') or '/*' in line)
+
+    @cached_property
+    def words(self) -> List[str]:
+        """Mọi từ dạng identifier trong text, kể cả trong comment và string literal"""
+        return WORD_PATTERN.findall(self.code)
+
+    @cached_property
+    def word_counts(self) -> Counter:
+        return Counter(self.words)
+
+    @cached_property
+    def lowered_code(self) -> str:
+        return self.code.lower()
+
+    @cached_property
+    def regex_stripped_code(self) -> str:
+        """
+        Code với comment bị xóa bằng regex ('//' trong string cũng bị cắt)
+        Giữ đúng cách xóa comment mà feature_stats.json và model đã được fit
+        """
+        return regex_strip_comments(self.code)
+
+
+def lex_code(code: str) -> LexedSource:
+    """Shortcut: LexedSource của code, các view được tính khi analyzer cần tới"""
+    return LexedSource(code)
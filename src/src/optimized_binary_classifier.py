@@ -12,10 +12,19 @@ import logging
 import json
 from pathlib import Path
 
+from feature_store import feature_columns, read_features
+from feature_statistics import class_statistics, rank_by_effect_size
+from binary_artifact import ARTIFACT_EXTENSION, KIND_MODEL, is_artifact, read_artifact, write_artifact
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MODEL_VERSION = 'optimized-v2'
+# NOTE: Các trường feature_stats được lưu dạng float64 arrays trong binary artifact
+STAT_FIELDS = ('ai_mean', 'human_mean', 'ai_std', 'human_std', 'cohens_d', 'ai_higher')
+BOOL_STAT_FIELDS = ('ai_higher',)
+
 @dataclass
 class ClassificationResult:
     """Kết quả classification"""
@@ -25,6 +34,32 @@ class ClassificationResult:
     feature_scores: Dict[str, float]
     method_used: str
 
+@dataclass
+class CompiledWeights:
+    """
+    feature_weights + feature_stats đã được biên dịch thành các NumPy vectors cùng thứ tự
+    
+    score của feature i = clip((x - offsets[i]) / scales[i], 0, 1), hoặc constants[i] nếu không NaN
+    """
+    weight_keys: List[str]
+    feature_names: List[str]
+    weights: np.ndarray
+    directions: np.ndarray  # +1 = AI-leaning, -1 = Human-leaning
+    offsets: np.ndarray
+    scales: np.ndarray
+    constants: np.ndarray
+    
+    def feature_scores(self, values: np.ndarray) -> np.ndarray:
+        """values: ma trận (N x len(feature_names)) → normalized scores cùng shape"""
+        scores = np.clip((values - self.offsets) / self.scales, 0.0, 1.0)
+        return np.where(np.isnan(self.constants), scores, self.constants)
+    
+    def contributions(self, values: np.ndarray) -> np.ndarray:
+        return self.weights * self.feature_scores(values)
+    
+    def ai_scores(self, values: np.ndarray) -> np.ndarray:
+        return np.clip(0.5 + self.contributions(values) @ self.directions, 0.0, 1.0)
+
 class OptimizedBinaryClassifier:
     """
     Binary classifier được tối ưu dựa trên feature analysis
@@ -35,6 +70,7 @@ class OptimizedBinaryClassifier:
         self.feature_weights = {}
         self.thresholds = {}
         self.feature_stats = {}
+        self._compiled: Optional[CompiledWeights] = None
         
         if feature_analysis_csv:
             self.load_feature_analysis(feature_analysis_csv)
@@ -45,54 +81,39 @@ class OptimizedBinaryClassifier:
         """Load và phân tích data để tự động tính weights"""
         logger.info(f"Loading feature analysis từ {csv_path}")
         
-        df = pd.read_csv(csv_path)
+        # NOTE: Với Parquet chỉ load các cột số + label
+        numeric_columns = feature_columns(csv_path, numeric_only=True)
+        df = read_features(csv_path, columns=None if numeric_columns is None else numeric_columns + ['label'])
+        self.fit(df)
+    
+    def fit(self, df: pd.DataFrame):
+        """Tính feature stats + weights từ DataFrame features có cột label (vd: một fold của cross-validation)"""
         df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
+        self.feature_stats = {}
         
         ai_data = df[df['label'] == 'AI']
         human_data = df[df['label'] == 'Human']
         
         logger.info(f"AI samples: {len(ai_data)}, Human samples: {len(human_data)}")
         
-        # Tính discriminative power cho từng feature
-        discriminative_features = []
-        
+        # Tính discriminative power (Cohen's d) cho tất cả features trong một lượt
         numeric_features = df.select_dtypes(include=[np.number]).columns
         exclude_cols = ['file_size', 'detection_confidence']  # Loại bỏ meta features
         numeric_features = [f for f in numeric_features if f not in exclude_cols]
         
-        for feature in numeric_features:
-            try:
-                ai_mean = ai_data[feature].mean()
-                human_mean = human_data[feature].mean()
-                ai_std = ai_data[feature].std()
-                human_std = human_data[feature].std()
-                
-                # Tính Cohen's d
-                pooled_std = np.sqrt(((len(ai_data) - 1) * ai_std**2 + 
-                                    (len(human_data) - 1) * human_std**2) / 
-                                   (len(ai_data) + len(human_data) - 2))
-                
-                if pooled_std > 0:
-                    cohens_d = abs(ai_mean - human_mean) / pooled_std
-                    
-                    # Lưu feature stats
-                    self.feature_stats[feature] = {
-                        'ai_mean': float(ai_mean),
-                        'human_mean': float(human_mean),
-                        'ai_std': float(ai_std),
-                        'human_std': float(human_std),
-                        'cohens_d': float(cohens_d),
-                        'ai_higher': bool(ai_mean > human_mean)
-                    }
-                    
-                    discriminative_features.append((feature, cohens_d))
-                
-            except Exception as e:
-                logger.warning(f"Error analyzing feature {feature}: {e}")
-                continue
+        stats = class_statistics(df, numeric_features, quantiles=())
+        discriminative_features = rank_by_effect_size(stats)
         
-        # Sort by discriminative power
-        discriminative_features.sort(key=lambda x: x[1], reverse=True)
+        # Lưu feature stats (theo thứ tự cột) cho các features có effect size
+        for feature, row in stats[stats['cohens_d'].notna()].iterrows():
+            self.feature_stats[feature] = {
+                'ai_mean': float(row['ai_mean']),
+                'human_mean': float(row['human_mean']),
+                'ai_std': float(row['ai_std']),
+                'human_std': float(row['human_std']),
+                'cohens_d': float(row['cohens_d']),
+                'ai_higher': bool(row['ai_higher'])
+            }
         
         # Tạo weights dựa trên discriminative power
         self.setup_optimized_weights(discriminative_features[:15])  # Top 15 features
@@ -127,6 +148,7 @@ class OptimizedBinaryClassifier:
             'human_threshold': 0.45, # Tăng threshold Human
             'uncertain_range': 0.10  # Khoảng uncertain
         }
+        self.compile()
         
         logger.info("Optimized weights based on data analysis:")
         for feature, weight in sorted(self.feature_weights.items(), key=lambda x: x[1], reverse=True)[:10]:
@@ -169,12 +191,18 @@ class OptimizedBinaryClassifier:
             'human_threshold': 0.45,  # Tăng Human threshold để tăng precision  
             'uncertain_range': 0.10   # Thu nhỏ uncertain range
         }
+        self.compile()
     
-    def extract_classifier_features(self, comprehensive_features: Dict[str, Any]) -> Dict[str, float]:
-        """Trích xuất và normalize features cho classifier"""
-        features = {}
+    def compile(self) -> CompiledWeights:
+        """
+        Biên dịch feature_weights + feature_stats thành NumPy vectors
         
-        for weight_key in self.feature_weights.keys():
+        Được gọi khi setup/load weights; gọi lại nếu sửa feature_weights/feature_stats trực tiếp
+        """
+        weight_keys, feature_names, weights, directions = [], [], [], []
+        offsets, scales, constants = [], [], []
+        
+        for weight_key, weight in self.feature_weights.items():
             # Parse feature name từ weight key
             if weight_key.startswith('ai_'):
                 feature_name = weight_key[3:]  # Remove 'ai_' prefix
@@ -185,151 +213,155 @@ class OptimizedBinaryClassifier:
             else:
                 continue
             
-            # Get raw feature value
-            raw_value = float(comprehensive_features.get(feature_name, 0))
-            
-            # Normalize feature dựa trên training stats nếu có
+            offset, scale, constant = 0.0, 1.0, np.nan
             if feature_name in self.feature_stats:
+                # Normalize dựa trên training stats: score cao nếu gần với mean của direction
                 stats = self.feature_stats[feature_name]
                 ai_mean = stats['ai_mean']
                 human_mean = stats['human_mean']
                 
-                if direction == 'ai':
-                    # Score cao nếu gần với AI mean
-                    if ai_mean != human_mean:
-                        score = max(0, (raw_value - human_mean) / (ai_mean - human_mean))
-                    else:
-                        score = 0.5
+                if ai_mean == human_mean:
+                    constant = 0.5
+                elif direction == 'ai':
+                    offset, scale = human_mean, ai_mean - human_mean
                 else:
-                    # Score cao nếu gần với Human mean
-                    if ai_mean != human_mean:
-                        score = max(0, (ai_mean - raw_value) / (ai_mean - human_mean))
-                    else:
-                        score = 0.5
-                
-                # Clamp score
-                score = min(1.0, max(0.0, score))
-                
-            else:
-                # Fallback normalization
-                if feature_name == 'loc':
-                    score = max(0, min(1, (80 - raw_value) / 60)) if direction == 'human' else 0
-                elif feature_name == 'comment_ratio':
-                    score = min(1, raw_value / 0.3) if direction == 'ai' else max(0, (0.3 - raw_value) / 0.3)
+                    offset, scale = ai_mean, human_mean - ai_mean
+            
+            # Fallback normalization
+            elif feature_name == 'loc':
+                if direction == 'human':
+                    offset, scale = 80.0, -60.0
                 else:
-                    score = min(1, max(0, raw_value))
+                    constant = 0.0
+            elif feature_name == 'comment_ratio':
+                offset, scale = (0.0, 0.3) if direction == 'ai' else (0.3, -0.3)
             
-            features[weight_key] = score
-        
-        return features
+            weight_keys.append(weight_key)
+            feature_names.append(feature_name)
+            weights.append(weight)
+            directions.append(1.0 if direction == 'ai' else -1.0)
+            offsets.append(offset)
+            scales.append(scale)
+            constants.append(constant)
+        
+        self._compiled = CompiledWeights(
+            weight_keys=weight_keys,
+            feature_names=feature_names,
+            weights=np.array(weights, dtype=float),
+            directions=np.array(directions, dtype=float),
+            offsets=np.array(offsets, dtype=float),
+            scales=np.array(scales, dtype=float),
+            constants=np.array(constants, dtype=float)
+        )
+        return self._compiled
+    
+    @property
+    def compiled(self) -> CompiledWeights:
+        if self._compiled is None:
+            return self.compile()
+        return self._compiled
+    
+    def feature_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Lấy các cột classifier sử dụng từ DataFrame, cột thiếu/NaN → 0"""
+        values = df.reindex(columns=self.compiled.feature_names).to_numpy(dtype=float, na_value=np.nan)
+        return np.nan_to_num(values, nan=0.0)
+    
+    def predict_labels(self, ai_scores: np.ndarray) -> np.ndarray:
+        # NOTE: Classification decision với optimized thresholds
+        return np.select(
+            [ai_scores > self.thresholds['ai_threshold'], ai_scores < self.thresholds['human_threshold']],
+            ["AI", "Human"], default="Uncertain"
+        ).astype(object)
+    
+    def classify_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Phân loại toàn bộ DataFrame features: trả về ai_score, prediction, confidence cho mỗi row"""
+        ai_scores = self.compiled.ai_scores(self.feature_matrix(df))
+        predictions = self.predict_labels(ai_scores)
+        confidences = np.select([predictions == "AI", predictions == "Human"],
+                                [ai_scores, 1.0 - ai_scores], default=0.5)
+        return pd.DataFrame({
+            'ai_score': ai_scores,
+            'prediction': predictions,
+            'confidence': confidences
+        }, index=df.index)
+    
+    def _feature_row(self, comprehensive_features: Dict[str, Any]) -> np.ndarray:
+        """Ma trận 1 dòng của các features classifier sử dụng, thiếu/NaN → 0 giống feature_matrix"""
+        values = np.array([[float(comprehensive_features.get(name, 0)) for name in self.compiled.feature_names]])
+        return np.nan_to_num(values, nan=0.0)
+    
+    def extract_classifier_features(self, comprehensive_features: Dict[str, Any]) -> Dict[str, float]:
+        """Trích xuất và normalize features cho classifier"""
+        compiled = self.compiled
+        values = self._feature_row(comprehensive_features)
+        return dict(zip(compiled.weight_keys, compiled.feature_scores(values)[0].tolist()))
     
     def classify(self, comprehensive_features: Dict[str, Any], 
                 include_linting: bool = False) -> ClassificationResult:
         """Phân loại code dựa trên comprehensive features"""
-        
-        # Extract và normalize features
-        classifier_features = self.extract_classifier_features(comprehensive_features)
+        compiled = self.compiled
+        values = self._feature_row(comprehensive_features)
         
         # Tính điểm
-        ai_score = 0.5  # Base score
-        contributions = {}
-        reasoning = []
+        contributions = compiled.contributions(values)[0]
+        ai_score = float(compiled.ai_scores(values)[0])
         
-        for feature_key, feature_value in classifier_features.items():
-            if feature_key in self.feature_weights:
-                weight = self.feature_weights[feature_key]
-                contribution = weight * feature_value
-                
-                if feature_key.startswith('ai_'):
-                    ai_score += contribution
-                    direction = "AI-leaning"
-                else:
-                    ai_score -= contribution  
-                    direction = "Human-leaning"
-                
-                contributions[feature_key] = contribution
-                
-                if contribution > 0.01:  # Only significant contributions
-                    feature_name = feature_key.split('_', 1)[1]
-                    reasoning.append(f"{feature_name}: {direction} (+{contribution:.3f})")
-        
-        # Clamp final score
-        ai_score = min(1.0, max(0.0, ai_score))
-        
-        # Classification decision với optimized thresholds
-        if ai_score > self.thresholds['ai_threshold']:
-            prediction = "AI"
+        reasoning = []
+        for feature_name, direction, contribution in zip(
+                compiled.feature_names, compiled.directions, contributions.tolist()):
+            if contribution > 0.01:  # Only significant contributions
+                label = "AI-leaning" if direction > 0 else "Human-leaning"
+                reasoning.append((round(contribution, 3), f"{feature_name}: {label} (+{contribution:.3f})"))
+        
+        prediction = str(self.predict_labels(np.array([ai_score]))[0])
+        if prediction == "AI":
             confidence = ai_score
-        elif ai_score < self.thresholds['human_threshold']:
-            prediction = "Human"
+        elif prediction == "Human":
             confidence = 1.0 - ai_score
         else:
-            prediction = "Uncertain"
             confidence = 0.5
         
         # Sort reasoning by contribution
-        reasoning.sort(key=lambda x: float(x.split('(+')[1].split(')')[0]), reverse=True)
+        reasoning = [text for _, text in sorted(reasoning, key=lambda x: x[0], reverse=True)]
         
         return ClassificationResult(
             prediction=prediction,
             confidence=round(confidence, 3),
             reasoning=reasoning[:5],  # Top 5 reasons
-            feature_scores=contributions,
+            feature_scores=dict(zip(compiled.weight_keys, contributions.tolist())),
             method_used="optimized-heuristic-v2"
         )
     
     def evaluate_on_dataset(self, csv_path: str) -> Dict[str, Any]:
         """Đánh giá classifier trên dataset"""
-        df = pd.read_csv(csv_path)
+        # NOTE: Chỉ load label và các features mà classifier sử dụng
+        df = read_features(csv_path, columns=['label'] + self.compiled.feature_names)
+        return self.evaluate_frame(df)
+    
+    def evaluate_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Đánh giá classifier trên DataFrame features có cột label"""
         df = df.replace([np.inf, -np.inf], np.nan).fillna(0)
         
-        correct_predictions = 0
-        total_predictions = 0
-        
-        ai_correct = 0
-        ai_total = 0
-        human_correct = 0
-        human_total = 0
+        predictions = self.classify_frame(df)['prediction'].to_numpy()
+        is_ai = (df['label'] == 'AI').to_numpy()
+        is_human = ~is_ai
         
+        # NOTE: Confusion matrix từ cùng vector predictions
         confusion_matrix = {
-            'ai_as_ai': 0,
-            'ai_as_human': 0,
-            'ai_as_uncertain': 0,
-            'human_as_ai': 0,
-            'human_as_human': 0,
-            'human_as_uncertain': 0
+            'ai_as_ai': int(np.sum(is_ai & (predictions == 'AI'))),
+            'ai_as_human': int(np.sum(is_ai & (predictions == 'Human'))),
+            'ai_as_uncertain': int(np.sum(is_ai & (predictions == 'Uncertain'))),
+            'human_as_ai': int(np.sum(is_human & (predictions == 'AI'))),
+            'human_as_human': int(np.sum(is_human & (predictions == 'Human'))),
+            'human_as_uncertain': int(np.sum(is_human & (predictions == 'Uncertain')))
         }
         
-        for _, row in df.iterrows():
-            features = row.to_dict()
-            true_label = features['label']
-            
-            result = self.classify(features)
-            prediction = result.prediction
-            
-            total_predictions += 1
-            
-            if true_label == 'AI':
-                ai_total += 1
-                if prediction == 'AI':
-                    correct_predictions += 1
-                    ai_correct += 1
-                    confusion_matrix['ai_as_ai'] += 1
-                elif prediction == 'Human':
-                    confusion_matrix['ai_as_human'] += 1
-                else:
-                    confusion_matrix['ai_as_uncertain'] += 1
-                    
-            else:  # Human
-                human_total += 1
-                if prediction == 'Human':
-                    correct_predictions += 1
-                    human_correct += 1
-                    confusion_matrix['human_as_human'] += 1
-                elif prediction == 'AI':
-                    confusion_matrix['human_as_ai'] += 1
-                else:
-                    confusion_matrix['human_as_uncertain'] += 1
+        total_predictions = len(df)
+        ai_total = int(is_ai.sum())
+        human_total = int(is_human.sum())
+        ai_correct = confusion_matrix['ai_as_ai']
+        human_correct = confusion_matrix['human_as_human']
+        correct_predictions = ai_correct + human_correct
         
         results = {
             'overall_accuracy': correct_predictions / total_predictions if total_predictions > 0 else 0,
@@ -344,12 +376,16 @@ class OptimizedBinaryClassifier:
         return results
     
     def save_model(self, path: str):
-        """Lưu classifier parameters"""
+        """Lưu classifier parameters (JSON, hoặc binary artifact nếu path có đuôi .bin)"""
+        if Path(path).suffix == ARTIFACT_EXTENSION:
+            self.export_artifact(path)
+            return
+        
         model_data = {
             'feature_weights': self.feature_weights,
             'thresholds': self.thresholds,
             'feature_stats': self.feature_stats,
-            'version': 'optimized-v2'
+            'version': MODEL_VERSION
         }
         
         with open(path, 'w') as f:
@@ -357,14 +393,76 @@ class OptimizedBinaryClassifier:
         
         logger.info(f"Saved optimized classifier to {path}")
     
+    def export_artifact(self, path: str):
+        """Lưu weights đã compile + feature_stats thành binary artifact để load bằng mmap"""
+        compiled = self.compiled
+        stat_features = list(self.feature_stats)
+        arrays = {
+            'feature_weights': np.array(list(self.feature_weights.values()), dtype=float),
+            'weights': compiled.weights,
+            'directions': compiled.directions,
+            'offsets': compiled.offsets,
+            'scales': compiled.scales,
+            'constants': compiled.constants
+        }
+        for field_name in STAT_FIELDS:
+            arrays[f'stats_{field_name}'] = np.array(
+                [float(self.feature_stats[name].get(field_name, np.nan)) for name in stat_features], dtype=float)
+        
+        write_artifact(
+            path,
+            KIND_MODEL,
+            arrays=arrays,
+            names={
+                'feature_weight_keys': list(self.feature_weights),
+                'weight_keys': compiled.weight_keys,
+                'feature_names': compiled.feature_names,
+                'stat_features': stat_features
+            },
+            metadata={'thresholds': self.thresholds, 'version': MODEL_VERSION}
+        )
+        logger.info(f"Saved optimized classifier artifact to {path}")
+    
+    def _load_artifact(self, path: str):
+        artifact = read_artifact(path, expected_kind=KIND_MODEL)
+        names, arrays = artifact.names, artifact.arrays
+        
+        self.feature_weights = dict(zip(names['feature_weight_keys'], arrays['feature_weights'].tolist()))
+        self.thresholds = artifact.metadata['thresholds']
+        self.feature_stats = {}
+        for i, name in enumerate(names['stat_features']):
+            stats = {}
+            for field_name in STAT_FIELDS:
+                value = float(arrays[f'stats_{field_name}'][i])
+                if not np.isnan(value):
+                    stats[field_name] = bool(value) if field_name in BOOL_STAT_FIELDS else value
+            self.feature_stats[name] = stats
+        
+        # NOTE: Vectors dùng trực tiếp view read-only trên mmap, không compile lại
+        self._compiled = CompiledWeights(
+            weight_keys=names['weight_keys'],
+            feature_names=names['feature_names'],
+            weights=arrays['weights'],
+            directions=arrays['directions'],
+            offsets=arrays['offsets'],
+            scales=arrays['scales'],
+            constants=arrays['constants']
+        )
+    
     def load_model(self, path: str):
-        """Load classifier parameters"""
+        """Load classifier parameters (JSON hoặc binary artifact)"""
+        if is_artifact(path):
+            self._load_artifact(path)
+            logger.info(f"Mapped optimized classifier artifact from {path}")
+            return
+        
         with open(path, 'r') as f:
             model_data = json.load(f)
         
         self.feature_weights = model_data['feature_weights']
         self.thresholds = model_data['thresholds']
         self.feature_stats = model_data.get('feature_stats', {})
+        self.compile()
         
         logger.info(f"Loaded optimized classifier from {path}")
 
@@ -375,7 +473,7 @@ def main():
     parser = argparse.ArgumentParser(description='Optimized Binary Classifier')
     parser.add_argument('--train-csv', type=str, help='CSV file for training/optimization')
     parser.add_argument('--test-csv', type=str, help='CSV file for testing')
-    parser.add_argument('--save-model', type=str, help='Path to save trained model')
+    parser.add_argument('--save-model', type=str, help='Path to save trained model (.bin → binary artifact)')
     parser.add_argument('--load-model', type=str, help='Path to load model')
     
     args = parser.parse_args()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Threshold Tuning
+Tune ai_threshold/human_threshold cho classifier/detectors: chấm điểm dataset một lần, sort scores,
+rồi tính ROC/PR curves và three-way confusion matrix cho mọi cặp thresholds bằng cumulative counts
+"""
+
+import argparse
+import json
+import logging
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feature_store import read_features
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID_STEP = 0.01
+OBJECTIVES = ('balanced_accuracy', 'accuracy')
+
+# NOTE: Quy tắc so sánh của từng model: strict → AI nếu score > ai_threshold, Human nếu score < human_threshold;
+# inclusive → AI nếu score >= ai_threshold, Human nếu score <= human_threshold (AI được ưu tiên)
+INCLUSIVE_THRESHOLDS = {'classifier': False, 'heuristic': False, 'enhanced': True, 'ensemble': False}
+
+
+@dataclass
+class RocCurve:
+    thresholds: np.ndarray  # Dự đoán AI nếu score >= threshold
+    fpr: np.ndarray
+    tpr: np.ndarray
+    auc: float
+
+
+@dataclass
+class PrCurve:
+    thresholds: np.ndarray
+    precision: np.ndarray
+    recall: np.ndarray
+    average_precision: float
+
+
+@dataclass
+class ThresholdSweep:
+    """Confusion matrix cho mọi cặp (ai_threshold, human_threshold) trên grid, mỗi cell là ma trận K x K"""
+    grid: np.ndarray
+    inclusive: bool
+    n_ai: int
+    n_human: int
+    confusion: Dict[str, np.ndarray]  # [i, j] = ai_threshold grid[i], human_threshold grid[j]
+    valid: np.ndarray  # Cặp hợp lệ: vùng AI và vùng Human không giao nhau
+
+    def metrics(self) -> Dict[str, np.ndarray]:
+        c = self.confusion
+        n_total = self.n_ai + self.n_human
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ai_accuracy = c['ai_as_ai'] / max(self.n_ai, 1)
+            human_accuracy = c['human_as_human'] / max(self.n_human, 1)
+            decided = n_total - c['ai_as_uncertain'] - c['human_as_uncertain']
+            return {
+                'accuracy': (c['ai_as_ai'] + c['human_as_human']) / max(n_total, 1),
+                'balanced_accuracy': (ai_accuracy + human_accuracy) / 2,
+                'ai_accuracy': ai_accuracy,
+                'human_accuracy': human_accuracy,
+                'ai_precision': c['ai_as_ai'] / (c['ai_as_ai'] + c['human_as_ai']),
+                'human_precision': c['human_as_human'] / (c['human_as_human'] + c['ai_as_human']),
+                'coverage': decided / max(n_total, 1)
+            }
+
+    def best(self, objective: str = 'balanced_accuracy',
+             min_precision: Optional[float] = None) -> Optional['ThresholdChoice']:
+        """
+        Cặp thresholds tốt nhất theo objective (Uncertain tính là sai, giống evaluate_on_dataset)
+
+        min_precision: yêu cầu precision của cả dự đoán AI và Human, tạo ra vùng Uncertain
+        """
+        metrics = self.metrics()
+        allowed = self.valid & (metrics['coverage'] > 0)
+        if min_precision is not None:
+            # NOTE: Không dự đoán class nào (precision NaN) thì không vi phạm ràng buộc
+            for key in ('ai_precision', 'human_precision'):
+                allowed &= np.nan_to_num(metrics[key], nan=1.0) >= min_precision
+        if not allowed.any():
+            return None
+
+        # NOTE: Hòa điểm → ưu tiên coverage cao hơn, sau đó là vùng Uncertain quanh 0.5 cân đối nhất
+        center = np.abs((self.grid[:, None] + self.grid[None, :]) / 2 - 0.5)
+        candidates = np.flatnonzero(allowed)
+        order = np.lexsort((center.ravel()[candidates], -metrics['coverage'].ravel()[candidates],
+                            -metrics[objective].ravel()[candidates]))
+        i, j = np.unravel_index(candidates[order[0]], allowed.shape)
+        return self._choice(i, j, metrics)
+
+    def at(self, ai_threshold: float, human_threshold: float) -> 'ThresholdChoice':
+        """Kết quả của một cặp thresholds nằm trên grid"""
+        i, j = np.searchsorted(self.grid, [ai_threshold, human_threshold])
+        if not np.array_equal(self.grid[np.minimum([i, j], len(self.grid) - 1)], [ai_threshold, human_threshold]):
+            raise ValueError(f"Thresholds ({ai_threshold}, {human_threshold}) are not on the sweep grid")
+        return self._choice(i, j, self.metrics())
+
+    def _choice(self, i: int, j: int, metrics: Dict[str, np.ndarray]) -> 'ThresholdChoice':
+        return ThresholdChoice(
+            ai_threshold=float(self.grid[i]),
+            human_threshold=float(self.grid[j]),
+            metrics={key: float(value[i, j]) for key, value in metrics.items()},
+            confusion={key: int(value[i, j]) for key, value in self.confusion.items()}
+        )
+
+
+@dataclass
+class ThresholdChoice:
+    ai_threshold: float
+    human_threshold: float
+    metrics: Dict[str, float]
+    confusion: Dict[str, int]
+
+
+def _split_scores(scores: np.ndarray, is_ai: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    scores = np.asarray(scores, dtype=float)
+    is_ai = np.asarray(is_ai, dtype=bool)
+    return np.sort(scores[is_ai]), np.sort(scores[~is_ai])
+
+
+def threshold_grid(step: float = DEFAULT_GRID_STEP) -> np.ndarray:
+    return np.round(np.arange(0.0, 1.0 + step / 2, step), 10)
+
+
+def _cumulative_counts(scores: np.ndarray, is_ai: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sort scores giảm dần một lần, returns (thresholds, tps, fps) với dự đoán AI nếu score >= threshold"""
+    scores = np.asarray(scores, dtype=float)
+    is_ai = np.asarray(is_ai, dtype=bool)
+
+    order = np.argsort(-scores, kind='mergesort')
+    sorted_scores = scores[order]
+    # NOTE: Chỉ lấy điểm cuối của mỗi nhóm scores bằng nhau
+    last_of_group = np.r_[np.flatnonzero(np.diff(sorted_scores)), len(sorted_scores) - 1]
+    tps = np.cumsum(is_ai[order])[last_of_group]
+    fps = (last_of_group + 1) - tps
+    return sorted_scores[last_of_group], tps, fps
+
+
+def roc_curve(scores: np.ndarray, is_ai: np.ndarray) -> RocCurve:
+    """ROC (AI là positive class) bằng một lần sort + cumulative sums, O(n log n)"""
+    thresholds, tps, fps = _cumulative_counts(scores, is_ai)
+    n_ai = int(np.sum(is_ai))
+    tpr = np.r_[0.0, tps / max(n_ai, 1)]
+    fpr = np.r_[0.0, fps / max(len(is_ai) - n_ai, 1)]
+    return RocCurve(
+        thresholds=np.r_[np.inf, thresholds],
+        fpr=fpr,
+        tpr=tpr,
+        auc=float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+    )
+
+
+def pr_curve(scores: np.ndarray, is_ai: np.ndarray) -> PrCurve:
+    """Precision/Recall cho AI class từ cùng cumulative counts như ROC"""
+    thresholds, tps, fps = _cumulative_counts(scores, is_ai)
+    precision = tps / np.maximum(tps + fps, 1)
+    recall = tps / max(int(np.sum(is_ai)), 1)
+    return PrCurve(
+        thresholds=thresholds,
+        precision=precision,
+        recall=recall,
+        average_precision=float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+    )
+
+
+def sweep_thresholds(scores: np.ndarray, is_ai: np.ndarray, grid: Optional[Sequence[float]] = None,
+                     inclusive: bool = False) -> ThresholdSweep:
+    """
+    Three-way confusion matrix cho mọi cặp thresholds trên grid
+
+    Mỗi threshold chỉ cần searchsorted trên scores đã sort của từng class, O((n + K) log n + K²)
+    """
+    ai_scores, human_scores = _split_scores(scores, is_ai)
+    grid = threshold_grid() if grid is None else np.unique(np.asarray(grid, dtype=float))
+
+    above_side, below_side = ('left', 'right') if inclusive else ('right', 'left')
+
+    def above(sorted_scores):
+        return len(sorted_scores) - np.searchsorted(sorted_scores, grid, side=above_side)
+
+    def below(sorted_scores):
+        return np.searchsorted(sorted_scores, grid, side=below_side)
+
+    ai_above, ai_below = above(ai_scores), below(ai_scores)
+    human_above, human_below = above(human_scores), below(human_scores)
+
+    # NOTE: Hàng = ai_threshold, cột = human_threshold
+    ai_as_ai = np.broadcast_to(ai_above[:, None], (len(grid), len(grid)))
+    ai_as_human = np.broadcast_to(ai_below[None, :], (len(grid), len(grid)))
+    human_as_ai = np.broadcast_to(human_above[:, None], (len(grid), len(grid)))
+    human_as_human = np.broadcast_to(human_below[None, :], (len(grid), len(grid)))
+    valid = grid[None, :] < grid[:, None] if inclusive else grid[None, :] <= grid[:, None]
+
+    return ThresholdSweep(
+        grid=grid,
+        inclusive=inclusive,
+        n_ai=len(ai_scores),
+        n_human=len(human_scores),
+        confusion={
+            'ai_as_ai': ai_as_ai,
+            'ai_as_human': ai_as_human,
+            'ai_as_uncertain': len(ai_scores) - ai_as_ai - ai_as_human,
+            'human_as_ai': human_as_ai,
+            'human_as_human': human_as_human,
+            'human_as_uncertain': len(human_scores) - human_as_ai - human_as_human
+        },
+        valid=valid
+    )
+
+
+def score_dataset(df: pd.DataFrame, model_type: str, model_path: Optional[str] = None):
+    """Chấm điểm toàn bộ dataset một lần, returns (model, scores)"""
+    if model_type == 'classifier':
+        from optimized_binary_classifier import OptimizedBinaryClassifier
+        model = OptimizedBinaryClassifier()
+        if model_path:
+            model.load_model(model_path)
+        return model, model.compiled.ai_scores(model.feature_matrix(df))
+
+    sys.path.append(str(Path(__file__).parent))
+    from features.detection_models import create_detector
+    model = create_detector(model_type, model_path if model_path and Path(model_path).exists() else None)
+    names = list(model.required_features)
+    matrix = df.reindex(columns=names).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    return model, model.detect_batch(matrix, names).scores
+
+
+def current_thresholds(model, model_type: str) -> Tuple[float, float]:
+    if model_type == 'classifier':
+        return model.thresholds['ai_threshold'], model.thresholds['human_threshold']
+    return model.ai_threshold, model.human_threshold
+
+
+def write_thresholds(model, model_type: str, choice: ThresholdChoice, path: str) -> None:
+    """Ghi thresholds tối ưu vào model (JSON/binary artifact) hoặc file thresholds của detector"""
+    if model_type == 'classifier':
+        model.thresholds['ai_threshold'] = choice.ai_threshold
+        model.thresholds['human_threshold'] = choice.human_threshold
+        model.save_model(path)
+    else:
+        model.ai_threshold = choice.ai_threshold
+        model.human_threshold = choice.human_threshold
+        model.save_thresholds(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune AI/Human thresholds với ROC và threshold sweep')
+    parser.add_argument('--data', type=str, required=True, help='Extracted features file (.parquet or .csv)')
+    parser.add_argument('--model-type', choices=sorted(INCLUSIVE_THRESHOLDS), default='classifier',
+                        help='Model cần tune')
+    parser.add_argument('--model', type=str, default=None,
+                        help='Classifier model (.json/.bin) hoặc thresholds JSON của detector')
+    parser.add_argument('--objective', choices=OBJECTIVES, default='balanced_accuracy')
+    parser.add_argument('--min-precision', type=float, default=None,
+                        help='Precision tối thiểu cho cả dự đoán AI và Human')
+    parser.add_argument('--grid-step', type=float, default=DEFAULT_GRID_STEP, help='Bước của grid thresholds')
+    parser.add_argument('--report', type=str, default=None, help='Lưu ROC/PR curves và kết quả sweep (JSON)')
+    parser.add_argument('--write-back', action='store_true', help='Ghi thresholds tối ưu vào --model (backend đọc thresholds của detector qua DETECTOR_THRESHOLDS_PATH)')
+
+    args = parser.parse_args()
+    if args.write_back and not args.model:
+        parser.error('--write-back requires --model')
+
+    df = read_features(args.data)
+    df = df[df['label'].isin(['AI', 'Human'])]
+    is_ai = (df['label'] == 'AI').to_numpy()
+    logger.info(f"Scoring {len(df)} samples ({is_ai.sum()} AI, {(~is_ai).sum()} Human) với {args.model_type}")
+
+    model, scores = score_dataset(df, args.model_type, args.model)
+    inclusive = INCLUSIVE_THRESHOLDS[args.model_type]
+
+    roc = roc_curve(scores, is_ai)
+    pr = pr_curve(scores, is_ai)
+    sweep = sweep_thresholds(scores, is_ai, threshold_grid(args.grid_step), inclusive=inclusive)
+
+    ai_threshold, human_threshold = current_thresholds(model, args.model_type)
+    current_choice = sweep_thresholds(scores, is_ai, [human_threshold, ai_threshold],
+                                      inclusive=inclusive).at(ai_threshold, human_threshold)
+    best = sweep.best(args.objective, args.min_precision)
+
+    ai_op, human_op = ('>=', '<=') if inclusive else ('>', '<')
+    print(f"\n📈 ROC AUC: {roc.auc:.4f}   Average precision: {pr.average_precision:.4f}")
+    for title, choice in (('Current', current_choice), ('Best', best)):
+        if choice is None:
+            continue
+        m = choice.metrics
+        print(f"\n{title} thresholds: AI {ai_op} {choice.ai_threshold:.3f}, Human {human_op} {choice.human_threshold:.3f}")
+        print(f"  {args.objective}: {m[args.objective]:.4f}  accuracy: {m['accuracy']:.4f}  coverage: {m['coverage']:.4f}")
+        print(f"  AI precision: {m['ai_precision']:.4f}  Human precision: {m['human_precision']:.4f}")
+        print(f"  Confusion: {choice.confusion}")
+
+    if best is None:
+        print("\n❌ Không có cặp thresholds nào thỏa mãn --min-precision")
+        return 1
+
+    if args.report:
+        report = {
+            'model_type': args.model_type,
+            'samples': {'ai': sweep.n_ai, 'human': sweep.n_human},
+            'roc': {'auc': roc.auc, 'fpr': roc.fpr.tolist(), 'tpr': roc.tpr.tolist(),
+                    'thresholds': roc.thresholds[1:].tolist()},
+            'pr': {'average_precision': pr.average_precision, 'precision': pr.precision.tolist(),
+                   'recall': pr.recall.tolist(), 'thresholds': pr.thresholds.tolist()},
+            'current': current_choice.__dict__,
+            'best': best.__dict__,
+            'objective': args.objective,
+            'min_precision': args.min_precision
+        }
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"💾 Saved tuning report to {args.report}")
+
+    if args.write_back:
+        write_thresholds(model, args.model_type, best, args.model)
+        logger.info(f"💾 Wrote thresholds to {args.model}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())